@@ -0,0 +1,407 @@
+# analyze.py
+"""无界面的会话日志批量分析：读取 → 解码 → 分类 → 汇总 → 报告
+
+    python main.py --analyze logs/*.cslog --json week.json --csv week_report/
+    python analyze.py logs/*.cslog --axes AD,WS --trend-minutes 30
+
+每个阶段都是生成器，日志按块经 mmap 读取，读过的页随即释放；汇总只保存计数、固定分箱直方图、
+对数分位数直方图和按时间段的均值，内存与日志大小无关。多个文件在进程池中并行分析，
+每个文件得到一份会话报告，最后合并为总报告。不导入 Tk/pynput，可在没有图形界面的机器上运行。
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from classifier import (
+    MovementClassifier, ShotResult, STATE_TYPES, SLOT_NAMES, COLOR_GREEN, COLOR_ORANGE,
+    EARLY_RELEASE_WINDOW_NS, RECENT_STOP_WINDOW_NS, GREEN_THRESHOLD_NS,
+    Axis, DEFAULT_AXES, DEFAULT_AXES_SPEC, parse_axes,
+)
+from clock import NS_PER_MS
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import RECORD, Record, SessionReader
+from stats import RunningStats, QuantileSketch
+
+NS_PER_MINUTE = 60 * 1000 * NS_PER_MS
+
+class Histogram:
+    """固定宽度分箱 (单位 ns)，超出上限的值计入最后一个溢出箱"""
+
+    __slots__ = ("bin_ns", "counts")
+
+    def __init__(self, bin_ns: int = 5 * NS_PER_MS, max_ns: int = 150 * NS_PER_MS) -> None:
+        self.bin_ns = bin_ns
+        self.counts = [0] * (-(-max_ns // bin_ns) + 1)
+
+    def add(self, value: int) -> None:
+        self.counts[min(value // self.bin_ns, len(self.counts) - 1)] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        if other.bin_ns != self.bin_ns or len(other.counts) != len(self.counts):
+            raise ValueError("cannot merge histograms with different bins")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def bins(self) -> List[tuple]:
+        """[(下限 ms, 上限 ms 或 None, 计数), ...]"""
+        width = self.bin_ns / NS_PER_MS
+        last = len(self.counts) - 1
+        return [(i * width, (i + 1) * width if i < last else None, c) for i, c in enumerate(self.counts)]
+
+    def to_dict(self) -> dict:
+        return {"bin_ms": self.bin_ns / NS_PER_MS, "counts": self.counts}
+
+class TrendBucket:
+    """一个时间段内的开枪数、绿色比例和射击延迟均值"""
+
+    __slots__ = ("shots", "green", "graded", "delay", "diff")
+
+    def __init__(self) -> None:
+        self.shots = 0
+        self.green = 0
+        self.graded = 0
+        self.delay = RunningStats()
+        self.diff = RunningStats() # |Overlap/Gap|
+
+    def merge(self, other: "TrendBucket") -> None:
+        self.shots += other.shots
+        self.green += other.green
+        self.graded += other.graded
+        self.delay.merge(other.delay)
+        self.diff.merge(other.diff)
+
+    def to_dict(self) -> dict:
+        return {
+            "shots": self.shots,
+            "green_ratio": self.green / self.graded if self.graded else None,
+            "delay": self.delay.to_dict(),
+            "abs_diff": self.diff.to_dict(),
+        }
+
+class SessionReport:
+    """一个会话 (或多个会话合并后) 的汇总；每次开枪 O(1) 更新，可在进程间传递和合并
+
+    趋势按墙上时间分段：事件时间戳是单调时钟，以第一条事件对应日志头中的录制开始时间换算。
+    """
+
+    def __init__(self, name: str, start_wall_ns: int = 0, trend_ns: int = 60 * NS_PER_MINUTE,
+                 hist_bin_ns: int = 5 * NS_PER_MS, hist_max_ns: int = 150 * NS_PER_MS) -> None:
+        self.name = name
+        self.sessions = 1
+        self.error: Optional[str] = None
+        self.start_wall_ns = start_wall_ns
+        self.trend_ns = trend_ns
+        self.events = 0
+        self.invalid = 0 # 类型或按键编码无法识别的记录
+        self.shots = 0
+        self.duration_ns = 0
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.state_counts = [0] * len(STATE_TYPES)
+        self.green = 0
+        self.orange = 0
+        self.overlap_hist = Histogram(hist_bin_ns, hist_max_ns)
+        self.gap_hist = Histogram(hist_bin_ns, hist_max_ns)
+        self.overlap = QuantileSketch()
+        self.gap = QuantileSketch()
+        self.delay = QuantileSketch()
+        self.delay_stats = RunningStats()
+        self.axis_counts: Dict[str, List[int]] = {} # 多轴时每条轴的状态分布
+        self.trend: Dict[int, TrendBucket] = {} # 时间段起点 (墙上时间 ns) -> 汇总
+
+    def add(self, result: ShotResult) -> None:
+        self.shots += 1
+        state = _STATE_INDEX[result.state_type]
+        self.state_counts[state] += 1
+        wall = self.start_wall_ns + result.shot_time - self.first_ts
+        key = wall - wall % self.trend_ns
+        bucket = self.trend.get(key)
+        if bucket is None:
+            bucket = self.trend[key] = TrendBucket()
+        bucket.shots += 1
+        diff = result.time_diff
+        delay = result.shot_delay
+        if diff is not None:
+            if result.state_type == "Overlap":
+                self.overlap_hist.add(diff)
+                self.overlap.add(diff)
+            elif result.state_type == "EarlyRelease":
+                self.gap_hist.add(diff)
+                self.gap.add(diff)
+            bucket.diff.add(abs(diff))
+        if delay is not None:
+            self.delay.add(delay)
+            self.delay_stats.add(delay)
+            bucket.delay.add(delay)
+        if result.color_hex == COLOR_GREEN:
+            self.green += 1
+            bucket.green += 1
+            bucket.graded += 1
+        elif result.color_hex == COLOR_ORANGE:
+            self.orange += 1
+            bucket.graded += 1
+        if result.axes is not None:
+            for axis in result.axes:
+                counts = self.axis_counts.get(axis.axis)
+                if counts is None:
+                    counts = self.axis_counts[axis.axis] = [0] * len(STATE_TYPES)
+                counts[_STATE_INDEX[axis.state_type]] += 1
+
+    def merge(self, other: "SessionReport") -> None:
+        """把另一份报告并入本报告 (总报告由各会话报告依次合并得到)"""
+        if other.error:
+            return
+        self.sessions += other.sessions
+        self.events += other.events
+        self.invalid += other.invalid
+        self.shots += other.shots
+        self.duration_ns += other.duration_ns
+        self.state_counts = [a + b for a, b in zip(self.state_counts, other.state_counts)]
+        self.green += other.green
+        self.orange += other.orange
+        self.overlap_hist.merge(other.overlap_hist)
+        self.gap_hist.merge(other.gap_hist)
+        self.overlap.merge(other.overlap)
+        self.gap.merge(other.gap)
+        self.delay.merge(other.delay)
+        self.delay_stats.merge(other.delay_stats)
+        for axis, counts in other.axis_counts.items():
+            mine = self.axis_counts.setdefault(axis, [0] * len(STATE_TYPES))
+            self.axis_counts[axis] = [a + b for a, b in zip(mine, counts)]
+        for key, bucket in other.trend.items():
+            mine = self.trend.get(key)
+            if mine is None:
+                mine = self.trend[key] = TrendBucket()
+            mine.merge(bucket)
+
+    @property
+    def green_ratio(self) -> Optional[float]:
+        graded = self.green + self.orange
+        return self.green / graded if graded else None
+
+    def to_dict(self) -> dict:
+        if self.error:
+            return {"name": self.name, "error": self.error}
+        data = {
+            "name": self.name,
+            "sessions": self.sessions,
+            "events": self.events,
+            "invalid_records": self.invalid,
+            "shots": self.shots,
+            "duration_s": round(self.duration_ns / 1e9, 3),
+            "states": dict(zip(STATE_TYPES, self.state_counts)),
+            "green": self.green,
+            "orange": self.orange,
+            "green_ratio": self.green_ratio,
+            "overlap": self.overlap.to_dict(),
+            "gap": self.gap.to_dict(),
+            "shot_delay": dict(self.delay.to_dict(), mean_ms=self.delay_stats.to_dict()["mean_ms"]),
+            "overlap_histogram": self.overlap_hist.to_dict(),
+            "gap_histogram": self.gap_hist.to_dict(),
+            "trend_minutes": self.trend_ns / NS_PER_MINUTE,
+            "trend": [
+                dict(start=_iso(key), **self.trend[key].to_dict()) for key in sorted(self.trend)
+            ],
+        }
+        if self.first_ts is not None: # 单个会话
+            data["start"] = _iso(self.start_wall_ns)
+        if self.axis_counts:
+            data["axes"] = {axis: dict(zip(STATE_TYPES, counts)) for axis, counts in self.axis_counts.items()}
+        return data
+
+_STATE_INDEX = {t: i for i, t in enumerate(STATE_TYPES)}
+
+def _iso(wall_ns: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(wall_ns / 1e9))
+
+# ---- 流水线各阶段 ----
+
+def read_chunks(reader: SessionReader, chunk_records: int = 65536) -> Iterator[memoryview]:
+    """读取：按块产出原始记录"""
+    return reader.iter_chunks(chunk_records)
+
+def decode(chunks: Iterable[memoryview], report: SessionReport) -> Iterator[Record]:
+    """解码：拆成 (timestamp, kind, key) 并丢弃无法识别的记录 (截断/损坏的日志)"""
+    n_slots = len(SLOT_NAMES)
+    for chunk in chunks:
+        for record in RECORD.iter_unpack(chunk):
+            kind = record[1]
+            if kind == EV_SHOT or (kind in (EV_PRESS, EV_RELEASE) and record[2] < n_slots):
+                yield record
+            else:
+                report.invalid += 1
+
+def classify(records: Iterable[Record], classifier: MovementClassifier, report: SessionReport) -> Iterator[ShotResult]:
+    """分类：按键更新状态机，每次开枪产出一个 ShotResult"""
+    on_press, on_release, classify_shot = classifier.on_press, classifier.on_release, classifier.classify_shot
+    events = 0
+    timestamp = None
+    for timestamp, kind, key in records:
+        events += 1
+        if report.first_ts is None:
+            report.first_ts = timestamp
+        if kind == EV_PRESS:
+            on_press(key, timestamp)
+        elif kind == EV_RELEASE:
+            on_release(key, timestamp)
+        else:
+            yield classify_shot(timestamp)
+    report.events += events
+    if timestamp is not None:
+        report.last_ts = timestamp
+        report.duration_ns = timestamp - report.first_ts
+
+def aggregate(results: Iterable[ShotResult], report: SessionReport) -> SessionReport:
+    """汇总：把所有结果并入报告"""
+    add = report.add
+    for result in results:
+        add(result)
+    return report
+
+def analyze_file(
+    path: str,
+    axes: Sequence[Axis] = DEFAULT_AXES,
+    early_release_ns: int = EARLY_RELEASE_WINDOW_NS,
+    recent_stop_ns: int = RECENT_STOP_WINDOW_NS,
+    green_ns: int = GREEN_THRESHOLD_NS,
+    trend_ns: int = 60 * NS_PER_MINUTE,
+    hist_bin_ns: int = 5 * NS_PER_MS,
+    hist_max_ns: int = 150 * NS_PER_MS,
+    chunk_records: int = 65536,
+) -> SessionReport:
+    """分析一个日志文件；文件无法读取时返回带 error 的报告，不影响其他文件"""
+    try:
+        reader = SessionReader(path)
+    except (OSError, ValueError, struct.error) as e:
+        report = SessionReport(path)
+        report.error = str(e)
+        return report
+    with reader:
+        report = SessionReport(path, reader.start_wall_ns, trend_ns, hist_bin_ns, hist_max_ns)
+        classifier = MovementClassifier(early_release_ns, recent_stop_ns, green_ns, axes)
+        records = decode(read_chunks(reader, chunk_records), report)
+        return aggregate(classify(records, classifier, report), report)
+
+def analyze(paths: Sequence[str], workers: Optional[int] = None, **options) -> tuple:
+    """并行分析多个文件，返回 (各会话报告列表, 总报告)"""
+    workers = min(workers or os.cpu_count() or 1, len(paths)) or 1
+    job = partial(analyze_file, **options)
+    if workers == 1:
+        sessions = [job(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            sessions = list(pool.map(job, paths))
+    overall = SessionReport("ALL", trend_ns=options.get("trend_ns", 60 * NS_PER_MINUTE),
+                            hist_bin_ns=options.get("hist_bin_ns", 5 * NS_PER_MS),
+                            hist_max_ns=options.get("hist_max_ns", 150 * NS_PER_MS))
+    overall.sessions = 0
+    for report in sessions:
+        overall.merge(report)
+    return sessions, overall
+
+# ---- 报告输出 ----
+
+SUMMARY_COLUMNS = (
+    "name", "start", "events", "invalid_records", "shots", "duration_s", *STATE_TYPES,
+    "green", "orange", "green_ratio",
+    "overlap_p50_ms", "overlap_p90_ms", "gap_p50_ms", "gap_p90_ms",
+    "delay_mean_ms", "delay_p50_ms", "delay_p90_ms", "delay_p99_ms", "error",
+)
+
+def _summary_row(report: SessionReport) -> list:
+    data = report.to_dict()
+    if report.error:
+        return [report.name] + [""] * (len(SUMMARY_COLUMNS) - 2) + [report.error]
+    states = data["states"]
+    return [
+        data["name"], data.get("start", ""), data["events"], data["invalid_records"], data["shots"],
+        data["duration_s"], *(states[t] for t in STATE_TYPES),
+        data["green"], data["orange"], data["green_ratio"],
+        data["overlap"]["p50_ms"], data["overlap"]["p90_ms"], data["gap"]["p50_ms"], data["gap"]["p90_ms"],
+        data["shot_delay"]["mean_ms"], data["shot_delay"]["p50_ms"], data["shot_delay"]["p90_ms"],
+        data["shot_delay"]["p99_ms"], "",
+    ]
+
+def write_json(sessions: Sequence[SessionReport], overall: SessionReport, out) -> None:
+    json.dump({"overall": overall.to_dict(), "sessions": [r.to_dict() for r in sessions]}, out, indent=2)
+    out.write("\n")
+
+def write_csv(sessions: Sequence[SessionReport], overall: SessionReport, directory: str) -> None:
+    """在 directory 下写 summary.csv (每个会话一行 + ALL)、histogram.csv 和 trend.csv"""
+    os.makedirs(directory, exist_ok=True)
+    reports = list(sessions) + [overall]
+    with open(os.path.join(directory, "summary.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        writer.writerows(_summary_row(r) for r in reports)
+    with open(os.path.join(directory, "histogram.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "kind", "low_ms", "high_ms", "count"])
+        for r in reports:
+            if r.error:
+                continue
+            for kind, hist in (("overlap", r.overlap_hist), ("gap", r.gap_hist)):
+                for low, high, count in hist.bins():
+                    writer.writerow([r.name, kind, low, "" if high is None else high, count])
+    with open(os.path.join(directory, "trend.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "start", "shots", "green_ratio", "delay_mean_ms", "abs_diff_mean_ms"])
+        for r in reports:
+            if r.error:
+                continue
+            for key in sorted(r.trend):
+                bucket = r.trend[key].to_dict()
+                writer.writerow([r.name, _iso(key), bucket["shots"], bucket["green_ratio"],
+                                 bucket["delay"]["mean_ms"] if bucket["delay"]["count"] else None,
+                                 bucket["abs_diff"]["mean_ms"] if bucket["abs_diff"]["count"] else None])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="会话日志批量分析 (无界面)")
+    parser.add_argument("logs", nargs="+", help="会话日志 (session_log 格式)")
+    parser.add_argument("--json", metavar="PATH", help="JSON 报告输出路径 (- 为标准输出；未指定任何输出时默认标准输出)")
+    parser.add_argument("--csv", metavar="DIR", help="在目录下写 summary.csv / histogram.csv / trend.csv")
+    parser.add_argument("--axes", default=DEFAULT_AXES_SPEC, help="急停轴，如 AD 或 AD,WS")
+    parser.add_argument("--early", type=float, default=EARLY_RELEASE_WINDOW_NS / NS_PER_MS, help="early_release 窗口 (ms)")
+    parser.add_argument("--recent", type=float, default=RECENT_STOP_WINDOW_NS / NS_PER_MS, help="recent_stop 窗口 (ms)")
+    parser.add_argument("--green", type=float, default=GREEN_THRESHOLD_NS / NS_PER_MS, help="绿色阈值 (ms)")
+    parser.add_argument("--trend-minutes", type=float, default=60.0, help="趋势的时间段长度 (分钟)")
+    parser.add_argument("--bin-ms", type=float, default=5.0, help="Overlap/Gap 直方图的分箱宽度 (ms)")
+    parser.add_argument("--max-ms", type=float, default=150.0, help="直方图上限 (ms)，更大的值计入溢出箱")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数 (默认 CPU 核数)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sessions, overall = analyze(
+        args.logs, args.workers,
+        axes=parse_axes(args.axes),
+        early_release_ns=int(args.early * NS_PER_MS),
+        recent_stop_ns=int(args.recent * NS_PER_MS),
+        green_ns=int(args.green * NS_PER_MS),
+        trend_ns=max(1, int(args.trend_minutes * NS_PER_MINUTE)),
+        hist_bin_ns=max(1, int(args.bin_ms * NS_PER_MS)),
+        hist_max_ns=int(args.max_ms * NS_PER_MS),
+    )
+    elapsed = time.perf_counter() - start
+    for report in sessions:
+        if report.error:
+            print(f"{report.name}: {report.error}", file=sys.stderr)
+    print(f"{overall.events} events, {overall.shots} shots from {overall.sessions}/{len(sessions)} sessions "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+    if args.csv:
+        write_csv(sessions, overall, args.csv)
+    if args.json and args.json != "-":
+        with open(args.json, "w") as f:
+            write_json(sessions, overall, f)
+    elif args.json or not args.csv:
+        write_json(sessions, overall, sys.stdout)
+    return 1 if all(r.error for r in sessions) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
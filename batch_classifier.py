@@ -0,0 +1,305 @@
+# batch_classifier.py
+"""MovementClassifier 的 NumPy 向量化版本，用于离线分析大量录制事件
+
+输入为列式数组 (timestamps, kinds, keys)，按键编码与 session_log 相同。
+对每一次开枪一次性算出与 classify_shot 完全一致的状态、时间差、射击延迟和颜色。
+计算分为三步 (prepare / transitions / classify_transitions)，分别依赖越来越多的阈值，
+参数扫描 (sweep.py) 可以复用前面步骤的结果。
+"""
+import argparse
+import random
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from classifier import (
+    MovementClassifier, ShotResult, AxisResult, Axis, STATE_TYPES, PALETTE,
+    EARLY_RELEASE_WINDOW_NS, RECENT_STOP_WINDOW_NS, GREEN_THRESHOLD_NS,
+    DEFAULT_AXES, DEFAULT_AXES_SPEC, axis_name, parse_axes,
+)
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import SessionReader, KEYS, NO_KEY
+
+# 与 session_log.RECORD 相同的内存布局
+RECORD_DTYPE = np.dtype([("t", "<i8"), ("kind", "u1"), ("key", "u1")])
+
+STATE_RUN_GUN = STATE_TYPES.index("Run&Gun")
+STATE_OVERLAP = STATE_TYPES.index("Overlap")
+STATE_EARLY_RELEASE = STATE_TYPES.index("EarlyRelease")
+STATE_STATIC = STATE_TYPES.index("Static")
+STATE_NONE = STATE_TYPES.index("None")
+
+COLOR_RED, COLOR_GREEN, COLOR_ORANGE, COLOR_GRAY = range(len(PALETTE))
+
+class AxisColumns(NamedTuple):
+    """单条轴的逐开枪列 (只在多轴时计算)；has_data 为 False 时对应 AxisResult(axis, "None")"""
+    axis: str
+    state: np.ndarray # 该轴最近一次急停的类型
+    time_diff: np.ndarray
+    shot_delay: np.ndarray
+    has_data: Optional[np.ndarray] = None # Transitions 中为 None，classify_transitions 后才确定
+
+class BatchResult(NamedTuple):
+    """每次开枪一行；has_data 为 False 时 time_diff/shot_delay 对应 None"""
+    shot_index: np.ndarray # 开枪事件在输入数组中的下标
+    shot_time: np.ndarray # ns
+    state: np.ndarray # STATE_TYPES 下标
+    color: np.ndarray # PALETTE 下标
+    time_diff: np.ndarray # ns
+    shot_delay: np.ndarray # ns
+    has_data: np.ndarray
+    axes: Optional[Tuple[AxisColumns, ...]] = None
+
+    def _axis_results(self) -> List[Optional[Tuple[AxisResult, ...]]]:
+        if self.axes is None:
+            return [None] * len(self.shot_time)
+        per_axis = []
+        for a in self.axes:
+            per_axis.append([
+                AxisResult(a.axis, STATE_TYPES[state], diff, delay) if has_data else AxisResult(a.axis, "None")
+                for state, diff, delay, has_data in zip(
+                    a.state.tolist(), a.time_diff.tolist(), a.shot_delay.tolist(), a.has_data.tolist(),
+                )
+            ])
+        return list(zip(*per_axis))
+
+    def to_shot_results(self) -> List[ShotResult]:
+        results = []
+        for t, state, color, diff, delay, has_data, axes in zip(
+            self.shot_time.tolist(), self.state.tolist(), self.color.tolist(), self.time_diff.tolist(),
+            self.shot_delay.tolist(), self.has_data.tolist(), self._axis_results(),
+        ):
+            if has_data:
+                results.append(ShotResult(STATE_TYPES[state], PALETTE[color], diff, delay, t, axes))
+            else:
+                results.append(ShotResult(STATE_TYPES[state], PALETTE[color], shot_time=t, axes=axes))
+        return results
+
+def _ffill_index(mask: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """每个位置之前 (含) 最近一个 mask 为真的下标，没有则为 -1"""
+    return np.maximum.accumulate(np.where(mask, idx, -1))
+
+def _take_time(ts: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """按 ffill 下标取时间戳，-1 对应分类器里的初始值 0"""
+    return np.where(last >= 0, ts[np.maximum(last, 0)], 0)
+
+class Prepared(NamedTuple):
+    """与阈值无关的中间结果：同一段事件在参数扫描中只需计算一次"""
+    ts: np.ndarray
+    idx: np.ndarray
+    shot_index: np.ndarray
+    run_gun: np.ndarray # 每次开枪时是否有轴上的按键按着
+    over: np.ndarray # 松开时反向键仍按着 (Overlap 转换点)
+    overlap: np.ndarray # Overlap 时长
+    early_candidate: np.ndarray # 按下时反向键已松开 (还需 gap < early_release_ns)
+    gap: np.ndarray # 距反向键松开的时间
+    axis: np.ndarray # 每个事件所属的轴下标 (不属于任何轴为 -1)
+    axes: Tuple[Axis, ...]
+
+class Transitions(NamedTuple):
+    """给定 early_release_ns 后，每次开枪时最近一次急停的状态/时间差/距今时间"""
+    shot_index: np.ndarray
+    shot_time: np.ndarray
+    run_gun: np.ndarray
+    state: np.ndarray # 最近一次急停的类型 (没有则为 STATE_NONE)
+    time_diff: np.ndarray
+    shot_delay: np.ndarray
+    axes: Optional[Tuple[AxisColumns, ...]] = None # 多轴时每条轴各自的最近一次急停
+
+def prepare(
+    timestamps: np.ndarray,
+    kinds: np.ndarray,
+    keys: np.ndarray,
+    axes: Sequence[Axis] = DEFAULT_AXES,
+) -> Prepared:
+    ts = np.asarray(timestamps, dtype=np.int64)
+    kinds = np.asarray(kinds, dtype=np.uint8)
+    keys = np.asarray(keys, dtype=np.uint8)
+    n = len(ts)
+    idx = np.arange(n)
+    is_press = kinds == EV_PRESS
+    is_release = kinds == EV_RELEASE
+
+    axes = tuple(axes)
+    slots = [k for axis in axes for k in axis]
+
+    # 逐键状态 (事件 i 处理完之后的状态)，只有轴上的按键参与判定
+    held = {}
+    press_time = {}
+    release_time = {}
+    for k in slots:
+        is_k = keys == k
+        last_k = _ffill_index(is_k & (is_press | is_release), idx)
+        held[k] = (last_k >= 0) & (kinds[np.maximum(last_k, 0)] == EV_PRESS)
+        press_time[k] = _take_time(ts, _ffill_index(is_k & is_press, idx))
+        release_time[k] = _take_time(ts, _ffill_index(is_k & is_release, idx))
+
+    # 急停转换点：按下时反向键已松开 (EarlyRelease) / 松开时反向键仍按着 (Overlap)
+    # 同一事件只可能属于其中一种，每个按键只属于一条轴，gap/overlap 可以合并到一个数组
+    early_candidate = np.zeros(n, dtype=bool)
+    over = np.zeros(n, dtype=bool)
+    gap = np.zeros(n, dtype=np.int64)
+    overlap = np.zeros(n, dtype=np.int64)
+    event_axis = np.full(n, -1, dtype=np.int8)
+    for k, opp, index in [(a, b, i) for i, (a, b) in enumerate(axes) for a, b in ((a, b), (b, a))]:
+        is_k = keys == k
+        event_axis[is_k] = index
+        press_k = is_k & is_press
+        early_candidate |= press_k & ~held[opp]
+        gap = np.where(press_k, ts - release_time[opp], gap)
+        release_k = is_k & is_release
+        over_k = release_k & held[opp] & (ts - press_time[opp] > 0)
+        over |= over_k
+        overlap = np.where(over_k, ts - press_time[opp], overlap)
+
+    shot_index = np.flatnonzero(kinds == EV_SHOT)
+    run_gun = np.zeros(len(shot_index), dtype=bool)
+    for k in slots:
+        run_gun |= held[k][shot_index]
+    return Prepared(ts, idx, shot_index, run_gun, over, overlap, early_candidate, gap, event_axis, axes)
+
+def _last_transition(prep: Prepared, mask: np.ndarray, shot_ts: np.ndarray):
+    """每次开枪前 mask 中最近一个急停的 (类型, 时间差, 距今时间)"""
+    last_trans = _ffill_index(mask, prep.idx)[prep.shot_index]
+    has_trans = last_trans >= 0
+    safe = np.maximum(last_trans, 0)
+    lt_time = np.where(has_trans, prep.ts[safe], 0)
+    lt_diff = np.where(has_trans, np.where(prep.over[safe], prep.overlap[safe], prep.gap[safe]), 0)
+    lt_state = np.where(
+        has_trans, np.where(prep.over[safe], STATE_OVERLAP, STATE_EARLY_RELEASE), STATE_NONE,
+    ).astype(np.int8)
+    return lt_state, lt_diff, shot_ts - lt_time
+
+def transitions(prep: Prepared, early_release_ns: int = EARLY_RELEASE_WINDOW_NS) -> Transitions:
+    trans = (prep.early_candidate & (prep.gap < early_release_ns)) | prep.over
+    shot_ts = prep.ts[prep.shot_index]
+    axes = None
+    if len(prep.axes) > 1:
+        axes = tuple(
+            AxisColumns(axis_name(axis), *_last_transition(prep, trans & (prep.axis == index), shot_ts))
+            for index, axis in enumerate(prep.axes)
+        )
+    return Transitions(prep.shot_index, shot_ts, prep.run_gun, *_last_transition(prep, trans, shot_ts), axes)
+
+def classify_transitions(
+    trans: Transitions,
+    recent_stop_ns: int = RECENT_STOP_WINDOW_NS,
+    green_ns: int = GREEN_THRESHOLD_NS,
+) -> BatchResult:
+    run_gun = trans.run_gun
+    recent = trans.shot_delay < recent_stop_ns
+    state = np.where(run_gun, STATE_RUN_GUN, np.where(recent, trans.state, STATE_STATIC)).astype(np.int8)
+    green = np.abs(trans.time_diff) <= green_ns
+    color = np.where(
+        run_gun, COLOR_RED,
+        np.where(recent, np.where(green, COLOR_GREEN, COLOR_ORANGE), COLOR_GRAY),
+    ).astype(np.int8)
+    axes = None
+    if trans.axes is not None:
+        axes = tuple(
+            AxisColumns(a.axis, a.state, a.time_diff, a.shot_delay, a.shot_delay < recent_stop_ns)
+            for a in trans.axes
+        )
+    return BatchResult(
+        trans.shot_index, trans.shot_time, state, color, trans.time_diff, trans.shot_delay, recent, axes,
+    )
+
+def classify_batch(
+    timestamps: np.ndarray,
+    kinds: np.ndarray,
+    keys: np.ndarray,
+    early_release_ns: int = EARLY_RELEASE_WINDOW_NS,
+    recent_stop_ns: int = RECENT_STOP_WINDOW_NS,
+    green_ns: int = GREEN_THRESHOLD_NS,
+    axes: Sequence[Axis] = DEFAULT_AXES,
+) -> BatchResult:
+    """prepare -> transitions -> classify_transitions；参数扫描时可分别复用前两步"""
+    trans = transitions(prepare(timestamps, kinds, keys, axes), early_release_ns)
+    return classify_transitions(trans, recent_stop_ns, green_ns)
+
+def load_session(path: str):
+    """读取会话日志为 (timestamps, kinds, keys) 三列"""
+    with SessionReader(path) as reader:
+        view = reader.buffer
+        try:
+            records = np.frombuffer(view, dtype=RECORD_DTYPE).copy()
+        finally:
+            view.release()
+    return records["t"], records["kind"], records["key"]
+
+def classify_scalar(timestamps: Sequence[int], kinds: Sequence[int], keys: Sequence[int],
+                    **options) -> List[ShotResult]:
+    """逐事件调用 MovementClassifier，作为差分对照 (options 为构造参数：阈值和 axes)"""
+    classifier = MovementClassifier(**options)
+    results = []
+    for t, kind, key in zip(timestamps, kinds, keys):
+        if kind == EV_PRESS:
+            classifier.on_press(key, t)
+        elif kind == EV_RELEASE:
+            classifier.on_release(key, t)
+        elif kind == EV_SHOT:
+            results.append(classifier.classify_shot(t))
+    return results
+
+def random_events(n: int, seed: int, start_ns: int = 0):
+    """随机事件流：包含自动重复按下、松开未按下的键、时间戳相同等边界情况"""
+    rnd = random.Random(seed)
+    t = start_ns
+    timestamps, kinds, keys = [], [], []
+    for _ in range(n):
+        # 多数间隔落在阈值附近，也有 0 间隔和长时间空闲
+        t += rnd.choice((0, rnd.randint(1, 40), rnd.randint(1, 400), rnd.randint(1, 3000))) * 100_000
+        r = rnd.random()
+        if r < 0.25:
+            kinds.append(EV_SHOT)
+            keys.append(NO_KEY)
+        else:
+            kinds.append(EV_PRESS if r < 0.65 else EV_RELEASE)
+            keys.append(rnd.randrange(len(KEYS)))
+        timestamps.append(t)
+    return (np.array(timestamps, dtype=np.int64), np.array(kinds, dtype=np.uint8),
+            np.array(keys, dtype=np.uint8))
+
+def verify(timestamps, kinds, keys, **options) -> int:
+    """批量与逐事件分类逐条比较，返回开枪数；不一致时抛出 AssertionError"""
+    expected = classify_scalar(timestamps.tolist(), kinds.tolist(), keys.tolist(), **options)
+    actual = classify_batch(timestamps, kinds, keys, **options).to_shot_results()
+    assert len(expected) == len(actual), f"shot count {len(actual)} != {len(expected)}"
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        assert e == a, f"shot #{i}: batch={a} scalar={e}"
+    return len(expected)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量化批量分类 / 与逐事件分类器的差分校验")
+    parser.add_argument("logs", nargs="*", help="会话日志 (session_log 格式)")
+    parser.add_argument("--seeds", type=int, default=50, help="随机事件流数量")
+    parser.add_argument("--events", type=int, default=20_000, help="每个随机事件流的事件数")
+    parser.add_argument("--bench", type=int, default=2_000_000, help="吞吐测试事件数 (0 跳过)")
+    parser.add_argument("--axes", default=DEFAULT_AXES_SPEC, help="急停轴 (日志校验和吞吐测试使用)，如 AD,WS")
+    args = parser.parse_args()
+    axes = parse_axes(args.axes)
+
+    shots = 0
+    for seed in range(args.seeds):
+        # 一半从 0 开始，覆盖 "从未急停" 的初始状态；每三个种子中有一个使用随机阈值；
+        # 单轴 (A/D) 和双轴 (A/D + W/S) 交替
+        options = {"axes": DEFAULT_AXES if seed % 4 < 2 else parse_axes("AD,WS")}
+        if seed % 3 == 1:
+            rnd = random.Random(seed)
+            options.update(
+                early_release_ns=rnd.randint(1, 1000) * 1_000_000,
+                recent_stop_ns=rnd.randint(1, 2000) * 1_000_000,
+                green_ns=rnd.randint(0, 100) * 1_000_000,
+            )
+        shots += verify(*random_events(args.events, seed, start_ns=0 if seed % 2 else 10**12), **options)
+    for path in args.logs:
+        shots += verify(*load_session(path), axes=axes)
+    print(f"verified {shots} shots ({args.seeds} random streams, {len(args.logs)} logs): identical")
+
+    if args.bench:
+        data = random_events(args.bench, seed=12345)
+        start = time.perf_counter()
+        classify_batch(*data, axes=axes)
+        elapsed = time.perf_counter() - start
+        print(f"batch: {args.bench / elapsed / 1e6:.1f} M events/s")
@@ -0,0 +1,1243 @@
+# benchmark.py
+"""基准测试套件：无需真实输入设备，结果以 JSON 输出以便跨提交对比
+
+    python benchmark.py                       # 运行全部
+    python benchmark.py classifier websocket  # 只运行指定项
+    python benchmark.py --output bench.json
+"""
+import argparse
+import asyncio
+import enum
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+from classifier import (
+    MovementClassifier, ShotResult, COLOR_RED, COLOR_GREEN, COLOR_ORANGE, COLOR_GRAY,
+    EARLY_RELEASE_WINDOW_NS, RECENT_STOP_WINDOW_NS, GREEN_THRESHOLD_NS,
+)
+from clock import measure_resolution
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import KEYS
+import synthetic
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], dict]] = {}
+
+def benchmark(name: str):
+    """注册一个基准测试项"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+def percentiles(samples: List[int]) -> Dict[str, float]:
+    """纳秒样本 -> 常用分位数 (微秒)"""
+    ordered = sorted(samples)
+    n = len(ordered)
+    pick = lambda q: ordered[min(n - 1, int(n * q))] / 1000.0
+    return {
+        "p50_us": pick(0.50),
+        "p90_us": pick(0.90),
+        "p99_us": pick(0.99),
+        "p999_us": pick(0.999),
+        "max_us": ordered[-1] / 1000.0,
+        "mean_us": statistics.fmean(ordered) / 1000.0,
+    }
+
+def _timer_overhead_ns(rounds: int = 100_000) -> int:
+    """两次连续 perf_counter_ns 之间的中位开销，用于扣除计时本身的成本"""
+    clock = time.perf_counter_ns
+    samples = []
+    for _ in range(rounds):
+        t0 = clock()
+        samples.append(clock() - t0)
+    return int(statistics.median(samples))
+
+@benchmark("clock")
+def bench_clock(args) -> dict:
+    return measure_resolution()
+
+@benchmark("classifier")
+def bench_classifier(args) -> dict:
+    events = synthetic.generate(args.events, seed=args.seed)
+    shots = sum(1 for _, kind, _ in events if kind == EV_SHOT)
+
+    # 吞吐：不计时单个事件
+    classifier = MovementClassifier()
+    on_press, on_release, classify = classifier.on_press, classifier.on_release, classifier.classify_shot
+    start = time.perf_counter_ns()
+    for t, kind, key in events:
+        if kind == EV_PRESS:
+            on_press(key, t)
+        elif kind == EV_RELEASE:
+            on_release(key, t)
+        else:
+            classify(t)
+    elapsed = time.perf_counter_ns() - start
+
+    # 单事件延迟：逐个计时并扣除计时器开销
+    overhead = _timer_overhead_ns()
+    classifier = MovementClassifier()
+    clock = time.perf_counter_ns
+    latencies = {EV_PRESS: [], EV_RELEASE: [], EV_SHOT: []}
+    for t, kind, key in events:
+        if kind == EV_PRESS:
+            t0 = clock(); classifier.on_press(key, t); t1 = clock()
+        elif kind == EV_RELEASE:
+            t0 = clock(); classifier.on_release(key, t); t1 = clock()
+        else:
+            t0 = clock(); classifier.classify_shot(t); t1 = clock()
+        latencies[kind].append(max(0, t1 - t0 - overhead))
+
+    return {
+        "events": len(events),
+        "shots": shots,
+        "events_per_sec": len(events) / (elapsed / 1e9),
+        "timer_overhead_ns": overhead,
+        "on_press": percentiles(latencies[EV_PRESS]),
+        "on_release": percentiles(latencies[EV_RELEASE]),
+        "classify_shot": percentiles(latencies[EV_SHOT]),
+    }
+
+class _FakeKeyCode:
+    """pynput KeyCode 的替身 (基准环境没有输入设备)"""
+    __slots__ = ("char", "vk")
+
+    def __init__(self, char, vk) -> None:
+        self.char = char
+        self.vk = vk
+
+class _FakeKey(enum.Enum):
+    """pynput Key 的替身：特殊键没有 char/vk 属性"""
+    shift = 1
+    ctrl = 2
+    space = 3
+    enter = 4
+
+class _LegacyKeyState:
+    def __init__(self) -> None:
+        self.press_time = 0
+        self.release_time = 0
+        self.is_held = False
+
+class _LegacyClassifier:
+    """改为槽位数组之前的按键状态存储 (Dict[str, dataclass])，只保留按下/松开路径"""
+
+    def __init__(self) -> None:
+        self.keys = {"W": _LegacyKeyState(), "A": _LegacyKeyState(), "S": _LegacyKeyState(), "D": _LegacyKeyState()}
+        self.last_transition_time = 0
+        self.last_transition_type = "None"
+        self.last_transition_diff = 0
+        self.early_release_ns = 300_000_000
+
+    def on_press(self, key: str, timestamp: int) -> None:
+        if key not in self.keys: return
+        self.keys[key].press_time = timestamp
+        self.keys[key].is_held = True
+        if key in ("A", "D"):
+            opp_state = self.keys["D" if key == "A" else "A"]
+            if not opp_state.is_held and (timestamp - opp_state.release_time) < self.early_release_ns:
+                self.last_transition_type = "EarlyRelease"
+                self.last_transition_diff = timestamp - opp_state.release_time
+                self.last_transition_time = timestamp
+
+    def on_release(self, key: str, timestamp: int) -> None:
+        if key not in self.keys: return
+        self.keys[key].release_time = timestamp
+        self.keys[key].is_held = False
+        if key in ("A", "D"):
+            opp_state = self.keys["D" if key == "A" else "A"]
+            if opp_state.is_held:
+                overlap = timestamp - opp_state.press_time
+                if overlap > 0:
+                    self.last_transition_type = "Overlap"
+                    self.last_transition_diff = overlap
+                    self.last_transition_time = timestamp
+
+@benchmark("dispatch")
+def bench_dispatch(args) -> dict:
+    """键盘钩子回调的单事件成本：旧的 hasattr/upper/集合判断 + 字符串字典状态 vs 查表 + 槽位数组；
+    分别统计绑定的移动键和聊天打字/修饰键等无关按键"""
+    import threading
+    from bindings import build_key_table
+
+    rnd = random.Random(args.seed)
+    movement = [(_FakeKeyCode(k.lower(), ord(k)), rnd.random() < 0.5) for k in KEYS for _ in range(250)]
+    chat = [_FakeKeyCode(c, ord(c.upper())) for c in "hello nice shot gg wp 123"] * 40
+    other = [(k, rnd.random() < 0.5) for k in chat + list(_FakeKey) * 50]
+    lock = threading.Lock()
+    clock = time.perf_counter_ns
+
+    legacy = _LegacyClassifier()
+
+    def legacy_dispatch(key, pressed: bool) -> None:
+        timestamp = clock()
+        try:
+            char = key.char.upper() if hasattr(key, 'char') and key.char else None
+        except AttributeError:
+            char = None
+        if char in {"W", "A", "S", "D"}:
+            with lock:
+                (legacy.on_press if pressed else legacy.on_release)(char, timestamp)
+
+    table = build_key_table("wasd")
+    classifier = MovementClassifier()
+
+    def table_dispatch(key, pressed: bool) -> None:
+        timestamp = clock()
+        slot = table.get(getattr(key, "char", None) or getattr(key, "vk", None) or key)
+        if slot is None:
+            return
+        with lock:
+            (classifier.on_press if pressed else classifier.on_release)(slot, timestamp)
+
+    def cost(dispatch, events, rounds: int = 200) -> float:
+        start = clock()
+        for _ in range(rounds):
+            for key, pressed in events:
+                dispatch(key, pressed)
+        return (clock() - start) / (rounds * len(events))
+
+    result = {}
+    for name, events in (("movement", movement), ("unbound", other)):
+        before = cost(legacy_dispatch, events)
+        after = cost(table_dispatch, events)
+        result[name] = {"before_ns": before, "after_ns": after, "speedup": before / after}
+    return result
+
+_AD_OPPOSITE = (None, 3, None, 1)
+
+class _ADClassifier:
+    """改为转移表之前只判定 A/D 的分类器 (槽位数组 + 手写分支)，作为 axes 基准的对照"""
+    __slots__ = ("early_release_ns", "recent_stop_ns", "green_ns", "press_time", "release_time", "held",
+                 "last_transition_time", "last_transition_type", "last_transition_diff")
+
+    def __init__(self) -> None:
+        self.early_release_ns = EARLY_RELEASE_WINDOW_NS
+        self.recent_stop_ns = RECENT_STOP_WINDOW_NS
+        self.green_ns = GREEN_THRESHOLD_NS
+        self.press_time = [0] * 4
+        self.release_time = [0] * 4
+        self.held = [False] * 4
+        self.last_transition_time = 0
+        self.last_transition_type = "None"
+        self.last_transition_diff = 0
+
+    def on_press(self, slot: int, timestamp: int) -> None:
+        self.press_time[slot] = timestamp
+        self.held[slot] = True
+        opposite = _AD_OPPOSITE[slot]
+        if opposite is not None:
+            gap = timestamp - self.release_time[opposite]
+            if not self.held[opposite] and gap < self.early_release_ns:
+                self.last_transition_type = "EarlyRelease"
+                self.last_transition_diff = gap
+                self.last_transition_time = timestamp
+
+    def on_release(self, slot: int, timestamp: int) -> None:
+        self.release_time[slot] = timestamp
+        self.held[slot] = False
+        opposite = _AD_OPPOSITE[slot]
+        if opposite is not None and self.held[opposite]:
+            overlap = timestamp - self.press_time[opposite]
+            if overlap > 0:
+                self.last_transition_type = "Overlap"
+                self.last_transition_diff = overlap
+                self.last_transition_time = timestamp
+
+    def classify_shot(self, shot_time: int) -> ShotResult:
+        has_recent_stop = (shot_time - self.last_transition_time) < self.recent_stop_ns
+        if self.held[1] or self.held[3]:
+            if has_recent_stop:
+                return ShotResult("Run&Gun", COLOR_RED, self.last_transition_diff,
+                                  shot_time - self.last_transition_time, shot_time)
+            return ShotResult("Run&Gun", COLOR_RED, shot_time=shot_time)
+        if has_recent_stop:
+            color = COLOR_GREEN if abs(self.last_transition_diff) <= self.green_ns else COLOR_ORANGE
+            return ShotResult(self.last_transition_type, color, self.last_transition_diff,
+                              shot_time - self.last_transition_time, shot_time)
+        return ShotResult("Static", COLOR_GRAY, shot_time=shot_time)
+
+@benchmark("axes")
+def bench_axes(args) -> dict:
+    """转移表分类器的单事件成本 (A/D 单轴、A/D+W/S 双轴) vs 原先只判定 A/D 的手写分支；
+    各实现轮流运行多轮取中位数，单轴结果须与原实现逐条相同"""
+    from classifier import parse_axes
+
+    events = synthetic.generate(args.events, seed=args.seed)
+
+    def run(classifier) -> List:
+        on_press, on_release, classify = classifier.on_press, classifier.on_release, classifier.classify_shot
+        results = []
+        append = results.append
+        for t, kind, key in events:
+            if kind == EV_PRESS:
+                on_press(key, t)
+            elif kind == EV_RELEASE:
+                on_release(key, t)
+            else:
+                append(classify(t))
+        return results
+
+    variants = {
+        "ad_branches": _ADClassifier,
+        "table_1axis": MovementClassifier,
+        "table_2axes": lambda: MovementClassifier(axes=parse_axes("AD,WS")),
+    }
+    assert run(_ADClassifier()) == run(MovementClassifier()), "single-axis table differs from A/D branches"
+    samples = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, factory in variants.items():
+            classifier = factory()
+            start = time.perf_counter_ns()
+            run(classifier)
+            samples[name].append((time.perf_counter_ns() - start) / len(events))
+    result = {"events": len(events)}
+    for name, values in samples.items():
+        result[name] = {"ns_per_event": statistics.median(values), "min_ns": min(values)}
+    baseline = result["ad_branches"]["ns_per_event"]
+    for name in ("table_1axis", "table_2axes"):
+        result[name]["vs_ad_branches"] = baseline / result[name]["ns_per_event"]
+    return result
+
+@benchmark("display")
+def bench_display(args) -> dict:
+    classifier = MovementClassifier()
+    results = []
+    for t, kind, key in synthetic.generate(args.events, seed=args.seed):
+        if kind == EV_PRESS:
+            classifier.on_press(key, t)
+        elif kind == EV_RELEASE:
+            classifier.on_release(key, t)
+        else:
+            results.append(classifier.classify_shot(t))
+
+    rounds = max(1, 200_000 // len(results))
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        for result in results:
+            result.to_display_data()
+    elapsed = time.perf_counter_ns() - start
+    calls = rounds * len(results)
+    return {"calls": calls, "ns_per_call": elapsed / calls}
+
+def _virtual_display():
+    """没有 DISPLAY 时启动 Xvfb，返回 (进程或 None, 错误信息或 None)"""
+    import shutil
+
+    if os.environ.get("DISPLAY"):
+        return None, None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, "no DISPLAY and Xvfb not found"
+    display = ":97"
+    process = subprocess.Popen([xvfb, display, "-screen", "0", "1280x720x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    if process.poll() is not None:
+        return None, f"Xvfb exited with code {process.returncode}"
+    return process, None
+
+class _RecreateSparkline:
+    """对照组：每次开枪删除全部图元后按历史重新创建 (开销随 N 线性增长)"""
+
+    def __init__(self, parent, n: int, width: int = 300, height: int = 40) -> None:
+        import tkinter as tk
+        from collections import deque
+
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="#202020", highlightthickness=0)
+        self.history = deque(maxlen=n)
+        self.slot_w = width / n
+        self.height = height
+
+    def push(self, state_type, color, time_diff, shot_delay) -> None:
+        canvas = self.canvas
+        self.history.append((state_type, color, time_diff, shot_delay))
+        canvas.delete("all")
+        mid = self.height / 2
+        for i, (state_type, color, diff, delay) in enumerate(self.history):
+            x = i * self.slot_w
+            h = max(1.0, min(abs(diff), 60 * 10**6) / (60 * 10**6) * (mid - 1)) if diff is not None else 2.0
+            y0, y1 = (mid, mid + h) if state_type == "EarlyRelease" else (mid - h, mid)
+            canvas.create_rectangle(x, y0, x + max(1.0, self.slot_w - 1), y1, width=0, fill=color)
+            if delay is not None:
+                y = self.height - min(delay, 500 * 10**6) / (500 * 10**6) * (self.height - 1) - 1
+                canvas.create_line(x, y, x + max(1.0, self.slot_w - 1), y, fill="white")
+
+@benchmark("sparkline")
+def bench_sparkline(args) -> dict:
+    """Overlay 条形图每次开枪的重绘耗时 (push + update_idletasks)，N=50/500，在虚拟 X 显示上运行
+
+    sweep/scroll 为预分配图元的 overlay.Sparkline，recreate 为每次删除重建的对照组；
+    overlay_counters 为突发开枪时 Overlay 的合并/丢弃计数。
+    """
+    display, error = _virtual_display()
+    if error:
+        return {"error": error}
+    try:
+        import tkinter as tk
+        from overlay import Sparkline
+    except ImportError as e:
+        if display is not None:
+            display.terminate()
+        return {"error": f"tkinter unavailable: {e}"}
+
+    classifier = MovementClassifier()
+    results = []
+    for t, kind, key in synthetic.generate(args.events, seed=args.seed):
+        if kind == EV_PRESS:
+            classifier.on_press(key, t)
+        elif kind == EV_RELEASE:
+            classifier.on_release(key, t)
+        else:
+            results.append(classifier.classify_shot(t))
+    shots = [(r.state_type, r.color_hex, r.time_diff, r.shot_delay) for r in results[:args.shots]]
+
+    root = tk.Tk()
+    clock = time.perf_counter_ns
+    report = {"shots": len(shots)}
+    try:
+        for n in (50, 500):
+            for mode in ("sweep", "scroll", "recreate"):
+                line = _RecreateSparkline(root, n) if mode == "recreate" else Sparkline(root, n, mode=mode)
+                line.canvas.pack()
+                root.update()
+                # 先填满一圈，测量稳态
+                for shot in shots[:n]:
+                    line.push(*shot)
+                root.update()
+                samples = []
+                for shot in shots:
+                    t0 = clock()
+                    line.push(*shot)
+                    root.update_idletasks() # 触发 Canvas 重绘
+                    samples.append(clock() - t0)
+                report[f"{mode}_n{n}"] = percentiles(samples)
+                line.canvas.destroy()
+        # 整个 Overlay：每帧之间连开 120 次 (超过 N=50)，计数器应显示合并和丢弃的更新
+        from overlay import Overlay
+        overlay = Overlay(sparkline=50)
+        try:
+            for i in range(0, len(results), 120):
+                for result in results[i:i + 120]:
+                    overlay.update_result(result)
+                overlay._tick()
+            report["overlay_counters"] = overlay.counters()
+        finally:
+            overlay.root.destroy()
+    finally:
+        root.destroy()
+        if display is not None:
+            display.terminate()
+    return report
+
+def _feed_writer(path: str, shots: int, interval_s: float, ready, seed: int) -> None:
+    """最新结果文件的写者 (独立进程)：按节奏发布 shots 次开枪"""
+    from result_feed import ResultFeed
+
+    rnd = random.Random(seed)
+    feed = ResultFeed(path)
+    ready.set()
+    time.sleep(0.2)
+    for i in range(shots):
+        feed.publish(ShotResult("Overlap", COLOR_GREEN, i * 1000, 120_000_000, time.perf_counter_ns()))
+        time.sleep(interval_s * rnd.uniform(0.5, 1.5))
+    feed.close()
+
+@benchmark("feed")
+def bench_feed(args) -> dict:
+    """result_feed：publish/poll/read 的单次开销，以及另一个进程发布后本进程轮询读到的延迟"""
+    import multiprocessing
+    import tempfile
+    from result_feed import ResultFeed, FeedReader
+
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    path = os.path.join(directory, f"cstrafe-bench-{os.getpid()}.feed")
+    results = [
+        ShotResult("Overlap", COLOR_GREEN, 8_000_000, 120_000_000, 1),
+        ShotResult("EarlyRelease", COLOR_ORANGE, -35_000_000, 90_000_000, 2),
+        ShotResult("Static", COLOR_GRAY, None, None, 3),
+    ]
+    clock = time.perf_counter_ns
+    report = {}
+    feed = ResultFeed(path)
+    reader = FeedReader(path)
+    try:
+        n = args.events
+        start = clock()
+        for i in range(n):
+            feed.publish(results[i % 3])
+        report["publish_ns"] = (clock() - start) / n
+        reader.poll()
+        start = clock()
+        for _ in range(n):
+            reader.poll()
+        report["poll_unchanged_ns"] = (clock() - start) / n
+        start = clock()
+        for _ in range(n):
+            reader.read()
+        report["read_ns"] = (clock() - start) / n
+    finally:
+        reader.close()
+        feed.close()
+
+    # 跨进程：读者忙轮询 (无系统调用)，延迟 = 读到的时刻 - 写者的发布时刻
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    writer = ctx.Process(target=_feed_writer, args=(path, args.shots, 0.001, ready, args.seed))
+    writer.start()
+    ready.wait()
+    reader = FeedReader(path)
+    latencies = []
+    try:
+        while True:
+            alive = writer.is_alive()
+            record = reader.poll()
+            if record is not None:
+                latencies.append(clock() - record.published_ns)
+            elif not alive:
+                break
+        writer.join()
+        report["cross_process"] = {
+            "published": args.shots, "observed": len(latencies), "missed": reader.missed,
+            "torn_retries": reader.retries, "latency": percentiles(latencies) if latencies else None,
+        }
+    finally:
+        reader.close()
+        os.unlink(path)
+    return report
+
+def serve_in_thread(app, host: str = "127.0.0.1"):
+    """在后台线程中启动 uvicorn (随机端口)，返回 (server, loop, port)"""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(app=app, loop="asyncio", log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.serve(sockets=[sock]))
+
+    threading.Thread(target=run, name="bench-uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, loop, port
+
+@benchmark("websocket")
+def bench_websocket(args) -> dict:
+    """开枪 -> 分类 -> broadcast_shot -> 本地客户端收到 WebSocket 帧 的端到端延迟"""
+    from websockets.sync.client import connect
+    import server
+
+    uv_server, loop, port = serve_in_thread(server.app)
+    server.loop = loop
+    try:
+        classifier = MovementClassifier()
+        clock = time.perf_counter_ns
+        latencies = []
+        with connect(f"ws://127.0.0.1:{port}/ws") as ws:
+            ws.recv() # 握手消息 (epoch/seq)
+            # 等待服务端登记连接
+            while not server.manager.active_connections:
+                time.sleep(0.001)
+            for _ in range(args.shots):
+                t0 = clock()
+                server.broadcast_shot(classifier.classify_shot(t0))
+                ws.recv()
+                latencies.append(clock() - t0)
+        return {"shots": args.shots, "click_to_frame": percentiles(latencies)}
+    finally:
+        uv_server.should_exit = True
+
+@benchmark("fanout")
+def bench_fanout(args) -> dict:
+    """不同观众数量下，一次广播到所有客户端都收到的延迟；另有一个从不读取的客户端模拟卡死的浏览器源"""
+    from websockets.asyncio.client import connect
+    import server
+
+    uv_server, loop, port = serve_in_thread(server.app)
+    server.loop = loop
+    url = f"ws://127.0.0.1:{port}/ws"
+    classifier = MovementClassifier()
+    clock = time.perf_counter_ns
+
+    async def run(viewers: int) -> dict:
+        stalled = await connect(url)
+        clients = [await connect(url) for _ in range(viewers)]
+        await asyncio.gather(*(c.recv() for c in clients)) # 握手消息
+        while len(server.manager.clients) < viewers + 1:
+            await asyncio.sleep(0.001)
+        latencies = []
+        for _ in range(args.shots // 4):
+            t0 = clock()
+            server.broadcast_shot(classifier.classify_shot(t0))
+            await asyncio.gather(*(c.recv() for c in clients))
+            latencies.append(clock() - t0)
+        for c in clients + [stalled]:
+            await c.close()
+        while server.manager.clients:
+            await asyncio.sleep(0.001)
+        return percentiles(latencies)
+
+    try:
+        return {f"viewers_{n}": asyncio.run(run(n)) for n in (1, 10, 100)}
+    finally:
+        uv_server.should_exit = True
+
+@benchmark("protocol")
+def bench_protocol(args) -> dict:
+    """JSON 文本帧与二进制帧的大小、编码/解码吞吐对比 (同时校验二进制帧可无损还原)"""
+    from protocol import encode_frame, decode_frame
+
+    classifier = MovementClassifier()
+    payloads = []
+    for t, kind, key in synthetic.generate(args.events, seed=args.seed):
+        if kind == EV_PRESS:
+            classifier.on_press(key, t)
+        elif kind == EV_RELEASE:
+            classifier.on_release(key, t)
+        else:
+            payloads.append(classifier.classify_shot(t).to_display_data())
+
+    texts = [json.dumps({**p, "seq": i}) for i, p in enumerate(payloads)]
+    frames = [encode_frame(p, i) for i, p in enumerate(payloads)]
+    for i, (p, frame) in enumerate(zip(payloads, frames)):
+        assert decode_frame(frame) == (p, i), f"binary round trip mismatch: {p}"
+
+    def rate(func, items) -> float:
+        start = time.perf_counter_ns()
+        for item in items:
+            func(item)
+        return len(items) / ((time.perf_counter_ns() - start) / 1e9)
+
+    indexed = list(enumerate(payloads))
+    return {
+        "messages": len(payloads),
+        "json_bytes_mean": statistics.fmean(len(t.encode()) for t in texts),
+        "binary_bytes": len(frames[0]),
+        "json_encode_per_sec": rate(json.dumps, payloads),
+        "json_decode_per_sec": rate(json.loads, texts),
+        "binary_encode_per_sec": rate(lambda item: encode_frame(item[1], item[0]), indexed),
+        "binary_decode_per_sec": rate(decode_frame, frames),
+    }
+
+@benchmark("history")
+def bench_history(args) -> dict:
+    """历史库：持续写入速率 (后台批量写线程) 和百万行规模下的查询延迟"""
+    import os
+    import tempfile
+    from history import HistoryStore
+
+    classifier = MovementClassifier()
+    results = []
+    for t, kind, key in synthetic.generate(200_000, seed=args.seed):
+        if kind == EV_PRESS:
+            classifier.on_press(key, t)
+        elif kind == EV_RELEASE:
+            classifier.on_release(key, t)
+        else:
+            results.append(classifier.classify_shot(t))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        store = HistoryStore(path, session_id="bench-0")
+        day_ns = 24 * 3600 * 10**9
+        base = time.time_ns() - 30 * day_ns
+        rows = args.rows
+        start = time.perf_counter_ns()
+        for i in range(rows):
+            # 分布在 30 天、10 个会话里
+            if i % (rows // 10 or 1) == 0:
+                store.session_id = f"bench-{i * 10 // rows}"
+            store.add(results[i % len(results)], wall_ns=base + i * (30 * day_ns // rows))
+        enqueue = time.perf_counter_ns() - start
+        store.close()
+        total = time.perf_counter_ns() - start
+
+        def timed(func, repeat=20) -> Dict[str, float]:
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter_ns()
+                func()
+                samples.append(time.perf_counter_ns() - t0)
+            return percentiles(samples)
+
+        return {
+            "rows": rows,
+            "enqueue_ns_per_row": enqueue / rows,
+            "sustained_inserts_per_sec": rows / (total / 1e9),
+            "db_bytes": os.path.getsize(path),
+            "query_shots_by_session_type": timed(lambda: store.shots("bench-5", "Overlap", limit=1000)),
+            "query_daily": timed(store.daily),
+            "query_sessions": timed(store.sessions, repeat=3),
+        }
+
+@benchmark("metrics")
+def bench_metrics(args) -> dict:
+    """埋点开销：关闭时的判断成本和开启时一次计时+observe 的成本"""
+    import metrics
+
+    rounds = 1_000_000
+    was_enabled = metrics.enabled
+    hist = metrics.Histogram("bench", "bench")
+
+    def run() -> float:
+        clock = time.perf_counter_ns
+        start = clock()
+        for _ in range(rounds):
+            if metrics.enabled:
+                t0 = metrics.clock()
+                hist.observe(metrics.clock() - t0)
+        return (clock() - start) / rounds
+
+    def baseline() -> float:
+        clock = time.perf_counter_ns
+        start = clock()
+        for _ in range(rounds):
+            pass
+        return (clock() - start) / rounds
+
+    try:
+        empty = baseline()
+        metrics.set_enabled(False)
+        disabled = run() - empty
+        metrics.set_enabled(True)
+        enabled = run() - empty
+    finally:
+        metrics.set_enabled(was_enabled)
+    return {"disabled_ns_per_site": disabled, "enabled_ns_per_site": enabled}
+
+def _import_times(modules: List[str]) -> Tuple[Dict[str, float], Set[str]]:
+    """用 -X importtime 逐个导入模块，返回 (顶层模块的累计导入耗时 ms, 导入后 sys.modules 中的全部模块名)
+
+    单个模块导入失败 (例如无显示环境下的 pynput) 不影响其余模块的统计；
+    解释器启动本身就会导入的模块 (site 等) 不计入耗时。间接导入的模块只出现在第二项中，
+    禁止加载的检查要用它，耗时预算只用第一项 (顶层的累计耗时已包含间接导入)。
+    """
+    statement = (
+        "import sys\n"
+        f"for name in {modules!r}:\n"
+        "    try:\n"
+        "        __import__(name)\n"
+        "    except Exception as e:\n"
+        "        print(f'import-error {name}: {e}'.splitlines()[0], file=sys.stderr)\n"
+        "print('loaded-modules ' + ' '.join(sorted(sys.modules)))\n"
+    )
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True)
+    loaded: Set[str] = set()
+    for line in proc.stdout.splitlines():
+        if line.startswith("loaded-modules "):
+            loaded.update(line.split()[1:])
+    times = {}
+    errors = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import-error "):
+            errors.append(line[len("import-error "):])
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 嵌套导入的模块名带缩进，只统计顶层
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative) / 1000.0
+    for name in _BASELINE_MODULES:
+        times.pop(name, None)
+    if errors:
+        times["<error>"] = "; ".join(errors)
+    return times, loaded
+
+# 空解释器启动时就会导入的模块
+_BASELINE_MODULES = ("site", "encodings", "encodings.utf_8", "encodings.aliases", "_signal",
+                     "_frozen_importlib_external", "io", "zipimport", "abc", "codecs", "stat",
+                     "_collections_abc", "genericpath", "posixpath", "os", "_sitebuiltins", "ntpath")
+
+def _hook_ready(mode_args: List[str]) -> dict:
+    """启动 main.py --startup-probe，测量从创建进程到钩子就绪的时间"""
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, "main.py", *mode_args, "--startup-probe"],
+                              capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        return {"error": "timeout"}
+    wall_ms = (time.perf_counter() - start) * 1000
+    for line in proc.stdout.splitlines():
+        if line.startswith("startup-probe hook_ready_ms="):
+            return {"hook_ready_ms": float(line.split("=", 1)[1]), "process_ready_ms": wall_ms}
+    tail = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+    return {"error": tail}
+
+@benchmark("startup")
+def bench_startup(args) -> dict:
+    """各模式的导入开销和钩子就绪时间，超出 startup_budget.json 的预算时记录 violations"""
+    with open(args.budget) as f:
+        budget = json.load(f)
+    violations = []
+
+    main_times, _ = _import_times(["main"])
+    main_ms = main_times.get("main", 0.0)
+    if main_ms > budget["main_import_ms"]:
+        violations.append(f"import main: {main_ms:.1f}ms > {budget['main_import_ms']}ms")
+    result = {"main_import_ms": main_ms, "modes": {}, "violations": violations}
+
+    for mode, cfg in budget["modes"].items():
+        times, modules = _import_times(cfg["modules"])
+        imports_ms = sum(v for v in times.values() if isinstance(v, float))
+        loaded = [m for m in cfg["forbidden"] if m in modules]
+        hook = _hook_ready(cfg["args"])
+        result["modes"][mode] = {
+            "imports_ms": imports_ms,
+            "per_module_ms": dict(sorted(
+                ((k, v) for k, v in times.items() if isinstance(v, float)), key=lambda kv: -kv[1]
+            )[:15]),
+            "forbidden_loaded": loaded,
+            **hook,
+        }
+        if "<error>" in times:
+            result["modes"][mode]["import_error"] = times["<error>"]
+        if imports_ms > cfg["imports_ms"]:
+            violations.append(f"{mode}: imports {imports_ms:.1f}ms > {cfg['imports_ms']}ms")
+        if loaded:
+            violations.append(f"{mode}: imports modules it does not need: {', '.join(loaded)}")
+        # 无显示/无输入设备的环境里钩子无法启动，此时只检查导入预算
+        if "hook_ready_ms" in hook and hook["hook_ready_ms"] > cfg["hook_ready_ms"]:
+            violations.append(f"{mode}: hook ready {hook['hook_ready_ms']:.0f}ms > {cfg['hook_ready_ms']}ms")
+    return result
+
+def _ingest_agents(port: int, names: List[str], duration_s: float, seed: int) -> None:
+    """模拟多个 agent (在独立进程中运行)：按真实节奏把各玩家的合成事件逐个发成 UDP 数据报"""
+    import heapq
+    from ingest import encode_packet
+
+    duration_ns = int(duration_s * 1e9)
+    streams = []
+    for i, name in enumerate(names):
+        events = synthetic.generate(int(duration_s * 50), seed=seed + i)
+        base = events[0][0]
+        streams.append([(ts - base, name, ts, kind, key) for ts, kind, key in events if ts - base < duration_ns])
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    seqs = dict.fromkeys(names, 0)
+    start = time.perf_counter_ns()
+    for offset, name, ts, kind, key in heapq.merge(*streams):
+        delay = start + offset - time.perf_counter_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+        seqs[name] += 1
+        sock.sendto(encode_packet(name, seqs[name], ((ts, kind, key),)), ("127.0.0.1", port))
+    sock.close()
+
+@benchmark("ingest")
+def bench_ingest(args) -> dict:
+    """多玩家接入负载测试：模拟 agent 在独立进程中按真实节奏发送事件，每个玩家一个 HUD 观众，
+    测量事件循环线程的 CPU 占用，并换算出单核可承载的玩家数"""
+    import multiprocessing
+    from websockets.asyncio.client import connect
+    import server
+    from ingest import start_ingest
+
+    server.players.max_players = sum(args.players) # 各轮使用不同的玩家名
+    uv_server, loop, _ = serve_in_thread(server.app)
+    http_port = uv_server.servers[0].sockets[0].getsockname()[1]
+    transport = asyncio.run_coroutine_threadsafe(start_ingest(server.players, "127.0.0.1", 0), loop).result()
+    udp_port = transport.get_extra_info("sockname")[1]
+
+    async def loop_cpu() -> float:
+        return time.thread_time()
+
+    async def run(count: int) -> dict:
+        names = [f"p{count}-{i}" for i in range(count)]
+        viewers = [await connect(f"ws://127.0.0.1:{http_port}/ws/{name}") for name in names]
+        await asyncio.gather(*(ws.recv() for ws in viewers)) # 握手消息
+        while sum(len(server.players.get(n).manager.clients) for n in names) < count:
+            await asyncio.sleep(0.001)
+        received = 0
+
+        async def drain(ws):
+            nonlocal received
+            async for _ in ws:
+                received += 1
+
+        tasks = [asyncio.create_task(drain(ws)) for ws in viewers]
+        agents = multiprocessing.Process(target=_ingest_agents, args=(udp_port, names, args.duration, args.seed))
+        cpu0 = asyncio.run_coroutine_threadsafe(loop_cpu(), loop).result()
+        wall0 = time.perf_counter()
+        agents.start()
+        await asyncio.to_thread(agents.join)
+        await asyncio.sleep(0.2) # 等待最后的数据报和 HUD 消息
+        wall = time.perf_counter() - wall0
+        cpu = asyncio.run_coroutine_threadsafe(loop_cpu(), loop).result() - cpu0
+        for ws in viewers:
+            await ws.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        players = [server.players.get(n) for n in names]
+        events = sum(p.events for p in players)
+        shots = sum(p.shots for p in players)
+        load = cpu / wall
+        return {
+            "events": events,
+            "events_per_s": events / wall,
+            "shots": shots,
+            "hud_messages": received,
+            "lost": sum(p.lost for p in players),
+            "loop_cpu_pct": load * 100,
+            "cpu_us_per_event": cpu / events * 1e6 if events else None,
+            "players_per_core": count / load if load else None,
+        }
+
+    try:
+        return {f"players_{n}": asyncio.run(run(n)) for n in args.players}
+    finally:
+        transport.close()
+        uv_server.should_exit = True
+
+def _inject_input(fifo: str, duration_s: float, interval_s: float, seed: int) -> None:
+    """模拟输入设备 (独立进程，不受被测进程负载影响)：按节奏写入 input_event 记录，时间戳为写入时刻
+
+    每次写入一个 A/D 按键事件和一次左键；perf_counter_ns 在 Linux 上就是 CLOCK_MONOTONIC，与读端同源。
+    """
+    from evdev_input import INPUT_EVENT, EV_KEY, EV_SYN, BTN_LEFT, KEY_CODES
+
+    rnd = random.Random(seed)
+    fd = os.open(fifo, os.O_WRONLY)
+    end = time.perf_counter() + duration_s
+    i = 0
+    while time.perf_counter() < end:
+        sec, usec = divmod(time.perf_counter_ns() // 1000, 1_000_000)
+        key = KEY_CODES["a" if i % 4 < 2 else "d"]
+        os.write(fd, INPUT_EVENT.pack(sec, usec, EV_KEY, key, 1 - i % 2) + INPUT_EVENT.pack(sec, usec, EV_SYN, 0, 0)
+                 + INPUT_EVENT.pack(sec, usec, EV_KEY, BTN_LEFT, 1) + INPUT_EVENT.pack(sec, usec, EV_SYN, 0, 0))
+        i += 1
+        time.sleep(interval_s * rnd.uniform(0.5, 1.5))
+    os.close(fd)
+
+def _ws_viewers(port: int, count: int, stop) -> None:
+    """HUD 观众 (独立进程)：连接后一直读取，直到 stop 被设置"""
+    from websockets.asyncio.client import connect
+
+    async def run():
+        clients = [await connect(f"ws://127.0.0.1:{port}/ws") for _ in range(count)]
+
+        async def drain(ws):
+            try:
+                async for _ in ws:
+                    pass
+            except Exception:
+                pass
+
+        tasks = [asyncio.create_task(drain(ws)) for ws in clients]
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        for ws in clients:
+            await ws.close()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+@benchmark("capture")
+def bench_capture(args) -> dict:
+    """钩子延迟 (输入时刻 -> 分类完成) 在服务器负载下的表现：钩子与服务器同进程 vs 独立采集进程 (--capture-process)
+
+    输入来自 evdev 后端读取的 FIFO，由独立进程按节奏写入带时间戳的记录，
+    因此测得的延迟就是 pynput 会计入事件时间戳的那部分 (等待 GIL 和调度)。
+    负载：同进程的 uvicorn 以约 2000 条/秒向 --viewers 个 WebSocket 观众广播 JSON。
+    """
+    import multiprocessing
+    import tempfile
+    import server
+    from evdev_input import EvdevListener
+    from shm_ring import CaptureProcess
+
+    ctx = multiprocessing.get_context("spawn")
+    uv_server, loop, port = serve_in_thread(server.app)
+    server.loop = loop
+    clock = time.perf_counter_ns
+    payload = {"type": "Overlap", "color": "#228b22", "diff": 12, "delay": 140,
+               "history": [{"type": "Static", "diff": None, "delay": None}] * 20}
+
+    def publisher(stop: threading.Event) -> None:
+        while not stop.is_set():
+            loop.call_soon_threadsafe(server.manager.publish, payload)
+            time.sleep(0.0005)
+
+    def run(mode: str, loaded: bool) -> dict:
+        fifo = os.path.join(tempfile.mkdtemp(), "input.fifo")
+        os.mkfifo(fifo)
+        hook, delivered = [], []
+        if mode == "in_process":
+            def on_shot(result):
+                hook.append(clock() - result.shot_time)
+            listener = EvdevListener(on_shot, devices=[fifo])
+        else:
+            def on_shot(result):
+                hook.append(listener.last_published_ns - result.shot_time)
+                delivered.append(clock() - result.shot_time)
+            listener = CaptureProcess(on_shot, "evdev", [fifo])
+        listener.start()
+        listener.wait_ready()
+
+        stop_load, stop_viewers, viewers = threading.Event(), ctx.Event(), None
+        if loaded:
+            viewers = ctx.Process(target=_ws_viewers, args=(port, args.viewers, stop_viewers))
+            viewers.start()
+            while len(server.manager.clients) < args.viewers:
+                time.sleep(0.01)
+            threading.Thread(target=publisher, args=(stop_load,), daemon=True).start()
+        sent0 = server.manager.sent
+        injector = ctx.Process(target=_inject_input, args=(fifo, args.duration, 0.01, args.seed))
+        injector.start()
+        injector.join()
+        time.sleep(0.2)
+        stop_load.set()
+        sent = server.manager.sent - sent0
+        if viewers is not None:
+            stop_viewers.set()
+            viewers.join()
+        listener.stop()
+        os.unlink(fifo)
+        result = {"shots": len(hook), "hook": percentiles(hook), "broadcasts_per_s": sent / args.duration}
+        if delivered:
+            result["delivered"] = percentiles(delivered)
+        return result
+
+    try:
+        return {
+            f"{mode}_{'loaded' if loaded else 'idle'}": run(mode, loaded)
+            for loaded in (False, True) for mode in ("in_process", "capture_process")
+        }
+    finally:
+        uv_server.should_exit = True
+
+def _relay_viewers(url: str, count: int, connected, stop, out) -> None:
+    """模拟 count 个 HUD 观众 (独立进程)：记录每条消息的投递延迟 (接收时刻 - 上游发布时刻)"""
+    from websockets.asyncio.client import connect
+
+    clock = time.perf_counter_ns
+    samples: List[int] = []
+
+    async def read(ws):
+        try:
+            async for text in ws:
+                now = clock()
+                sent = json.loads(text).get("sent_ns")
+                if sent is not None:
+                    samples.append(now - sent)
+        except Exception:
+            pass
+
+    async def run():
+        clients = []
+        # 分批连接，避免一次性超过监听队列长度
+        for start in range(0, count, 100):
+            clients += await asyncio.gather(*(connect(url, open_timeout=30) for _ in range(min(100, count - start))))
+        tasks = [asyncio.create_task(read(ws)) for ws in clients]
+        with connected.get_lock():
+            connected.value += count
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        for ws in clients:
+            await ws.close()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    out.put(samples)
+
+def _process_cpu_s(pid: int, tree: bool = True) -> float:
+    """进程 (及其子进程) 的用户态 + 内核态 CPU 秒数，读取 /proc (仅 Linux)"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    total = (int(fields[11]) + int(fields[12])) / ticks
+    if tree:
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                children = [int(c) for c in f.read().split()]
+        except OSError:
+            children = []
+        for child in children:
+            try:
+                total += _process_cpu_s(child)
+            except OSError:
+                pass
+    return total
+
+@benchmark("relay")
+def bench_relay(args) -> dict:
+    """数千个 WebSocket 观众的投递延迟和 CPU：观众直连采集节点 vs 经 relay.py (1..N 个工作进程)
+
+    采集节点是本进程中的 server.app，按 --relay-rate 发布结果，每条带发布时刻 (CLOCK_MONOTONIC，跨进程可比)。
+    观众分布在多个进程中 (每个进程 500 个连接)。cpu_cores_per_1k_viewers 是扇出一侧 (直连时为采集节点本身，
+    中继时为中继的全部进程) 平均占用的核数除以千观众数；capture_node_cpu_cores 是采集节点进程的占用。
+    """
+    import multiprocessing
+    import server
+
+    ctx = multiprocessing.get_context("spawn")
+    uv_server, loop, port = serve_in_thread(server.app)
+    server.loop = loop
+    clock = time.perf_counter_ns
+    upstream = f"ws://127.0.0.1:{port}/ws"
+
+    def publisher(stop: threading.Event) -> None:
+        interval = 1.0 / args.relay_rate
+        i = 0
+        while not stop.is_set():
+            data = {"type": "Overlap", "color": COLOR_GREEN, "diff": i % 40, "delay": 120, "sent_ns": clock()}
+            loop.call_soon_threadsafe(server.manager.publish, data)
+            i += 1
+            time.sleep(interval)
+
+    def run(viewers: int, workers: int) -> dict:
+        relay = None
+        url = upstream
+        if workers:
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                relay_port = probe.getsockname()[1]
+            relay = subprocess.Popen(
+                [sys.executable, "relay.py", upstream, "--host", "127.0.0.1", "--port", str(relay_port),
+                 "--workers", str(workers)],
+                cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+            )
+            url = f"ws://127.0.0.1:{relay_port}/ws"
+            while len(server.manager.clients) < 1:
+                time.sleep(0.05)
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", relay_port), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+        connected, stop_viewers, out = ctx.Value("i", 0), ctx.Event(), ctx.Queue()
+        groups = [min(500, viewers - start) for start in range(0, viewers, 500)]
+        processes = [ctx.Process(target=_relay_viewers, args=(url, n, connected, stop_viewers, out)) for n in groups]
+        for p in processes:
+            p.start()
+        while connected.value < viewers:
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        stop_publish = threading.Event()
+        sent0 = server.manager.sent
+        cpu0 = time.process_time()
+        relay_cpu0 = _process_cpu_s(relay.pid) if relay else 0.0
+        start = time.perf_counter()
+        threading.Thread(target=publisher, args=(stop_publish,), daemon=True).start()
+        time.sleep(args.duration)
+        stop_publish.set()
+        elapsed = time.perf_counter() - start
+        capture_cpu = time.process_time() - cpu0
+        relay_cpu = _process_cpu_s(relay.pid) - relay_cpu0 if relay else 0.0
+        sent = server.manager.sent - sent0
+        time.sleep(1.0) # 等待最后几条送达
+
+        stop_viewers.set()
+        samples: List[int] = []
+        for _ in processes:
+            samples += out.get()
+        for p in processes:
+            p.join()
+        if relay is not None:
+            relay.terminate()
+            relay.wait(10)
+        while server.manager.clients:
+            time.sleep(0.01)
+
+        fanout_cpu = relay_cpu if relay else capture_cpu
+        result = {
+            "viewers": viewers,
+            "messages": sent,
+            "delivered": len(samples),
+            "delivered_ratio": len(samples) / (sent * viewers) if sent else None,
+            "capture_node_cpu_cores": capture_cpu / elapsed,
+            "cpu_cores_per_1k_viewers": fanout_cpu / elapsed / (viewers / 1000),
+        }
+        if samples:
+            result["latency"] = percentiles(samples)
+        return result
+
+    try:
+        results = {}
+        for viewers in args.relay_viewers:
+            results[f"direct_{viewers}"] = run(viewers, 0)
+            for workers in args.relay_workers:
+                results[f"relay_w{workers}_{viewers}"] = run(viewers, workers)
+        results["cpu_count"] = os.cpu_count()
+        return results
+    finally:
+        uv_server.should_exit = True
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="cStrafe 基准测试")
+    parser.add_argument("names", nargs="*", help=f"要运行的项目: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", "-o", help="结果写入 JSON 文件 (默认输出到标准输出)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--shots", type=int, default=2_000)
+    parser.add_argument("--rounds", type=int, default=15, help="axes 基准每种实现的运行轮数")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="history 基准的写入行数")
+    parser.add_argument("--players", type=lambda v: [int(x) for x in v.split(",")], default=[10, 50, 200],
+                        help="ingest 基准模拟的玩家数 (逗号分隔)")
+    parser.add_argument("--duration", type=float, default=5.0, help="ingest/capture 基准每轮的时长 (秒)")
+    parser.add_argument("--viewers", type=int, default=200, help="capture 基准中负载的 WebSocket 观众数")
+    parser.add_argument("--relay-viewers", type=lambda v: [int(x) for x in v.split(",")], default=[1000, 3000],
+                        help="relay 基准的观众数 (逗号分隔)")
+    parser.add_argument("--relay-workers", type=lambda v: [int(x) for x in v.split(",")], default=[1, 2],
+                        help="relay 基准的工作进程数 (逗号分隔)")
+    parser.add_argument("--relay-rate", type=float, default=10.0, help="relay 基准中采集节点每秒发布的结果数")
+    parser.add_argument("--budget", default="startup_budget.json", help="startup 基准使用的预算文件")
+    parser.add_argument("--check-budget", action="store_true", help="有任何预算超标时以非零状态退出")
+    args = parser.parse_args(argv)
+
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for name in args.names or list(BENCHMARKS):
+        print(f"running {name}...", file=sys.stderr)
+        report["results"][name] = BENCHMARKS[name](args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    violations = [v for r in report["results"].values() if isinstance(r, dict) for v in r.get("violations", [])]
+    for v in violations:
+        print(f"BUDGET EXCEEDED: {v}", file=sys.stderr)
+    return 1 if violations and args.check_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
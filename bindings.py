@@ -0,0 +1,50 @@
+# bindings.py
+"""移动键绑定：把物理按键映射到分类器的四个槽位 (前/左/后/右)
+
+钩子回调里只做一次字典查找，未绑定的按键在任何字符串处理和加锁之前就被丢弃。
+查表用的键为 `getattr(key, "char", None) or getattr(key, "vk", None) or key`：
+字符键用字符，只有虚拟键码的用 vk，特殊键 (方向键等) 用 pynput 的 Key 枚举本身。
+绑定可以是预设名，也可以是逗号分隔的四个按键 (单个字符或 pynput Key 名称):
+    wasd / esdf / zqsd (AZERTY) / arrows / "i,j,k,l" / "up,left,down,right"
+"""
+from typing import Dict, Hashable, Tuple
+
+from classifier import SLOT_NAMES
+
+PRESETS: Dict[str, Tuple[str, str, str, str]] = {
+    "wasd": ("w", "a", "s", "d"),
+    "esdf": ("e", "s", "d", "f"),
+    "zqsd": ("z", "q", "s", "d"),
+    "arrows": ("up", "left", "down", "right"),
+}
+DEFAULT_BINDINGS = "wasd"
+
+def parse_bindings(spec: str) -> Tuple[str, ...]:
+    """预设名或 "前,左,后,右" -> 四个按键名"""
+    names = PRESETS.get(spec.lower()) or tuple(name.strip() for name in spec.split(","))
+    if len(names) != len(SLOT_NAMES) or not all(names):
+        raise ValueError(f"key bindings need {len(SLOT_NAMES)} keys (forward,left,back,right): {spec!r}")
+    if len(set(n.lower() if len(n) == 1 else n for n in names)) != len(names):
+        raise ValueError(f"duplicate key in bindings: {spec!r}")
+    return names
+
+def build_key_table(spec: str = DEFAULT_BINDINGS) -> Dict[Hashable, int]:
+    """生成 查表键 -> 槽位 的查找表 (字符键同时登记大小写，按住 Shift 时也能识别)"""
+    table: Dict[Hashable, int] = {}
+    for slot, name in enumerate(parse_bindings(spec)):
+        if len(name) == 1:
+            table[name.lower()] = slot
+            table[name.upper()] = slot
+            continue
+        # 方向键等特殊键才需要 pynput
+        from pynput import keyboard
+        try:
+            key = keyboard.Key[name.lower()]
+        except KeyError:
+            raise ValueError(f"unknown key name: {name!r}") from None
+        table[key] = slot
+        vk = getattr(key.value, "vk", None)
+        if vk is not None:
+            # 部分平台把特殊键报告为只有 vk 的 KeyCode
+            table[vk] = slot
+    return table
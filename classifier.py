@@ -1,12 +1,56 @@
 # classifier.py
-from dataclasses import dataclass, field
-from typing import Optional, Tuple, Dict, Set
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from clock import NS_PER_MS, ns_to_ms
 
-@dataclass
-class KeyState:
-    press_time: float = 0.0
-    release_time: float = 0.0
-    is_held: bool = False
+# 默认判定阈值 (整数纳秒)，可通过 MovementClassifier 的构造参数覆盖
+EARLY_RELEASE_WINDOW_NS = 300 * NS_PER_MS # 松开后 300ms 内按下反向键视为急停意图
+RECENT_STOP_WINDOW_NS = 500 * NS_PER_MS # 急停后 500ms 内开枪视为近期急停
+GREEN_THRESHOLD_NS = 20 * NS_PER_MS # Overlap/Gap 在 20ms 内为绿色
+
+# 颜色
+COLOR_RED = "#ff4444" # 跑打
+COLOR_GREEN = "#228b22" # 绿色
+COLOR_ORANGE = "#ff8c00" # 橙色
+COLOR_GRAY = "#888888" # 静态
+
+# 状态类型与颜色的紧凑编码 (下标即编码，供批量分类/二进制传输使用)
+STATE_TYPES = ("Run&Gun", "Overlap", "EarlyRelease", "Static", "None")
+PALETTE = (COLOR_RED, COLOR_GREEN, COLOR_ORANGE, COLOR_GRAY)
+
+# 按键槽位 (与 session_log 的按键编码相同)：前/左/后/右，实际对应哪个物理按键由 bindings 决定
+SLOT_NAMES = ("W", "A", "S", "D")
+SLOT_W, SLOT_A, SLOT_S, SLOT_D = range(len(SLOT_NAMES))
+NO_SLOT = 0xFF # 开枪事件没有按键
+
+# 急停轴：一对互为反向的槽位。默认只有 A/D，可加上 W/S 识别前后急停和斜向急停
+Axis = Tuple[int, int]
+DEFAULT_AXES: Tuple[Axis, ...] = ((SLOT_A, SLOT_D),)
+DEFAULT_AXES_SPEC = "AD"
+
+def parse_axes(spec: str) -> Tuple[Axis, ...]:
+    """"AD" / "AD,WS" -> 槽位对；每个槽位最多属于一条轴"""
+    axes = []
+    for part in spec.upper().replace(" ", "").split(","):
+        if len(part) != 2 or any(c not in SLOT_NAMES for c in part) or part[0] == part[1]:
+            raise ValueError(f"axis must be two different keys of {''.join(SLOT_NAMES)}: {part!r}")
+        axes.append((SLOT_NAMES.index(part[0]), SLOT_NAMES.index(part[1])))
+    slots = [slot for axis in axes for slot in axis]
+    if len(set(slots)) != len(slots):
+        raise ValueError(f"key used by more than one axis: {spec!r}")
+    return tuple(axes)
+
+def axis_name(axis: Axis) -> str:
+    return SLOT_NAMES[axis[0]] + SLOT_NAMES[axis[1]]
+
+class AxisResult(NamedTuple):
+    """单条轴上最近一次急停 (不在 recent_stop 窗口内时 state_type 为 "None"，数据为 None)"""
+    axis: str # 如 "AD"
+    state_type: str # "Overlap" / "EarlyRelease" / "None"
+    time_diff: Optional[int] = None
+    shot_delay: Optional[int] = None
+
+_new_tuple = tuple.__new__
 
 @dataclass
 class ShotResult:
@@ -14,95 +58,163 @@ class ShotResult:
     state_type: str
     # 颜色代码
     color_hex: str
-    # 数据
-    time_diff: Optional[float] = None # Overlap 或 Gap 的时间
-    shot_delay: Optional[float] = None # 停稳到开枪的时间
+    # 数据 (整数纳秒，仅在 to_display_data 中换算为毫秒)
+    time_diff: Optional[int] = None # Overlap 或 Gap 的时间
+    shot_delay: Optional[int] = None # 停稳到开枪的时间
+    shot_time: Optional[int] = None # 开枪时刻 (事件时钟)
+    # 多轴时每条轴各自的急停数据；只有一条轴时为 None (上面的字段就是这条轴的数据)
+    axes: Optional[Tuple[AxisResult, ...]] = None
     
     def to_display_data(self) -> dict:
         """转换为前端/UI易读的字典格式"""
-        return {
+        data = {
             "type": self.state_type,
             "color": self.color_hex,
-            "diff": int(self.time_diff) if self.time_diff is not None else None,
-            "delay": int(self.shot_delay) if self.shot_delay is not None else None
+            "diff": ns_to_ms(self.time_diff) if self.time_diff is not None else None,
+            "delay": ns_to_ms(self.shot_delay) if self.shot_delay is not None else None
         }
+        if self.axes is not None:
+            data["axes"] = [
+                {
+                    "axis": a.axis,
+                    "type": a.state_type,
+                    "diff": ns_to_ms(a.time_diff) if a.time_diff is not None else None,
+                    "delay": ns_to_ms(a.shot_delay) if a.shot_delay is not None else None,
+                }
+                for a in self.axes
+            ]
+        return data
 
 class MovementClassifier:
-    def __init__(self) -> None:
-        self.keys: Dict[str, KeyState] = {
-            "W": KeyState(), "A": KeyState(), "S": KeyState(), "D": KeyState()
-        }
-        # 记录最近的一次反向操作 (Key, Time)
-        self.last_transition_time: float = 0.0
-        self.last_transition_type: str = "None" # "Overlap" or "Gap"
-        self.last_transition_diff: float = 0.0 # 具体的毫秒数
-
-    def on_press(self, key: str, timestamp: float) -> None:
-        if key not in self.keys: return
-        
+    """急停状态机
+
+    转移表 opposite 给出每个槽位所在轴上的反向槽位，不属于任何轴的槽位为 None 并直接忽略；
+    按下/松开只查一次表，之后只有算术和比较，与轴的数量无关 (轴下标 axis_of 只在发生急停时才查)。
+    任一轴上有键按着即为跑打。
+    每条轴记录自己最近一次急停；last_transition_* 是所有轴中最近的一次 (斜向急停时为后完成的那条轴)，
+    开枪时的主结果由它决定。
+    """
+    __slots__ = (
+        "early_release_ns", "recent_stop_ns", "green_ns",
+        "axes", "axis_info", "opposite", "axis_of",
+        "press_time", "release_time", "held", "multi_axis",
+        "axis_time", "axis_type", "axis_diff",
+        "last_transition_time", "last_transition_type", "last_transition_diff",
+    )
+
+    def __init__(
+        self,
+        early_release_ns: int = EARLY_RELEASE_WINDOW_NS,
+        recent_stop_ns: int = RECENT_STOP_WINDOW_NS,
+        green_ns: int = GREEN_THRESHOLD_NS,
+        axes: Sequence[Axis] = DEFAULT_AXES,
+    ) -> None:
+        self.early_release_ns = early_release_ns
+        self.recent_stop_ns = recent_stop_ns
+        self.green_ns = green_ns
+        self.axes = tuple(axes)
+        # (轴下标, 名称, 没有近期急停时的结果)
+        self.axis_info = tuple(
+            (index, axis_name(axis), AxisResult(axis_name(axis), "None")) for index, axis in enumerate(self.axes)
+        )
+        opposite: List[Optional[int]] = [None] * len(SLOT_NAMES)
+        axis_of: List[Optional[int]] = [None] * len(SLOT_NAMES)
+        for index, (first, second) in enumerate(self.axes):
+            opposite[first], opposite[second] = second, first
+            axis_of[first] = axis_of[second] = index
+        self.opposite = tuple(opposite)
+        self.axis_of = tuple(axis_of)
+        self.multi_axis = len(self.axes) > 1
+        # 按槽位下标存储的按键状态
+        self.press_time: List[int] = [0] * len(SLOT_NAMES)
+        self.release_time: List[int] = [0] * len(SLOT_NAMES)
+        self.held: List[bool] = [False] * len(SLOT_NAMES)
+        # 每条轴最近的一次反向操作
+        self.axis_time: List[int] = [0] * len(self.axes)
+        self.axis_type: List[str] = ["None"] * len(self.axes)
+        self.axis_diff: List[int] = [0] * len(self.axes)
+        # 记录最近的一次反向操作 (任意轴)
+        self.last_transition_time: int = 0
+        self.last_transition_type: str = "None" # "Overlap" or "EarlyRelease"
+        self.last_transition_diff: int = 0 # 具体的纳秒数
+
+    def on_press(self, slot: int, timestamp: int) -> None:
+        opposite = self.opposite[slot]
+        if opposite is None: # 不属于任何轴的按键不影响判定
+            return
         # 记录按下
-        self.keys[key].press_time = timestamp
-        self.keys[key].is_held = True
-
-        # 检测水平方向的急停逻辑 (A/D)
-        if key in ("A", "D"):
-            opposite = "D" if key == "A" else "A"
-            opp_state = self.keys[opposite]
-            
-            # 场景1：按下新键时，旧键还没松开 -> Overlap 开始
-            # 真正的 Overlap 结算要在旧键松开时计算，但这里标记状态
-            pass 
-            
-            # 场景2：按下新键时，旧键已经松开 -> Gap (Early Release) 结束
-            if not opp_state.is_held and (timestamp - opp_state.release_time) < 300: # 300ms内的操作视为急停意图
-                self.last_transition_type = "EarlyRelease"
-                self.last_transition_diff = timestamp - opp_state.release_time # Gap duration
-                self.last_transition_time = timestamp # 以按下的时间为“完成急停”的时间点
-
-    def on_release(self, key: str, timestamp: float) -> None:
-        if key not in self.keys: return
-        
-        self.keys[key].release_time = timestamp
-        self.keys[key].is_held = False
-
-        # 检测水平方向的 Overlap 结算
-        if key in ("A", "D"):
-            opposite = "D" if key == "A" else "A"
-            opp_state = self.keys[opposite]
-            
-            # 场景：松开旧键时，新键已经按下了 -> Overlap 结束
-            if opp_state.is_held:
-                # Overlap duration = Release Time - Opp Press Time
-                # 注意：如果一直按着两个键，这里也会触发，但 shot 逻辑会判定为跑打
-                overlap = timestamp - opp_state.press_time
-                if overlap > 0: # 正常的重叠
-                    self.last_transition_type = "Overlap"
-                    self.last_transition_diff = overlap
-                    self.last_transition_time = timestamp # 以松开的时间为“完成急停”的时间点
-
-    def classify_shot(self, shot_time: float) -> ShotResult:
-        is_run_gun = self.keys["A"].is_held or self.keys["D"].is_held
-        has_recent_stop = (shot_time - self.last_transition_time) < 500
+        self.press_time[slot] = timestamp
+        held = self.held
+        held[slot] = True
+
+        # 场景1：按下新键时，旧键还没松开 -> Overlap 开始
+        # 真正的 Overlap 结算要在旧键松开时计算
+
+        # 场景2：按下新键时，旧键已经松开 -> Gap (Early Release) 结束
+        gap = timestamp - self.release_time[opposite]
+        if not held[opposite] and gap < self.early_release_ns: # 默认300ms内的操作视为急停意图
+            axis = self.axis_of[slot]
+            self.last_transition_type = self.axis_type[axis] = "EarlyRelease"
+            self.last_transition_diff = self.axis_diff[axis] = gap # Gap duration
+            self.last_transition_time = self.axis_time[axis] = timestamp # 以按下的时间为“完成急停”的时间点
+
+    def on_release(self, slot: int, timestamp: int) -> None:
+        opposite = self.opposite[slot]
+        if opposite is None:
+            return
+        self.release_time[slot] = timestamp
+        held = self.held
+        held[slot] = False
+
+        # 场景：松开旧键时，新键已经按下了 -> Overlap 结束
+        if held[opposite]:
+            # Overlap duration = Release Time - Opp Press Time
+            # 注意：如果一直按着两个键，这里也会触发，但 shot 逻辑会判定为跑打
+            overlap = timestamp - self.press_time[opposite]
+            if overlap > 0: # 正常的重叠
+                axis = self.axis_of[slot]
+                self.last_transition_type = self.axis_type[axis] = "Overlap"
+                self.last_transition_diff = self.axis_diff[axis] = overlap
+                self.last_transition_time = self.axis_time[axis] = timestamp # 以松开的时间为“完成急停”的时间点
+
+    def axis_results(self, shot_time: int) -> Tuple[AxisResult, ...]:
+        """每条轴在 shot_time 时的急停数据 (每次开枪都要构造，绕过 NamedTuple 的 Python 层 __new__)"""
+        recent_stop_ns = self.recent_stop_ns
+        axis_time, axis_type, axis_diff = self.axis_time, self.axis_type, self.axis_diff
+        results = []
+        for axis, name, idle in self.axis_info:
+            delay = shot_time - axis_time[axis]
+            if delay < recent_stop_ns:
+                results.append(_new_tuple(AxisResult, (name, axis_type[axis], axis_diff[axis], delay)))
+            else:
+                results.append(idle)
+        return tuple(results)
+
+    def classify_shot(self, shot_time: int) -> ShotResult:
+        is_run_gun = True in self.held # held 里只有轴上的按键
+        shot_delay = shot_time - self.last_transition_time
+        has_recent_stop = shot_delay < self.recent_stop_ns
 
         if is_run_gun:
             # 跑打状态
             if has_recent_stop:
                 # 有近期急停，显示急停数据
-                shot_delay = shot_time - self.last_transition_time
-                return ShotResult("Run&Gun", "#ff4444", self.last_transition_diff, shot_delay)
+                result = ShotResult("Run&Gun", COLOR_RED, self.last_transition_diff, shot_delay, shot_time)
             else:
                 # 没有近期急停，只显示跑打
-                return ShotResult("Run&Gun", "#ff4444")
+                result = ShotResult("Run&Gun", COLOR_RED, None, None, shot_time) # 位置参数比关键字参数快
         else:
             # 非跑打状态
             if has_recent_stop:
-                shot_delay = shot_time - self.last_transition_time
                 time_diff_abs = abs(self.last_transition_diff)
-                if time_diff_abs <= 20:
-                    color = "#228b22"  # 绿色
+                if time_diff_abs <= self.green_ns:
+                    color = COLOR_GREEN
                 else:
-                    color = "#ff8c00"  # 橙色
-                return ShotResult(self.last_transition_type, color, self.last_transition_diff, shot_delay)
+                    color = COLOR_ORANGE
+                result = ShotResult(self.last_transition_type, color, self.last_transition_diff, shot_delay, shot_time)
             else:
                 # 静态射击
-                return ShotResult("Static", "#888888")
+                result = ShotResult("Static", COLOR_GRAY, None, None, shot_time)
+        if self.multi_axis:
+            result.axes = self.axis_results(shot_time)
+        return result
@@ -0,0 +1,58 @@
+# clock.py
+import time
+import statistics
+from typing import Callable, Dict
+
+# 时钟源：返回单调递增的整数纳秒
+Clock = Callable[[], int]
+
+NS_PER_MS = 1_000_000
+
+# 默认使用 perf_counter_ns：单调、不受 NTP 调整影响、整数无精度损失
+default_clock: Clock = time.perf_counter_ns
+
+def ms_to_ns(ms: float) -> int:
+    """毫秒 -> 整数纳秒"""
+    return int(ms * NS_PER_MS)
+
+def ns_to_ms(ns: int) -> int:
+    """整数纳秒 -> 整数毫秒 (向零截断，与旧版 int(ms) 行为一致)"""
+    return -(-ns // NS_PER_MS) if ns < 0 else ns // NS_PER_MS
+
+def measure_resolution(clock: Clock = default_clock, samples: int = 200_000) -> Dict[str, float]:
+    """连续读取时钟，统计相邻两次读数的差值，估算有效分辨率和抖动"""
+    deltas = []
+    zero = 0
+    prev = clock()
+    for _ in range(samples):
+        now = clock()
+        d = now - prev
+        if d == 0:
+            zero += 1
+        elif d > 0:
+            deltas.append(d)
+        prev = now
+
+    if not deltas:
+        return {"samples": samples, "zero_ratio": 1.0}
+
+    deltas.sort()
+    return {
+        "samples": samples,
+        "zero_ratio": zero / samples,          # 读数未变化的比例，越高说明分辨率越粗
+        "resolution_ns": deltas[0],            # 最小非零步进 ≈ 有效分辨率
+        "median_ns": statistics.median(deltas),
+        "p99_ns": deltas[min(len(deltas) - 1, int(len(deltas) * 0.99))],
+        "max_ns": deltas[-1],                  # 最大跳变 ≈ 调度抖动
+    }
+
+if __name__ == "__main__":
+    for name, clk, info_name in (
+        ("perf_counter_ns", time.perf_counter_ns, "perf_counter"),
+        ("monotonic_ns", time.monotonic_ns, "monotonic"),
+        ("time_ns", time.time_ns, "time"),
+    ):
+        info = time.get_clock_info(info_name)
+        result = measure_resolution(clk)
+        print(f"{name: <16} declared={info.resolution * 1e9:.0f}ns monotonic={info.monotonic} "
+              + " ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
@@ -0,0 +1,498 @@
+# evdev_input.py
+"""Linux evdev 输入后端：直接读取 /dev/input/event*，使用内核事件时间戳
+
+pynput 的时间戳在 Python 回调真正运行时才取得，包含 GIL 和调度延迟，与 20ms 阈值同一量级。
+这里用 epoll 等待设备可读，一次 read() 取出多条 struct input_event，时间戳直接取内核填写的 timeval
+(通过 EVIOCSCLOCKID 切换为 CLOCK_MONOTONIC，与 clock.default_clock 同源)，原样交给 MovementClassifier。
+键盘和鼠标等多个设备的事件按内核时间戳合并；内核报告 SYN_DROPPED 时丢弃到下一个 SYN_REPORT，再用 EVIOCGKEY 重新同步按键状态。
+
+任何可读的文件描述符都可以作为输入，录制的原始 input_event 字节流可以经管道回放，不需要真实设备:
+    python evdev_input.py --dump /dev/input/event3 > keys.raw    # 录制原始字节流
+    python evdev_input.py --replay keys.raw                       # 经管道回放并分类
+    python evdev_input.py --selftest                              # 合成字节流与逐事件分类逐条比较
+
+evdev 报告的是物理按键位置 (按美式布局命名)，与键盘布局无关：AZERTY 键盘上的 ZQSD 在这里也是 wasd。
+读取设备需要 root 或 input 组权限。
+"""
+import argparse
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from bindings import DEFAULT_BINDINGS, parse_bindings
+from classifier import MovementClassifier, ShotResult, NO_SLOT, DEFAULT_AXES_SPEC, parse_axes
+from event_ring import EventRing, ClassifierWorker, EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import SessionRecorder
+
+# struct input_event: timeval (long tv_sec, long tv_usec), u16 type, u16 code, s32 value (本机字节序)
+INPUT_EVENT = struct.Struct("llHHi")
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+SYN_REPORT = 0
+SYN_DROPPED = 3 # 内核缓冲区溢出，之后到下一个 SYN_REPORT 之前的事件丢失
+BTN_LEFT = 0x110
+KEY_MAX = 0x2ff
+
+# ioctl: EVIOCSCLOCKID = _IOW('E', 0xa0, int)；EVIOCGBIT(EV_KEY, len) = _IOC(_IOC_READ, 'E', 0x20 + EV_KEY, len)
+EVIOCSCLOCKID = 0x400445a0
+_KEY_BITS_LEN = (KEY_MAX + 1 + 7) // 8
+EVIOCGBIT_KEY = 0x80000000 | (_KEY_BITS_LEN << 16) | (ord("E") << 8) | (0x20 + EV_KEY)
+# EVIOCGKEY(len) = _IOC(_IOC_READ, 'E', 0x18, len)：当前按下的按键位图
+EVIOCGKEY = 0x80000000 | (_KEY_BITS_LEN << 16) | (ord("E") << 8) | 0x18
+
+Event = Tuple[int, int, int] # (timestamp_ns, kind, slot)
+
+# 按键名 (与 bindings 相同：单个字符或 pynput Key 名称) -> Linux 键码
+_ROWS = ((2, "1234567890-="), (16, "qwertyuiop[]"), (30, "asdfghjkl;'"), (44, "zxcvbnm,./"))
+KEY_CODES: Dict[str, int] = {ch: start + i for start, row in _ROWS for i, ch in enumerate(row)}
+KEY_CODES.update(
+    esc=1, backspace=14, tab=15, enter=28, ctrl=29, ctrl_l=29, shift=42, shift_l=42, shift_r=54,
+    alt=56, alt_l=56, space=57, caps_lock=58, ctrl_r=97, alt_r=100,
+    up=103, left=105, right=106, down=108,
+)
+
+def build_code_table(spec: str = DEFAULT_BINDINGS) -> Dict[int, int]:
+    """生成 Linux 键码 -> 槽位 的查找表"""
+    table: Dict[int, int] = {}
+    for slot, name in enumerate(parse_bindings(spec)):
+        code = KEY_CODES.get(name.lower())
+        if code is None:
+            raise ValueError(f"unknown key name for evdev: {name!r}")
+        table[code] = slot
+    return table
+
+def encode_events(events, key_codes: Dict[int, int]) -> bytes:
+    """(timestamp_ns, kind, slot) 事件 -> 原始 input_event 字节流 (每个事件后跟一个 SYN_REPORT)
+
+    key_codes 为 槽位 -> 键码；时间戳按内核 timeval 截断到微秒。
+    """
+    out = bytearray()
+    for timestamp, kind, slot in events:
+        sec, usec = divmod(timestamp // 1000, 1_000_000)
+        if kind == EV_SHOT:
+            out += INPUT_EVENT.pack(sec, usec, EV_KEY, BTN_LEFT, 1)
+        else:
+            out += INPUT_EVENT.pack(sec, usec, EV_KEY, key_codes[slot], 1 if kind == EV_PRESS else 0)
+        out += INPUT_EVENT.pack(sec, usec, EV_SYN, 0, 0)
+    return bytes(out)
+
+def open_device(path: str, codes: Sequence[int]) -> Optional[int]:
+    """以非阻塞方式打开设备并切换为单调时钟；没有任何相关按键的设备 (电源键、摄像头等) 返回 None"""
+    import fcntl
+
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    bits = bytearray(_KEY_BITS_LEN)
+    try:
+        fcntl.ioctl(fd, EVIOCGBIT_KEY, bits)
+    except OSError:
+        # 管道/普通文件不是 evdev 设备，按原样读取
+        return fd
+    if not any(bits[code // 8] >> (code % 8) & 1 for code in codes):
+        os.close(fd)
+        return None
+    try:
+        fcntl.ioctl(fd, EVIOCSCLOCKID, struct.pack("i", time.CLOCK_MONOTONIC))
+    except OSError as e:
+        # 时间戳会停留在 CLOCK_REALTIME，不能与其他设备的单调时间戳交给同一个分类器
+        os.close(fd)
+        print(f"evdev: {path}: cannot switch to CLOCK_MONOTONIC ({e}), device ignored", file=sys.stderr)
+        return None
+    return fd
+
+def find_devices() -> List[str]:
+    base = "/dev/input"
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return []
+    return sorted(os.path.join(base, n) for n in names if n.startswith("event"))
+
+class EvdevListener:
+    """与 InputListener 相同的接口 (start/stop/wait_ready/queue_stats)，事件来自 evdev
+
+    devices: 设备路径或已打开的文件描述符 (如管道读端)；为空时打开所有带移动键或鼠标左键的设备。
+    读线程本身就不在 UI/服务器线程中；decoupled 时分类再交给 ClassifierWorker，读线程只写事件环。
+    """
+
+    def __init__(
+        self,
+        on_shot_callback: Callable[[ShotResult], None],
+        devices: Optional[Sequence[Union[str, int]]] = None,
+        decoupled: bool = False,
+        ring_capacity: int = 4096,
+        recorder: Optional[SessionRecorder] = None,
+        event_sink: Optional[Callable[[int, int, int], None]] = None,
+        bindings: str = DEFAULT_BINDINGS,
+        axes: str = DEFAULT_AXES_SPEC,
+        read_events: int = 64,
+    ) -> None:
+        self.on_shot_callback = on_shot_callback
+        self.classifier = MovementClassifier(axes=parse_axes(axes))
+        self.recorder = recorder
+        self.event_sink = event_sink
+        # Linux 键码 -> 槽位
+        self._key_slots = build_code_table(bindings)
+        self.devices = list(devices) if devices else []
+        self.read_size = INPUT_EVENT.size * read_events
+        self.events = 0
+        self.dropped_reports = 0 # 内核报告的 SYN_DROPPED 次数
+        self.running = False
+        self._fds: List[int] = []
+        self._owned: List[int] = [] # 由本对象打开、需要关闭的描述符
+        self._pending: Dict[int, bytes] = {} # 管道可能读到半条记录
+        self._down: Dict[int, Set[int]] = {} # 每个设备上按下的绑定按键 (键码)，SYN_DROPPED 后据此补发
+        self._dropping: Set[int] = set() # 收到 SYN_DROPPED、还没等到 SYN_REPORT 的设备
+        self._epoll = None
+        self._wake_r = self._wake_w = -1
+        self._thread: Optional[threading.Thread] = None
+        self._finished = threading.Event() # 所有输入都已读到 EOF
+
+        self._worker: Optional[ClassifierWorker] = None
+        if decoupled:
+            self._ring = EventRing(ring_capacity)
+            self._worker = ClassifierWorker(self.classifier, on_shot_callback, (self._ring,), recorder=recorder)
+
+    def _open(self) -> None:
+        codes = list(self._key_slots) + [BTN_LEFT]
+        sources = self.devices or find_devices()
+        for source in sources:
+            if isinstance(source, int):
+                os.set_blocking(source, False)
+                self._fds.append(source)
+                continue
+            try:
+                fd = open_device(source, codes)
+            except OSError:
+                # 没有权限或设备已拔出；显式指定的设备才报错
+                if self.devices:
+                    raise
+                continue
+            if fd is not None:
+                self._fds.append(fd)
+                self._owned.append(fd)
+        if not self._fds:
+            raise RuntimeError("no readable evdev input device (run as root or add the user to the 'input' group)")
+
+    def start(self) -> None:
+        self._open()
+        self._epoll = select.epoll()
+        for fd in self._fds:
+            self._epoll.register(fd, select.EPOLLIN)
+        # 自管道：stop() 写入一个字节立即唤醒读线程
+        self._wake_r, self._wake_w = os.pipe()
+        self._epoll.register(self._wake_r, select.EPOLLIN)
+        self.running = True
+        if self._worker:
+            self._worker.start()
+        self._thread = threading.Thread(target=self._run, name="cStrafe-evdev", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self) -> None:
+        """设备在 start() 中已打开，读线程启动即就绪"""
+
+    def wait_finished(self, timeout: Optional[float] = None) -> bool:
+        """等待所有输入读到 EOF (回放管道/文件时使用)"""
+        return self._finished.wait(timeout)
+
+    def stop(self) -> None:
+        self.running = False
+        if self._wake_w >= 0:
+            os.write(self._wake_w, b"\0")
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        if self._worker:
+            self._worker.stop()
+        if self._epoll is not None:
+            self._epoll.close()
+        for fd in self._owned + [self._wake_r, self._wake_w]:
+            if fd >= 0:
+                os.close(fd)
+        self._owned.clear()
+        self._wake_r = self._wake_w = -1
+        if self.recorder:
+            self.recorder.close()
+
+    def queue_stats(self) -> Optional[Dict[str, int]]:
+        return self._worker.stats() if self._worker else None
+
+    def _run(self) -> None:
+        epoll, wake, size = self._epoll, self._wake_r, INPUT_EVENT.size
+        read_size = self.read_size
+        handle = self._handle
+        open_fds = len(self._fds)
+        batch: List[Event] = []
+        held: List[Event] = [] # 因其他设备还有未读事件而暂缓处理的事件
+        while self.running:
+            # 有暂缓的事件时不阻塞：没有设备可读说明积压已读完，暂缓的事件可以处理
+            ready = epoll.poll(0 if held else -1)
+            batch.clear()
+            batch.extend(held)
+            sources = 1 if held else 0
+            held.clear()
+            cutoff = None
+            for fd, _ in ready:
+                if fd == wake:
+                    return
+                try:
+                    data = os.read(fd, read_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b"" # ENODEV：设备被拔出
+                if not data:
+                    epoll.unregister(fd)
+                    open_fds -= 1
+                    if not open_fds:
+                        self._finished.set()
+                    continue
+                full = len(data) == read_size
+                pending = self._pending.pop(fd, None)
+                if pending:
+                    data = pending + data
+                rest = len(data) % size
+                if rest:
+                    self._pending[fd] = data[-rest:]
+                    data = data[:-rest]
+                if not data:
+                    continue
+                self._decode(fd, data, batch)
+                sources += 1
+                if full:
+                    # 这个设备还有未读的事件，都不早于这次读到的最后一条记录
+                    sec, usec = INPUT_EVENT.unpack_from(data, len(data) - size)[:2]
+                    last = sec * 1_000_000_000 + usec * 1000
+                    if cutoff is None or last < cutoff:
+                        cutoff = last
+            if not batch:
+                continue
+            # 键盘和鼠标是不同的设备，按内核时间戳合并后再交给分类器 (与 ClassifierWorker 相同)
+            if sources > 1:
+                batch.sort(key=itemgetter(0))
+                if cutoff is not None:
+                    split = len(batch)
+                    while split and batch[split - 1][0] > cutoff:
+                        split -= 1
+                    held.extend(batch[split:])
+                    del batch[split:]
+            for timestamp, kind, slot in batch:
+                handle(kind, slot, timestamp)
+            self.events += len(batch)
+
+    def _decode(self, fd: int, data: bytes, out: List[Event]) -> None:
+        key_slots = self._key_slots
+        down = self._down.get(fd)
+        if down is None:
+            down = self._down[fd] = set()
+        dropping = fd in self._dropping
+        for sec, usec, etype, code, value in INPUT_EVENT.iter_unpack(data):
+            if etype != EV_KEY:
+                if etype == EV_SYN:
+                    if code == SYN_DROPPED:
+                        # 内核丢了事件：丢弃到下一个 SYN_REPORT 为止的记录，然后按当前按键状态重新同步
+                        self.dropped_reports += 1
+                        dropping = True
+                    elif code == SYN_REPORT and dropping:
+                        dropping = False
+                        self._resync(fd, down, sec * 1_000_000_000 + usec * 1000, out)
+                continue
+            if dropping:
+                continue
+            # 内核时间戳：事件被中断处理时的时刻，不含用户态调度延迟
+            timestamp = sec * 1_000_000_000 + usec * 1000
+            if code == BTN_LEFT:
+                if value == 1:
+                    out.append((timestamp, EV_SHOT, NO_SLOT))
+                continue
+            slot = key_slots.get(code)
+            if slot is not None:
+                # value: 0 松开，1 按下，2 自动重复 (与 pynput 一样当作按下)
+                if value:
+                    down.add(code)
+                    out.append((timestamp, EV_PRESS, slot))
+                else:
+                    down.discard(code)
+                    out.append((timestamp, EV_RELEASE, slot))
+        if dropping:
+            self._dropping.add(fd)
+        else:
+            self._dropping.discard(fd)
+
+    def _resync(self, fd: int, down: Set[int], timestamp: int, out: List[Event]) -> None:
+        """SYN_DROPPED 之后用 EVIOCGKEY 读取设备当前的按键状态，补发丢失的按下/松开"""
+        import fcntl
+
+        bits: Optional[bytearray] = bytearray(_KEY_BITS_LEN)
+        try:
+            fcntl.ioctl(fd, EVIOCGKEY, bits)
+        except OSError:
+            bits = None # 管道回放无法查询：当作全部松开，避免按键一直处于按下状态
+        for code, slot in self._key_slots.items():
+            pressed = bits is not None and bits[code // 8] >> (code % 8) & 1
+            if pressed and code not in down:
+                down.add(code)
+                out.append((timestamp, EV_PRESS, slot))
+            elif not pressed and code in down:
+                down.discard(code)
+                out.append((timestamp, EV_RELEASE, slot))
+
+    def _handle(self, kind: int, slot: int, timestamp: int) -> None:
+        if self.event_sink:
+            self.event_sink(kind, slot, timestamp)
+            return
+        if self._worker:
+            self._ring.push(kind, slot, timestamp)
+            self._worker.notify()
+            return
+        if self.recorder:
+            self.recorder.record(kind, slot, timestamp)
+        if kind == EV_PRESS:
+            self.classifier.on_press(slot, timestamp)
+        elif kind == EV_RELEASE:
+            self.classifier.on_release(slot, timestamp)
+        else:
+            self.on_shot_callback(self.classifier.classify_shot(timestamp))
+
+def create_listener(backend: str = "pynput", devices: Optional[Sequence[str]] = None, **kwargs):
+    """按后端名创建输入监听器；pynput 后端只在这里才导入"""
+    if backend == "evdev":
+        return EvdevListener(devices=devices, **kwargs)
+    if backend != "pynput":
+        raise ValueError(f"unknown input backend: {backend!r}")
+    from input_events import InputListener
+    return InputListener(**kwargs)
+
+def feed_pipe(data: bytes, chunk_sizes: Sequence[int] = (4096,), seed: int = 0) -> int:
+    """把字节流写入管道 (后台线程，写完关闭写端)，返回读端；chunk_sizes 用于模拟不对齐的读取"""
+    read_fd, write_fd = os.pipe()
+    rnd = random.Random(seed)
+
+    def writer() -> None:
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            n = os.write(write_fd, view[offset:offset + rnd.choice(chunk_sizes)])
+            offset += n
+        os.close(write_fd)
+
+    threading.Thread(target=writer, name="cStrafe-evdev-feed", daemon=True).start()
+    return read_fd
+
+def _classify_fds(fds: Sequence[int], bindings: str, axes: str, decoupled: bool = False) -> List[ShotResult]:
+    """读完 fds (管道读端) 中的全部事件并返回分类结果，结束后关闭 fds"""
+    results: List[ShotResult] = []
+    listener = EvdevListener(results.append, devices=list(fds), decoupled=decoupled, bindings=bindings, axes=axes)
+    listener.start()
+    try:
+        listener.wait_finished()
+        if listener._worker:
+            # 事件环中可能还有未分类的事件
+            while len(listener._ring):
+                time.sleep(0.01)
+    finally:
+        listener.stop()
+        for fd in fds:
+            os.close(fd)
+    return results
+
+def _replay(data: bytes, bindings: str, axes: str, decoupled: bool = False,
+            chunk_sizes: Sequence[int] = (4096,)) -> List[ShotResult]:
+    return _classify_fds([feed_pipe(data, chunk_sizes)], bindings, axes, decoupled)
+
+def _prefilled_pipe(data: bytes) -> int:
+    """整段写入后关闭写端的管道 (data 不能超过管道缓冲区，通常 64KB)"""
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, data)
+    os.close(write_fd)
+    return read_fd
+
+def _selftest(args) -> int:
+    import synthetic
+    from batch_classifier import classify_scalar
+
+    events = [(t // 1000 * 1000, kind, key) for t, kind, key in synthetic.generate(args.events, seed=args.seed)]
+    key_codes = {slot: code for code, slot in build_code_table(args.keys).items()}
+    data = bytearray(encode_events(events, key_codes))
+    # 混入与判定无关的记录：鼠标移动 (EV_REL)、未绑定的按键、MSC_SCAN (时间戳与前一条相同)
+    noise = bytearray()
+    for i in range(0, len(data), INPUT_EVENT.size * 2):
+        noise += data[i:i + INPUT_EVENT.size * 2]
+        sec, usec = INPUT_EVENT.unpack_from(data, i)[:2]
+        noise += INPUT_EVENT.pack(sec, usec, 0x02, 0, 3) + INPUT_EVENT.pack(sec, usec, EV_KEY, KEY_CODES["h"], 1)
+        noise += INPUT_EVENT.pack(sec, usec, 0x04, 4, 0x70004)
+
+    times, kinds, slots = zip(*events)
+    axes = parse_axes(args.axes)
+    expected = classify_scalar(times, kinds, slots, axes=axes)
+    for decoupled in (False, True):
+        # 奇数长度的写入让读端经常拿到半条记录
+        start = time.perf_counter()
+        actual = _replay(bytes(noise), args.keys, args.axes, decoupled, chunk_sizes=(1, 7, 100, 4093, 65536))
+        elapsed = time.perf_counter() - start
+        assert actual == expected, f"decoupled={decoupled}: {len(actual)} results differ from {len(expected)}"
+        print(f"decoupled={decoupled}: {len(expected)} shots identical, "
+              f"{len(noise) // INPUT_EVENT.size / elapsed / 1e6:.2f} M records/s")
+
+    # 键盘和鼠标是两个设备、同时积压：按时间戳合并后必须与单一事件流的结果相同
+    head = events[:1000]
+    keyboard = encode_events([e for e in head if e[1] != EV_SHOT], key_codes)
+    mouse = encode_events([e for e in head if e[1] == EV_SHOT], key_codes)
+    times, kinds, slots = zip(*head)
+    expected = classify_scalar(times, kinds, slots, axes=axes)
+    actual = _classify_fds([_prefilled_pipe(keyboard), _prefilled_pipe(mouse)], args.keys, args.axes)
+    assert actual == expected, f"two devices: {len(actual)} results differ from {len(expected)}"
+    print(f"two devices: {len(expected)} shots identical")
+
+    # SYN_DROPPED 丢失了松开事件：重新同步后不能仍当作按着 (管道无法查询状态，按全部松开处理)
+    d = key_codes[3]
+    dropped = (INPUT_EVENT.pack(1, 0, EV_KEY, d, 1) + INPUT_EVENT.pack(1, 0, EV_SYN, SYN_REPORT, 0)
+               + INPUT_EVENT.pack(1, 100, EV_SYN, SYN_DROPPED, 0)
+               + INPUT_EVENT.pack(1, 200, EV_KEY, d, 0) + INPUT_EVENT.pack(1, 300, EV_SYN, SYN_REPORT, 0)
+               + INPUT_EVENT.pack(3, 0, EV_KEY, BTN_LEFT, 1) + INPUT_EVENT.pack(3, 0, EV_SYN, SYN_REPORT, 0))
+    actual = _classify_fds([_prefilled_pipe(dropped)], args.keys, args.axes)
+    assert [r.state_type for r in actual] == ["Static"], f"SYN_DROPPED: {actual}"
+    print("SYN_DROPPED: held key released on resync")
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="evdev 输入后端：录制/回放原始 input_event 字节流")
+    parser.add_argument("--dump", metavar="DEVICE", help="把设备的原始字节流写到标准输出 (Ctrl+C 结束)")
+    parser.add_argument("--replay", metavar="PATH", help="经管道回放原始字节流并输出分类统计")
+    parser.add_argument("--selftest", action="store_true", help="合成字节流回放与逐事件分类逐条比较")
+    parser.add_argument("--keys", default=DEFAULT_BINDINGS)
+    parser.add_argument("--axes", default=DEFAULT_AXES_SPEC)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        fd = os.open(args.dump, os.O_RDONLY)
+        try:
+            while True:
+                sys.stdout.buffer.write(os.read(fd, INPUT_EVENT.size * 64))
+                sys.stdout.buffer.flush()
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            os.close(fd)
+    if args.replay:
+        with open(args.replay, "rb") as f:
+            results = _replay(f.read(), args.keys, args.axes)
+        counts: Dict[str, int] = {}
+        for result in results:
+            counts[result.state_type] = counts.get(result.state_type, 0) + 1
+        print(f"{len(results)} shots: " + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+        return 0
+    if args.selftest:
+        return _selftest(args)
+    parser.print_help()
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# event_ring.py
+import threading
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from classifier import MovementClassifier, ShotResult
+import metrics
+
+# 事件类型
+EV_PRESS = 0
+EV_RELEASE = 1
+EV_SHOT = 2
+
+Event = Tuple[int, int, int] # (kind, slot, timestamp_ns)
+
+class EventRing:
+    """单生产者/单消费者环形缓冲区
+
+    预分配三列存储 (kind, slot, timestamp)。生产者只写 _tail，消费者只写 _head，
+    依赖 GIL 保证单个赋值的原子性，因此两端都不需要加锁。满了直接丢弃并计数，
+    绝不阻塞生产者 (系统输入钩子线程)。
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._kinds: List[int] = [0] * capacity
+        self._keys: List[int] = [0] * capacity
+        self._times: List[int] = [0] * capacity
+        self._head = 0 # 消费者读位置
+        self._tail = 0 # 生产者写位置
+        self.high_water = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def push(self, kind: int, key: int, timestamp: int) -> bool:
+        tail = self._tail
+        depth = tail - self._head
+        if depth >= self.capacity:
+            self.dropped += 1
+            return False
+        i = tail & self._mask
+        self._kinds[i] = kind
+        self._keys[i] = key
+        self._times[i] = timestamp
+        # 先写数据再移动 tail，消费者看到新 tail 时数据已就绪
+        self._tail = tail + 1
+        if depth >= self.high_water:
+            self.high_water = depth + 1
+        return True
+
+    def drain_into(self, out: List[Event], max_batch: int) -> int:
+        head = self._head
+        n = min(self._tail - head, max_batch)
+        kinds, keys, times, mask = self._kinds, self._keys, self._times, self._mask
+        for j in range(head, head + n):
+            i = j & mask
+            out.append((kinds[i], keys[i], times[i]))
+        self._head = head + n
+        return n
+
+class ClassifierWorker:
+    """独立的分类线程：批量取出各钩子线程的事件环，调用分类器并分发 ShotResult"""
+
+    def __init__(
+        self,
+        classifier: MovementClassifier,
+        on_shot_callback: Callable[[ShotResult], None],
+        rings: Sequence[EventRing],
+        batch_size: int = 256,
+        recorder=None,
+    ) -> None:
+        self.classifier = classifier
+        self.recorder = recorder
+        self.on_shot_callback = on_shot_callback
+        self.rings = list(rings)
+        self.batch_size = batch_size
+        self.processed = 0
+        self.batches = 0
+        self._pending: List[Event] = [] # 上一批中因其他环积压而暂缓分类的事件
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self) -> None:
+        """生产者写入后调用；已经处于唤醒状态时不再触碰 Event 的内部锁"""
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="cStrafe-classifier", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _run(self) -> None:
+        batch: List[Event] = []
+        while self._running:
+            self._wakeup.wait(timeout=0.1)
+            self._wakeup.clear()
+            while self.drain_once(batch):
+                pass
+
+    def drain_once(self, batch: List[Event]) -> int:
+        batch.clear()
+        pending = self._pending
+        if pending:
+            batch.extend(pending)
+            pending.clear()
+        batch_size = self.batch_size
+        cutoff = None
+        for ring in self.rings:
+            if ring.drain_into(batch, batch_size) == batch_size and len(ring):
+                # 这个环还有积压：剩余事件都不早于刚取出的最后一个，比它晚的其他事件要等下一批
+                last = batch[-1][2]
+                if cutoff is None or last < cutoff:
+                    cutoff = last
+        if not batch:
+            return 0
+        # 键盘和鼠标来自不同的钩子线程，按时间戳合并
+        if len(self.rings) > 1:
+            batch.sort(key=itemgetter(2))
+            if cutoff is not None:
+                split = len(batch)
+                while batch[split - 1][2] > cutoff:
+                    split -= 1
+                pending.extend(batch[split:])
+                del batch[split:]
+
+        classifier = self.classifier
+        if self.recorder:
+            record = self.recorder.record
+            for kind, key, timestamp in batch:
+                record(kind, key, timestamp)
+        for kind, key, timestamp in batch:
+            if kind == EV_PRESS:
+                classifier.on_press(key, timestamp)
+            elif kind == EV_RELEASE:
+                classifier.on_release(key, timestamp)
+            elif metrics.enabled:
+                start = metrics.clock()
+                result = classifier.classify_shot(timestamp)
+                metrics.CLASSIFY.observe(metrics.clock() - start)
+                self.on_shot_callback(result)
+            else:
+                self.on_shot_callback(classifier.classify_shot(timestamp))
+        self.processed += len(batch)
+        self.batches += 1
+        return len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": sum(len(r) for r in self.rings),
+            "high_water": max(r.high_water for r in self.rings),
+            "dropped": sum(r.dropped for r in self.rings),
+            "processed": self.processed,
+            "batches": self.batches,
+        }
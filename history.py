@@ -0,0 +1,237 @@
+# history.py
+"""开枪历史持久化：SQLite (WAL)，由后台线程批量写入
+
+add() 只把结果放进队列，磁盘 I/O 全部发生在写线程里，
+不会出现在输入钩子线程或 asyncio 事件循环线程上。
+"""
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from classifier import ShotResult, STATE_TYPES, PALETTE, COLOR_GREEN
+from clock import NS_PER_MS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shots (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    wall_ns INTEGER NOT NULL,
+    shot_ns INTEGER,
+    day TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    color INTEGER NOT NULL,
+    diff_ns INTEGER,
+    delay_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_shots_session_state ON shots(session, state, id);
+CREATE INDEX IF NOT EXISTS idx_shots_day ON shots(day);
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    shots INTEGER NOT NULL,
+    start_ns INTEGER NOT NULL,
+    end_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    shots INTEGER NOT NULL,
+    green INTEGER NOT NULL,
+    diff_n INTEGER NOT NULL,
+    diff_abs_sum INTEGER NOT NULL,
+    delay_n INTEGER NOT NULL,
+    delay_sum INTEGER NOT NULL,
+    PRIMARY KEY (day, state)
+);
+"""
+
+INSERT_SHOT = ("INSERT INTO shots (session, wall_ns, shot_ns, day, state, color, diff_ns, delay_ns) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+# 每日汇总和会话汇总在写入时增量维护，查询无需扫描 shots 表
+UPSERT_DAILY = """
+INSERT INTO daily (day, state, shots, green, diff_n, diff_abs_sum, delay_n, delay_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, state) DO UPDATE SET
+    shots = shots + excluded.shots,
+    green = green + excluded.green,
+    diff_n = diff_n + excluded.diff_n,
+    diff_abs_sum = diff_abs_sum + excluded.diff_abs_sum,
+    delay_n = delay_n + excluded.delay_n,
+    delay_sum = delay_sum + excluded.delay_sum
+"""
+
+UPSERT_SESSION = """
+INSERT INTO sessions (session, shots, start_ns, end_ns) VALUES (?, ?, ?, ?)
+ON CONFLICT (session) DO UPDATE SET
+    shots = shots + excluded.shots,
+    start_ns = MIN(start_ns, excluded.start_ns),
+    end_ns = MAX(end_ns, excluded.end_ns)
+"""
+
+_STOP = object()
+_STATE_INDEX = {t: i for i, t in enumerate(STATE_TYPES)}
+_COLOR_INDEX = {c: i for i, c in enumerate(PALETTE)}
+_GREEN = _COLOR_INDEX[COLOR_GREEN]
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class HistoryStore:
+    def __init__(
+        self,
+        path: str,
+        session_id: Optional[str] = None,
+        batch_size: int = 1024,
+        flush_interval: float = 0.25,
+    ) -> None:
+        self.path = path
+        self.session_id = session_id or time.strftime("%Y%m%d-%H%M%S")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._writer, name="cStrafe-history", daemon=True)
+        self._thread.start()
+
+    def add(self, result: ShotResult, wall_ns: Optional[int] = None) -> None:
+        """记录一次开枪 (任意线程调用，不做任何 I/O)"""
+        self._queue.put((self.session_id, time.time_ns() if wall_ns is None else wall_ns, result))
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _writer(self) -> None:
+        conn = _connect(self.path)
+        day_cache = (-1, "")
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            # 攒批：一次事务写入队列中已有的所有结果
+            while True:
+                if item is _STOP:
+                    running = False
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+
+            rows = []
+            daily = {}
+            sessions = {}
+            for session, wall_ns, result in batch:
+                second = wall_ns // 1_000_000_000
+                if second != day_cache[0]:
+                    day_cache = (second, time.strftime("%Y-%m-%d", time.localtime(second)))
+                day = day_cache[1]
+                state = _STATE_INDEX[result.state_type]
+                color = _COLOR_INDEX[result.color_hex]
+                diff, delay = result.time_diff, result.shot_delay
+                rows.append((session, wall_ns, result.shot_time, day, state, color, diff, delay))
+                span = sessions.get(session)
+                if span is None:
+                    sessions[session] = [1, wall_ns, wall_ns]
+                else:
+                    span[0] += 1
+                    span[1] = min(span[1], wall_ns)
+                    span[2] = max(span[2], wall_ns)
+                agg = daily.get((day, state))
+                if agg is None:
+                    agg = daily[(day, state)] = [0, 0, 0, 0, 0, 0]
+                agg[0] += 1
+                agg[1] += color == _GREEN
+                if diff is not None:
+                    agg[2] += 1
+                    agg[3] += abs(diff)
+                if delay is not None:
+                    agg[4] += 1
+                    agg[5] += delay
+            with conn:
+                conn.executemany(INSERT_SHOT, rows)
+                conn.executemany(UPSERT_DAILY, [(day, state, *agg) for (day, state), agg in daily.items()])
+                conn.executemany(UPSERT_SESSION, [(session, *span) for session, span in sessions.items()])
+            self.written += len(rows)
+        conn.close()
+
+    # ---- 查询 (在调用线程中使用独立的只读连接，WAL 下不阻塞写线程) ----
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def sessions(self) -> List[dict]:
+        rows = self._query("SELECT session, shots, start_ns, end_ns FROM sessions ORDER BY start_ns DESC")
+        return [dict(r) for r in rows]
+
+    def shots(
+        self,
+        session: Optional[str] = None,
+        state_type: Optional[str] = None,
+        limit: int = 1000,
+        before_id: Optional[int] = None,
+    ) -> List[dict]:
+        """按会话/状态类型查询开枪记录，按 id 倒序分页"""
+        where, params = [], []
+        if session is not None:
+            where.append("session = ?")
+            params.append(session)
+        if state_type is not None:
+            where.append("state = ?")
+            params.append(_STATE_INDEX[state_type])
+        if before_id is not None:
+            where.append("id < ?")
+            params.append(before_id)
+        sql = "SELECT id, session, wall_ns, state, color, diff_ns, delay_ns FROM shots"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {
+                "id": r["id"],
+                "session": r["session"],
+                "wall_ns": r["wall_ns"],
+                "type": STATE_TYPES[r["state"]],
+                "color": PALETTE[r["color"]],
+                "diff": r["diff_ns"] / NS_PER_MS if r["diff_ns"] is not None else None,
+                "delay": r["delay_ns"] / NS_PER_MS if r["delay_ns"] is not None else None,
+            }
+            for r in self._query(sql, params)
+        ]
+
+    def daily(self, since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+        """每日汇总 (日期格式 YYYY-MM-DD，含首尾)"""
+        sql = "SELECT * FROM daily WHERE day >= ? AND day <= ? ORDER BY day, state"
+        rows = self._query(sql, (since or "0000-00-00", until or "9999-99-99"))
+        return [
+            {
+                "day": r["day"],
+                "type": STATE_TYPES[r["state"]],
+                "shots": r["shots"],
+                "green": r["green"],
+                "mean_abs_diff_ms": r["diff_abs_sum"] / r["diff_n"] / NS_PER_MS if r["diff_n"] else None,
+                "mean_delay_ms": r["delay_sum"] / r["delay_n"] / NS_PER_MS if r["delay_n"] else None,
+            }
+            for r in rows
+        ]
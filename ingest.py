@@ -0,0 +1,158 @@
+# ingest.py
+"""多玩家接入：各玩家电脑上的 agent 只采集原始按键/开枪事件并通过 UDP 发给中心服务器，
+服务器为每个玩家维护独立的分类器和 HUD 广播，全部在 asyncio 事件循环中处理，没有线程切换。
+
+数据包 (小端):
+    header: magic(4s) version(u8) count(u8) reserved(u16) seq(u32) player(16s)
+    records: count 条 session_log.RECORD (时间戳 ns, 事件类型, 按键编码)
+"""
+import asyncio
+import socket
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from classifier import MovementClassifier, Axis, DEFAULT_AXES, SLOT_NAMES
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import RECORD
+
+MAGIC = b"CSTI"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI16s")
+MAX_RECORDS = 255
+DEFAULT_PORT = 8001
+DEFAULT_MAX_PLAYERS = 64 # UDP 端口和 /ws/{player} 对局域网开放，限制能创建的玩家 (分类器 + 广播) 数量
+STALE_WINDOW = 1024 # 序号落后超过这么多视为 agent 所在机器重启 (序号和时钟都从头开始)
+
+def encode_packet(player: str, seq: int, records: Iterable[Tuple[int, int, int]]) -> bytes:
+    records = list(records)
+    if len(records) > MAX_RECORDS:
+        raise ValueError("too many records in one packet")
+    parts = [HEADER.pack(MAGIC, VERSION, len(records), 0, seq & 0xFFFFFFFF, player.encode()[:16])]
+    parts.extend(RECORD.pack(*r) for r in records)
+    return b"".join(parts)
+
+def decode_packet(data: bytes) -> Tuple[str, int, List[Tuple[int, int, int]]]:
+    magic, version, count, _, seq, player = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a cStrafe ingest packet")
+    end = HEADER.size + count * RECORD.size
+    if len(data) < end:
+        raise ValueError("truncated packet")
+    records = list(RECORD.iter_unpack(memoryview(data)[HEADER.size:end]))
+    for _, kind, code in records:
+        if kind == EV_SHOT:
+            continue
+        if kind not in (EV_PRESS, EV_RELEASE) or code >= len(SLOT_NAMES):
+            raise ValueError("invalid record in ingest packet")
+    return player.rstrip(b"\0").decode(errors="replace"), seq, records
+
+class IngestAgent:
+    """玩家端：把原始事件逐个打包成 UDP 数据报发往中心服务器 (作为 InputListener 的 event_sink)"""
+
+    def __init__(self, host: str, port: int, player: str) -> None:
+        self.address = (host, port)
+        self.player = player
+        self.seq = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._lock = threading.Lock() # 键盘和鼠标钩子线程都会调用
+
+    def __call__(self, kind: int, slot: int, timestamp: int) -> None:
+        with self._lock:
+            self.seq += 1
+            packet = encode_packet(self.player, self.seq, ((timestamp, kind, slot),))
+        try:
+            self._sock.sendto(packet, self.address)
+        except OSError:
+            pass # 服务器暂时不可达时直接丢弃，不阻塞钩子
+
+    def close(self) -> None:
+        self._sock.close()
+
+class Player:
+    """服务器端的单个玩家：独立的分类器和 HUD 广播"""
+
+    def __init__(self, name: str, manager, axes: Sequence[Axis] = DEFAULT_AXES) -> None:
+        self.name = name
+        self.classifier = MovementClassifier(axes=axes)
+        self.manager = manager
+        self.last_seq = 0
+        self.last_time = 0 # 最后处理的事件时间戳
+        self.events = 0
+        self.shots = 0
+        self.lost = 0 # 根据序号估算的丢包数
+        self.stale = 0 # 重复或迟到、已被丢弃的包
+        self.restarts = 0 # 检测到的 agent 重启次数
+
+    def feed(self, seq: int, records) -> None:
+        last_seq = self.last_seq
+        if last_seq and seq <= last_seq:
+            # 重复或乱序迟到的包：其中的事件早于已处理的事件，交给分类器会打乱时间顺序。
+            # 时间戳更新的是重启后序号从 1 开始的 agent，落后很多的是整机重启
+            if last_seq - seq < STALE_WINDOW and (not records or records[0][0] <= self.last_time):
+                self.stale += 1
+                return
+            # agent 重启：旧分类器里的按下/松开时刻属于之前的时钟基准，会算出虚假的 Gap/Overlap
+            old = self.classifier
+            self.classifier = MovementClassifier(old.early_release_ns, old.recent_stop_ns, old.green_ns, old.axes)
+            self.last_time = 0
+            self.restarts += 1
+        elif last_seq and seq > last_seq + 1:
+            self.lost += seq - last_seq - 1
+        self.last_seq = seq
+        if records:
+            self.last_time = records[-1][0]
+        classifier = self.classifier
+        for timestamp, kind, code in records:
+            if kind == EV_PRESS:
+                classifier.on_press(code, timestamp)
+            elif kind == EV_RELEASE:
+                classifier.on_release(code, timestamp)
+            elif kind == EV_SHOT:
+                self.shots += 1
+                self.manager.publish(classifier.classify_shot(timestamp).to_display_data())
+        self.events += len(records)
+
+    def stats(self) -> dict:
+        return {"events": self.events, "shots": self.shots, "lost": self.lost, "stale": self.stale,
+                "restarts": self.restarts, "viewers": len(self.manager.clients)}
+
+class PlayerRegistry:
+    def __init__(self, manager_factory: Callable[[], object], axes: Sequence[Axis] = DEFAULT_AXES,
+                 max_players: int = DEFAULT_MAX_PLAYERS) -> None:
+        self.manager_factory = manager_factory
+        self.axes = tuple(axes) # 新玩家的分类器使用的急停轴
+        self.max_players = max_players
+        self.players: Dict[str, Player] = {}
+        self.bad_packets = 0
+        self.rejected = 0 # 玩家数已满时被拒绝的新玩家的包/连接
+
+    def get(self, name: str) -> Optional[Player]:
+        """按名字取玩家，不存在时创建；已有 max_players 个玩家时返回 None"""
+        player = self.players.get(name)
+        if player is None:
+            if len(self.players) >= self.max_players:
+                self.rejected += 1
+                return None
+            player = self.players[name] = Player(name, self.manager_factory(), self.axes)
+        return player
+
+class IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, registry: PlayerRegistry) -> None:
+        self.registry = registry
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            name, seq, records = decode_packet(data)
+        except (ValueError, struct.error):
+            self.registry.bad_packets += 1
+            return
+        player = self.registry.get(name)
+        if player is not None:
+            player.feed(seq, records)
+
+async def start_ingest(registry: PlayerRegistry, host: str = "0.0.0.0", port: int = DEFAULT_PORT):
+    """在当前事件循环上监听 UDP 接入端口，返回 transport"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: IngestProtocol(registry), local_addr=(host, port))
+    return transport
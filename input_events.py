@@ -2,22 +2,57 @@
 import ctypes
 import ctypes.wintypes  # 显式导入
 import threading
-import time
-from typing import Optional, Callable
+from typing import Optional, Callable, Dict
 from pynput import keyboard, mouse
-from classifier import MovementClassifier, ShotResult
+from bindings import DEFAULT_BINDINGS, build_key_table
+from classifier import MovementClassifier, ShotResult, NO_SLOT, DEFAULT_AXES_SPEC, parse_axes
+from clock import Clock, default_clock
+from event_ring import EventRing, ClassifierWorker, EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import SessionRecorder
+import metrics
 
 class InputListener:
-    def __init__(self, on_shot_callback: Callable[[ShotResult], None]) -> None:
+    def __init__(
+        self,
+        on_shot_callback: Callable[[ShotResult], None],
+        clock: Clock = default_clock,
+        decoupled: bool = False,
+        ring_capacity: int = 4096,
+        recorder: Optional[SessionRecorder] = None,
+        event_sink: Optional[Callable[[int, int, int], None]] = None,
+        bindings: str = DEFAULT_BINDINGS,
+        axes: str = DEFAULT_AXES_SPEC,
+    ) -> None:
         self.on_shot_callback = on_shot_callback
-        self.classifier = MovementClassifier()
+        # 事件时钟：单调整数纳秒，可替换 (测试/回放)
+        self.clock = clock
+        # 急停轴 ("AD" / "AD,WS")，见 classifier.parse_axes
+        self.classifier = MovementClassifier(axes=parse_axes(axes))
+        # 可选：把所有 WASD/左键事件录制到二进制日志
+        self.recorder = recorder
+        # 按键 -> 槽位查找表 (见 bindings.py)
+        self._key_slots = build_key_table(bindings)
+        # Agent 模式：原始事件 (kind, slot, timestamp) 直接交给 event_sink 转发，本地不分类
+        self.event_sink = event_sink
         self._lock = threading.Lock()
         self._keyboard_listener: Optional[keyboard.Listener] = None
         self._mouse_listener: Optional[mouse.Listener] = None
         self.running = False
 
+        # 解耦模式：钩子线程只写事件环，分类和回调在独立线程中进行
+        self._worker: Optional[ClassifierWorker] = None
+        if decoupled:
+            # 键盘和鼠标钩子各自是一个生产者，各用一个单生产者环
+            self._key_ring = EventRing(ring_capacity)
+            self._mouse_ring = EventRing(ring_capacity)
+            self._worker = ClassifierWorker(
+                self.classifier, on_shot_callback, (self._key_ring, self._mouse_ring), recorder=recorder
+            )
+
     def start(self) -> None:
         self.running = True
+        if self._worker:
+            self._worker.start()
         self._keyboard_listener = keyboard.Listener(
             on_press=self._on_key_press,
             on_release=self._on_key_release,
@@ -28,42 +63,91 @@ class InputListener:
         )
         self._mouse_listener.start()
 
+    def wait_ready(self) -> None:
+        """阻塞直到键盘和鼠标钩子都已就绪"""
+        if self._keyboard_listener:
+            self._keyboard_listener.wait()
+        if self._mouse_listener:
+            self._mouse_listener.wait()
+
     def stop(self) -> None:
         self.running = False
         if self._keyboard_listener:
             self._keyboard_listener.stop()
         if self._mouse_listener:
             self._mouse_listener.stop()
+        if self._worker:
+            self._worker.stop()
+        if self.recorder:
+            self.recorder.close()
+
+    def queue_stats(self) -> Optional[Dict[str, int]]:
+        """解耦模式下的队列深度/高水位/丢弃计数，直连模式返回 None"""
+        return self._worker.stats() if self._worker else None
 
     def _on_key_press(self, key: keyboard.Key) -> None:
-        timestamp = time.time() * 1000.0
-        try:
-            char = key.char.upper() if hasattr(key, 'char') and key.char else None
-        except AttributeError:
-            char = None
+        timestamp = self.clock()
+        # 查表在前：聊天打字等未绑定的按键在这里直接返回 (查表键的含义见 bindings.py)
+        slot = self._key_slots.get(getattr(key, "char", None) or getattr(key, "vk", None) or key)
+        if slot is None:
+            return
+        if self.event_sink:
+            self.event_sink(EV_PRESS, slot, timestamp)
+            return
+        if self._worker:
+            self._key_ring.push(EV_PRESS, slot, timestamp)
+            self._worker.notify()
+            return
+        with self._lock:
+            if self.recorder:
+                self.recorder.record(EV_PRESS, slot, timestamp)
+            self.classifier.on_press(slot, timestamp)
 
-        if char in {"W", "A", "S", "D"}:
-            with self._lock:
-                self.classifier.on_press(char, timestamp)
-        
         # 快捷键处理 (仅在 Local 模式下生效，通过回调扩展可以更灵活，这里简化处理)
         # 如果需要 F8 退出等功能，建议在 main 中处理，或者保留基本逻辑
 
     def _on_key_release(self, key: keyboard.Key) -> None:
-        timestamp = time.time() * 1000.0
-        try:
-            char = key.char.upper() if hasattr(key, 'char') and key.char else None
-        except AttributeError:
-            char = None
-
-        if char in {"W", "A", "S", "D"}:
-            with self._lock:
-                self.classifier.on_release(char, timestamp)
+        timestamp = self.clock()
+        slot = self._key_slots.get(getattr(key, "char", None) or getattr(key, "vk", None) or key)
+        if slot is None:
+            return
+        if self.event_sink:
+            self.event_sink(EV_RELEASE, slot, timestamp)
+            return
+        if self._worker:
+            self._key_ring.push(EV_RELEASE, slot, timestamp)
+            self._worker.notify()
+            return
+        with self._lock:
+            if self.recorder:
+                self.recorder.record(EV_RELEASE, slot, timestamp)
+            self.classifier.on_release(slot, timestamp)
 
     def _on_click(self, x: int, y: int, button: mouse.Button, pressed: bool) -> None:
         if button == mouse.Button.left and pressed:
-            current_time = time.time() * 1000.0
+            current_time = self.clock()
+            if self.event_sink:
+                self.event_sink(EV_SHOT, NO_SLOT, current_time)
+                return
+            timed = metrics.enabled
+            if timed:
+                entry = metrics.clock()
+            if self._worker:
+                self._mouse_ring.push(EV_SHOT, NO_SLOT, current_time)
+                self._worker.notify()
+                if timed:
+                    metrics.HOOK_CALLBACK.observe(metrics.clock() - entry)
+                return
             with self._lock:
+                if timed:
+                    acquired = metrics.clock()
+                    metrics.LOCK_WAIT.observe(acquired - entry)
+                if self.recorder:
+                    self.recorder.record(EV_SHOT, NO_SLOT, current_time)
                 result = self.classifier.classify_shot(current_time)
+                if timed:
+                    metrics.CLASSIFY.observe(metrics.clock() - acquired)
             # 回调传出结果
             self.on_shot_callback(result)
+            if timed:
+                metrics.HOOK_CALLBACK.observe(metrics.clock() - entry)
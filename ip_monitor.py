@@ -1,94 +1,228 @@
-import obspython as obs
-import subprocess
+# ip_monitor.py
+"""OBS 脚本：监控 cStrafe HUD 主机的在线状态，离线 -> 在线时刷新浏览器源
+
+探测在后台线程中进行 (每个主机一个线程，各自退避)，结果通过队列交给 OBS 定时器，
+OBS 脚本线程只做非阻塞的队列读取。在 OBS 外可直接运行本文件，使用内置的 obspython 替身:
+    python ip_monitor.py 192.168.1.2 192.168.1.3:8000 --method http --seconds 30
+"""
+import http.client
 import platform
+import queue
+import socket
+import subprocess
+import threading
 import ctypes
 import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import obspython as obs
+except ImportError:
+    # 在 OBS 外运行 (命令行或测试)：由调用方注入替身，见文件末尾
+    obs = None
 
 # 全局变量
-ip_address = "192.168.1.2"
+hosts = ["192.168.1.2"]  # 可写成 "IP:端口"，未写端口时使用 server_port
+server_port = 8000
+probe_method = "tcp"  # tcp: 连接 cStrafe 服务端口; http: keep-alive GET /stats; ping: 调用系统 ping
+probe_timeout = 1.0  # 秒
 source_name = "cstrafe"
 online_interval = 10 * 60 * 1000  # 10分钟 (毫秒)
-offline_interval = 60 * 1000  # 1分钟 (毫秒)
+offline_interval = 60 * 1000  # 离线时的最长检测间隔 1分钟 (毫秒)
+retry_interval = 5 * 1000  # 刚离线时的检测间隔，之后每次失败翻倍直到 offline_interval (毫秒)
 wait_before_refresh = 30000  # 30秒 (毫秒)
-is_online = False  # 初始状态为离线
-current_timer = None
+poll_interval = 250  # OBS 定时器读取探测结果的间隔 (毫秒)
+
+results: "queue.SimpleQueue[ProbeResult]" = queue.SimpleQueue()
+monitors: List["HostMonitor"] = []
+host_online: Dict[str, bool] = {}  # 初始状态为离线
+refresh_pending = False
 
 # Windows虚拟键码
 VK_CONTROL = 0x11
 VK_MENU = 0x12  # Alt键
 VK_NUMPAD0 = 0x60
 
+class ProbeResult(NamedTuple):
+    target: str
+    online: bool
+    latency_ms: float
+    error: Optional[str]
+
+# ---- 探测方式 (全部在后台线程中调用，可以阻塞) ----
+
+def probe_tcp(host: str, port: int, timeout: float) -> bool:
+    """TCP 连接 cStrafe 服务端口，不创建进程"""
+    with socket.create_connection((host, port), timeout=timeout):
+        return True
+
+class HttpProbe:
+    """复用 keep-alive 连接请求 /stats；连接已被服务端关闭时重连一次"""
+
+    def __init__(self, host: str, port: int, timeout: float, path: str = "/stats") -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.path = path
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def _request(self) -> bool:
+        self.conn.request("GET", self.path)
+        response = self.conn.getresponse()
+        response.read()
+        return response.status < 500
+
+    def __call__(self) -> bool:
+        reused = self.conn is not None
+        if not reused:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            return self._request()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            if not reused:
+                raise
+        # 空闲连接可能已超时关闭，换新连接重试
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            return self._request()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def probe_ping(host: str, timeout: float) -> bool:
+    """调用系统 ping (每次创建一个进程，只在目标没有开放端口时使用)"""
+    wait_ms = str(int(timeout * 1000))
+    if platform.system() == "Windows":
+        # 使用CREATE_NO_WINDOW标志隐藏CMD窗口
+        CREATE_NO_WINDOW = 0x08000000
+        result = subprocess.call(
+            ["ping", "-n", "1", "-w", wait_ms, host],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATE_NO_WINDOW
+        )
+    else:
+        result = subprocess.call(
+            ["ping", "-c", "1", "-W", str(max(1, int(timeout))), host],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    return result == 0
+
+def make_probe(method: str, host: str, port: int, timeout: float) -> Callable[[], bool]:
+    if method == "tcp":
+        return lambda: probe_tcp(host, port, timeout)
+    if method == "http":
+        return HttpProbe(host, port, timeout)
+    if method == "ping":
+        return lambda: probe_ping(host, timeout)
+    raise ValueError(f"unknown probe method: {method}")
+
+class HostMonitor(threading.Thread):
+    """单个主机的后台探测线程：在线时按 online_interval 检测，离线时从 retry_min 开始指数退避"""
+
+    def __init__(
+        self,
+        target: str,
+        out: "queue.SimpleQueue[ProbeResult]",
+        method: str = "tcp",
+        default_port: int = 8000,
+        timeout: float = 1.0,
+        online_interval_s: float = 600.0,
+        retry_min_s: float = 5.0,
+        retry_max_s: float = 60.0,
+    ) -> None:
+        super().__init__(name=f"ip-monitor-{target}", daemon=True)
+        host, _, port = target.partition(":")
+        self.target = target
+        self.out = out
+        self.probe = make_probe(method, host, int(port) if port else default_port, timeout)
+        self.online_interval_s = online_interval_s
+        self.retry_min_s = retry_min_s
+        self.retry_max_s = retry_max_s
+        self.failures = 0
+        self._stopped = threading.Event()
+
+    def next_delay(self, online: bool) -> float:
+        if online:
+            self.failures = 0
+            return self.online_interval_s
+        self.failures += 1
+        return min(self.retry_max_s, self.retry_min_s * 2 ** (self.failures - 1))
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            start = time.perf_counter()
+            try:
+                online, error = bool(self.probe()), None
+            except Exception as e:
+                online, error = False, str(e)
+            self.out.put(ProbeResult(self.target, online, (time.perf_counter() - start) * 1000, error))
+            self._stopped.wait(self.next_delay(online))
+        if isinstance(self.probe, HttpProbe):
+            self.probe.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+# ---- OBS 脚本线程 ----
+
 def script_description():
-    return """监控指定IP地址的在线状态。
-    
+    return """监控 cStrafe HUD 主机的在线状态。
+
 功能:
 - 初始状态为离线
-- 在线状态时每10分钟检测一次IP地址
-- 离线状态时每1分钟检测一次IP地址
+- 探测在后台线程中进行，不阻塞 OBS
+- 支持同时监控多个主机，每个主机独立退避
+- 在线状态时每10分钟检测一次
+- 离线状态时从5秒开始检测，每次失败间隔翻倍，最长1分钟
 - 当从离线变为在线时,等待30秒后刷新浏览器源
 - 通过模拟热键 Ctrl+Alt+数字小键盘0 来刷新
 
 配置:
-- IP地址: 192.168.1.2
+- 主机: 192.168.1.2 (端口 8000)
+- 探测方式: TCP 连接 (可选 http / ping)
 - 浏览器源名称: cstrafe
 - 刷新热键: Ctrl+Alt+数字小键盘0"""
 
-def check_ip_online():
-    """检测IP是否在线"""
-    try:
-        system = platform.system()
-        if system == "Windows":
-            # 使用CREATE_NO_WINDOW标志隐藏CMD窗口
-            CREATE_NO_WINDOW = 0x08000000
-            result = subprocess.call(
-                ["ping", "-n", "1", "-w", "1000", ip_address],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                creationflags=CREATE_NO_WINDOW
-            )
-        else:
-            result = subprocess.call(
-                ["ping", "-c", "1", "-W", "1", ip_address],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        return result == 0
-    except Exception as e:
-        obs.script_log(obs.LOG_WARNING, f"Ping失败: {e}")
-        return False
-
 def send_hotkey():
     """发送Ctrl+Alt+数字小键盘0热键"""
     try:
         if platform.system() == "Windows":
             # 使用ctypes调用Windows API
             user32 = ctypes.windll.user32
-            
+
             obs.script_log(obs.LOG_INFO, "模拟按下热键: Ctrl+Alt+Numpad0")
-            
+
             # 按下Ctrl
             user32.keybd_event(VK_CONTROL, 0, 0, 0)
             time.sleep(0.05)
-            
+
             # 按下Alt
             user32.keybd_event(VK_MENU, 0, 0, 0)
             time.sleep(0.05)
-            
+
             # 按下数字小棋盘0
             user32.keybd_event(VK_NUMPAD0, 0, 0, 0)
             time.sleep(0.05)
-            
+
             # 释放数字小棋盘0
             user32.keybd_event(VK_NUMPAD0, 0, 2, 0)
             time.sleep(0.05)
-            
+
             # 释放Alt
             user32.keybd_event(VK_MENU, 0, 2, 0)
             time.sleep(0.05)
-            
+
             # 释放Ctrl
             user32.keybd_event(VK_CONTROL, 0, 2, 0)
-            
+
             obs.script_log(obs.LOG_INFO, "热键发送完成")
         else:
             obs.script_log(obs.LOG_WARNING, "此脚本仅支持Windows系统的热键模拟")
@@ -103,95 +237,154 @@ def refresh_browser_source():
 
 def delayed_refresh():
     """延迟刷新的回调函数"""
+    global refresh_pending
+    refresh_pending = False
     refresh_browser_source()
     obs.remove_current_callback()
 
-def restart_timer():
-    """根据当前在线状态重新启动定时器"""
-    global current_timer
-    
-    # 移除现有的定时器
-    if current_timer:
-        obs.timer_remove(current_timer)
-    
-    # 根据在线状态设置不同的检测间隔
-    if is_online:
-        interval = online_interval
-        current_timer = obs.timer_add(check_status, interval)
-        obs.script_log(obs.LOG_DEBUG, f"已设置为在线状态检测间隔: {online_interval/1000/60}分钟")
-    else:
-        interval = offline_interval
-        current_timer = obs.timer_add(check_status, interval)
-        obs.script_log(obs.LOG_DEBUG, f"已设置为离线状态检测间隔: {offline_interval/1000}秒")
-
-def check_status():
-    """主检测逻辑"""
-    global is_online
-    
-    current_online = check_ip_online()
-    
-    if current_online:
-        if not is_online:
-            # 从离线变为在线
-            obs.script_log(obs.LOG_INFO, f"IP {ip_address} 状态变化: 离线 -> 在线, 30秒后将刷新")
-            is_online = True
-            # 启动延迟刷新定时器
+def handle_result(result: ProbeResult):
+    """处理一个探测结果 (OBS 脚本线程)"""
+    global refresh_pending
+    was_online = host_online.get(result.target, False)
+    host_online[result.target] = result.online
+
+    if result.online and not was_online:
+        # 从离线变为在线；多个主机同时上线时只刷新一次
+        obs.script_log(obs.LOG_INFO, f"{result.target} 状态变化: 离线 -> 在线 ({result.latency_ms:.0f}ms), {wait_before_refresh // 1000}秒后将刷新")
+        if not refresh_pending:
+            refresh_pending = True
             obs.timer_add(delayed_refresh, wait_before_refresh)
-            # 重新启动主检测定时器（使用在线状态间隔）
-            restart_timer()
-        else:
-            # 保持在线状态
-            obs.script_log(obs.LOG_DEBUG, f"IP {ip_address} 保持在线状态")
+    elif was_online and not result.online:
+        obs.script_log(obs.LOG_INFO, f"{result.target} 状态变化: 在线 -> 离线 ({result.error or '无响应'})")
     else:
-        if is_online:
-            # 从在线变为离线
-            obs.script_log(obs.LOG_INFO, f"IP {ip_address} 状态变化: 在线 -> 离线")
-            is_online = False
-            # 重新启动主检测定时器（使用离线状态间隔）
-            restart_timer()
-        else:
-            # 保持离线状态
-            obs.script_log(obs.LOG_DEBUG, f"IP {ip_address} 保持离线状态")
+        obs.script_log(obs.LOG_DEBUG, f"{result.target} 保持{'在线' if result.online else '离线'}状态")
+
+def poll_results():
+    """OBS 定时器：非阻塞地取出后台线程的探测结果"""
+    while True:
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            return
+        handle_result(result)
+
+def start_monitors():
+    for target in hosts:
+        monitor = HostMonitor(
+            target, results, probe_method, server_port, probe_timeout,
+            online_interval / 1000, retry_interval / 1000, offline_interval / 1000,
+        )
+        monitor.start()
+        monitors.append(monitor)
+
+def stop_monitors():
+    for monitor in monitors:
+        monitor.stop()
+    # 正在进行的探测最多持续 probe_timeout (http 重连时两倍)
+    for monitor in monitors:
+        monitor.join(timeout=probe_timeout * 2 + 0.5)
+    monitors.clear()
 
 def script_load(settings):
     """脚本加载时调用"""
-    global is_online, current_timer
-    
+    global refresh_pending
+
     obs.script_log(obs.LOG_INFO, "IP监控脚本已加载 (Python版)")
-    
-    # 初始状态为离线
-    is_online = False
-    obs.script_log(obs.LOG_INFO, "初始状态: 离线")
-    
-    # 立即执行首次检测
-    check_status()
+
+    # 初始状态为离线；丢弃上次加载残留的探测结果
+    host_online.clear()
+    while not results.empty():
+        results.get_nowait()
+    refresh_pending = False
+    obs.script_log(obs.LOG_INFO, f"初始状态: 离线, 监控 {', '.join(hosts)} ({probe_method})")
+
+    # 后台线程立即执行首次检测
+    start_monitors()
+    obs.timer_add(poll_results, poll_interval)
 
 def script_unload():
     """脚本卸载时调用"""
-    global current_timer
-    
-    if current_timer:
-        obs.timer_remove(current_timer)
-        current_timer = None
-    
+    obs.timer_remove(poll_results)
     # 移除所有延迟刷新定时器
     obs.timer_remove(delayed_refresh)
+    stop_monitors()
     obs.script_log(obs.LOG_INFO, "IP监控脚本已卸载")
 
 def script_properties():
     """脚本属性"""
     props = obs.obs_properties_create()
-    
+
+    status = "\n".join(f"- {t}: {'在线' if host_online.get(t) else '离线'}" for t in hosts)
     info_text = f"""当前配置:
-- 监控IP: {ip_address}
+- 监控主机: {', '.join(hosts)}
+- 探测方式: {probe_method}
 - 浏览器源名称: {source_name}
 - 在线检测间隔: 10分钟
-- 离线检测间隔: 1分钟
+- 离线检测间隔: 5秒起翻倍, 最长1分钟
 - 刷新延迟: 30秒
 - 初始状态: 离线
 
-当前状态: {'在线' if is_online else '离线'}"""
-    
+当前状态:
+{status}"""
+
     obs.obs_properties_add_text(props, "info", info_text, obs.OBS_TEXT_INFO)
-    
+
     return props
+
+class StubObs:
+    """obspython 的最小替身：记录定时器并在 run() 中按时调用，日志输出到标准输出"""
+
+    LOG_ERROR, LOG_WARNING, LOG_INFO, LOG_DEBUG = 100, 200, 300, 400
+
+    def __init__(self, verbose: bool = False) -> None:
+        self.verbose = verbose
+        self.timers: Dict[Callable, List[float]] = {}  # callback -> [间隔(秒), 下次触发时间]
+        self.logs: List[tuple] = []
+        self._current: Optional[Callable] = None
+
+    def script_log(self, level: int, message: str) -> None:
+        self.logs.append((level, message))
+        if self.verbose or level != self.LOG_DEBUG:
+            print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+    def timer_add(self, callback: Callable, interval_ms: int) -> None:
+        self.timers[callback] = [interval_ms / 1000, time.monotonic() + interval_ms / 1000]
+
+    def timer_remove(self, callback: Callable) -> None:
+        self.timers.pop(callback, None)
+
+    def remove_current_callback(self) -> None:
+        self.timers.pop(self._current, None)
+
+    def run(self, seconds: float) -> None:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            now = time.monotonic()
+            for callback, timer in list(self.timers.items()):
+                if timer[1] <= now and callback in self.timers:
+                    timer[1] = now + timer[0]
+                    self._current = callback
+                    callback()
+            self._current = None
+            time.sleep(0.01)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="在 OBS 外运行监控逻辑 (使用 obspython 替身)")
+    parser.add_argument("hosts", nargs="*", default=hosts, help="IP 或 IP:端口")
+    parser.add_argument("--method", choices=("tcp", "http", "ping"), default=probe_method)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--verbose", "-v", action="store_true", help="同时输出调试日志")
+    args = parser.parse_args()
+
+    obs = StubObs(verbose=args.verbose)
+    hosts = args.hosts
+    probe_method = args.method
+    script_load(None)
+    try:
+        obs.run(args.seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        script_unload()
@@ -1,21 +1,18 @@
 # main.py
+import time
+_START = time.perf_counter() # 启动计时起点 (供 --startup-probe 使用)
+
 import sys
 import argparse
 import threading
 import os
+import platform
 import signal
-import ctypes
-import ctypes.wintypes
-from input_events import InputListener
-# from overlay import Overlay  # <-- 删除这行
-
-# 导入托盘图标相关库
-try:
-    import pystray
-    from PIL import Image, ImageDraw
-except ImportError:
-    pystray = None
-    Image = None
+
+# 各模式只导入自己需要的模块：pynput 只在启动钩子时导入，
+# pystray/PIL 在托盘线程里导入，FastAPI 只在 Server 模式导入
+
+STARTUP_PROBE = False
 
 def resource_path(relative_path):
     """获取资源绝对路径，处理 Nuitka 打包和开发环境"""
@@ -31,6 +28,7 @@ def resource_path(relative_path):
 
 def create_default_icon():
     """创建默认图标（红色方块）"""
+    from PIL import Image, ImageDraw
     image = Image.new('RGB', (64, 64), color='red')
     dc = ImageDraw.Draw(image)
     dc.rectangle((16, 16, 48, 48), fill='white')
@@ -38,7 +36,10 @@ def create_default_icon():
 
 def create_tray_icon():
     """创建托盘图标"""
-    if pystray is None:
+    try:
+        import pystray
+        from PIL import Image
+    except ImportError:
         return None
     
     icon_path = resource_path("cs-icon.png")
@@ -56,23 +57,75 @@ def create_tray_icon():
 
 def run_tray_icon():
     """在后台线程中运行托盘图标"""
-    if pystray is None:
-        return
     icon = create_tray_icon()
     if icon:
         icon.run()
 
-def run_local_mode():
+def open_feed(on_shot, path):
+    """--feed：开枪回调先把结果写入最新结果文件 (见 result_feed.py)，返回 (回调, feed)"""
+    if not path:
+        return on_shot, None
+    from result_feed import ResultFeed, with_feed
+    feed = ResultFeed(path)
+    return with_feed(on_shot, feed), feed
+
+def open_recorder(path):
+    """按需创建会话录制器"""
+    if not path:
+        return None
+    from session_log import SessionRecorder
+    return SessionRecorder(path)
+
+def start_tray_icon():
+    # 托盘图标不影响输入，放在钩子就绪之后再在后台加载 pystray/PIL
+    tray_thread = threading.Thread(target=run_tray_icon, daemon=True)
+    tray_thread.start()
+
+def on_hooks_started(listener):
+    """钩子启动后调用；--startup-probe 时等待钩子就绪、输出启动耗时后退出"""
+    if not STARTUP_PROBE:
+        return
+    listener.wait_ready()
+    print(f"startup-probe hook_ready_ms={(time.perf_counter() - _START) * 1000:.1f}", flush=True)
+    os._exit(0)
+
+def run_local_mode(decoupled=False, record_path=None, show_stats=False, history_path=None, max_fps=60,
+                   bindings="wasd", axes="AD", backend="pynput", devices=None, capture_process=False, sparkline=0,
+                   feed_path=None):
     # 只在 Local 模式时才导入 overlay
     from overlay import Overlay
-    
-    overlay = Overlay()
+    from evdev_input import create_listener
+
+    stats = None
+    if show_stats:
+        from stats import SessionStats
+        stats = SessionStats()
+
+    history = None
+    if history_path:
+        from history import HistoryStore
+        history = HistoryStore(history_path)
+
+    overlay = Overlay(stats=stats, max_fps=max_fps, sparkline=sparkline)
     
     def on_shot(result):
+        if stats is not None:
+            stats.add(result)
+        if history is not None:
+            history.add(result)
         overlay.update_result(result)
 
-    listener = InputListener(on_shot_callback=on_shot)
+    on_shot, feed = open_feed(on_shot, feed_path)
+    if capture_process:
+        from shm_ring import CaptureProcess
+        listener = CaptureProcess(on_shot, backend, devices, record_path=record_path, decoupled=decoupled,
+                                  bindings=bindings, axes=axes)
+    else:
+        listener = create_listener(backend, devices, on_shot_callback=on_shot, decoupled=decoupled,
+                                   recorder=open_recorder(record_path), bindings=bindings, axes=axes)
     listener.start()
+    on_hooks_started(listener)
+    start_tray_icon()
     
     try:
         overlay.run()
@@ -80,28 +133,117 @@ def run_local_mode():
         pass
     finally:
         listener.stop()
+        if history is not None:
+            history.close()
+        if feed is not None:
+            feed.close()
+        if show_stats:
+            # 合并/丢弃的更新数，确认 Overlay 没有积压
+            print("Overlay: " + " ".join(f"{k}={v}" for k, v in overlay.counters().items()))
 
-def run_server_mode():
+def run_server_mode(decoupled=False, record_path=None, history_path=None, ingest_port=None, capture=True,
+                    bindings="wasd", axes="AD", backend="pynput", devices=None, capture_process=False,
+                    feed_path=None):
     import server 
     
     print("Running Server Mode for OBS/Web.")
     print("Add 'Browser Source' in OBS: http://127.0.0.1:8000")
     print("Or open browser on another device: http://<PC_IP>:8000")
-    server.start_server()
+    if ingest_port:
+        print(f"Accepting agents on UDP port {ingest_port}; per-player HUD: http://<PC_IP>:8000/?player=NAME")
+    # 采集进程自己打开录制文件
+    recorder = None if capture_process else open_recorder(record_path)
+    server.start_server(decoupled=decoupled, recorder=recorder, history_path=history_path,
+                        on_started=on_hooks_started, ingest_port=ingest_port, capture=capture,
+                        bindings=bindings, axes=axes, backend=backend, devices=devices,
+                        capture_process=capture_process, record_path=record_path if capture_process else None,
+                        feed_path=feed_path)
+
+def run_agent_mode(target, player, record_path=None, bindings="wasd", backend="pynput", devices=None):
+    """只采集原始事件并通过 UDP 转发给中心服务器，本机不分类、不显示"""
+    from ingest import IngestAgent, DEFAULT_PORT
+    from evdev_input import create_listener
+
+    host, _, port = target.partition(":")
+    agent = IngestAgent(host, int(port) if port else DEFAULT_PORT, player)
+    recorder = open_recorder(record_path)
+
+    def sink(kind, slot, timestamp):
+        if recorder:
+            recorder.record(kind, slot, timestamp)
+        agent(kind, slot, timestamp)
+
+    print(f"Running Agent Mode: forwarding events of '{player}' to {agent.address[0]}:{agent.address[1]}")
+    listener = create_listener(backend, devices, on_shot_callback=lambda result: None, event_sink=sink,
+                               bindings=bindings)
+    listener.start()
+    on_hooks_started(listener)
+    start_tray_icon()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+        agent.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--server", action="store_true")
+    parser.add_argument("--decoupled", action="store_true", help="输入钩子只入队，分类在独立线程中进行")
+    parser.add_argument("--record", metavar="PATH", help="把 WASD/左键事件录制到二进制日志")
+    parser.add_argument("--history", metavar="PATH", help="把每次开枪写入 SQLite 历史数据库")
+    parser.add_argument("--fps", type=int, default=60, help="Overlay 最大刷新帧率")
+    parser.add_argument("--stats", action="store_true", help="Local 模式下在 Overlay 底部显示统计摘要")
+    parser.add_argument("--sparkline", type=int, default=0, metavar="N",
+                        help="Local 模式下在 Overlay 底部显示最近 N 次开枪的 Overlap/Gap 条形图")
+    parser.add_argument("--keys", default="wasd", metavar="BINDINGS",
+                        help="移动键绑定: wasd/esdf/zqsd/arrows 或 \"前,左,后,右\" (如 i,j,k,l)")
+    parser.add_argument("--axes", default="AD",
+                        help="急停轴 (按 W/A/S/D 槽位): AD 只判定左右急停，AD,WS 同时判定前后和斜向急停")
+    parser.add_argument("--backend", choices=("pynput", "evdev"), default="pynput",
+                        help="输入后端：pynput (默认，跨平台) 或 evdev (Linux，直接读取 /dev/input，使用内核时间戳)")
+    parser.add_argument("--device", action="append", metavar="PATH",
+                        help="evdev 后端读取的设备 (可重复；默认所有带移动键或鼠标左键的设备)")
+    parser.add_argument("--capture-process", action="store_true",
+                        help="输入钩子和分类在独立进程中运行，结果经共享内存交给 Overlay/服务器")
+    parser.add_argument("--feed", metavar="PATH",
+                        help="把每次开枪写入共享内存的最新结果文件，供本机其他程序读取 (见 result_feed.py)")
+    parser.add_argument("--agent", metavar="HOST[:PORT]", help="Agent 模式：把原始事件通过 UDP 发给中心服务器")
+    parser.add_argument("--player", default=platform.node()[:16], help="Agent 模式下的玩家名 (最多 16 字节)")
+    parser.add_argument("--ingest-port", type=int, metavar="PORT", help="Server 模式下接收 agent 事件的 UDP 端口")
+    parser.add_argument("--no-capture", action="store_true", help="Server 模式下不监听本机输入，只处理 agent")
+    parser.add_argument("--relay", metavar="URL",
+                        help="中继模式：订阅采集节点的 /ws (如 ws://PC:8000/ws)，在本机 8000 端口向大量观众扇出")
+    parser.add_argument("--relay-workers", type=int, metavar="N", help="中继模式的 Web 工作进程数 (默认 CPU 核数)")
+    parser.add_argument("--analyze", nargs=argparse.REMAINDER, metavar="LOG",
+                        help="无界面分析会话日志：之后的所有参数交给 analyze.py (如 --analyze logs/*.cslog --csv out/)")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
     args = parser.parse_args()
+    STARTUP_PROBE = args.startup_probe
 
     exe_name = sys.argv[0].lower()
-    
-    # 只在本地模式下启动托盘图标
-    if not (args.server or "server" in exe_name):
-        tray_thread = threading.Thread(target=run_tray_icon, daemon=True)
-        tray_thread.start()
 
-    if args.server or "server" in exe_name:
-        run_server_mode()
+    # 托盘图标只在本地模式下、钩子启动之后加载 (见 run_local_mode)
+    if args.analyze is not None:
+        # 不导入 Tk/pynput，可在构建机上运行
+        from analyze import main as analyze_main
+        sys.exit(analyze_main(args.analyze))
+    elif args.relay:
+        # 中继不采集输入，只导入 uvicorn/websockets
+        from relay import run_relay
+        run_relay(args.relay, workers=args.relay_workers)
+    elif args.agent:
+        run_agent_mode(args.agent, args.player, record_path=args.record, bindings=args.keys,
+                       backend=args.backend, devices=args.device)
+    elif args.server or "server" in exe_name:
+        run_server_mode(decoupled=args.decoupled, record_path=args.record, history_path=args.history,
+                        ingest_port=args.ingest_port, capture=not args.no_capture, bindings=args.keys,
+                        axes=args.axes, backend=args.backend, devices=args.device,
+                        capture_process=args.capture_process, feed_path=args.feed)
     else:
-        run_local_mode()
\ No newline at end of file
+        run_local_mode(decoupled=args.decoupled, record_path=args.record, show_stats=args.stats,
+                       history_path=args.history, max_fps=args.fps, bindings=args.keys, axes=args.axes,
+                       backend=args.backend, devices=args.device, capture_process=args.capture_process,
+                       sparkline=args.sparkline, feed_path=args.feed)
\ No newline at end of file
@@ -0,0 +1,87 @@
+# metrics.py
+"""热路径各阶段的低开销延迟直方图，以 Prometheus 文本格式导出
+
+埋点处统一写成 `if metrics.enabled: ...`，关闭时每个事件只多一次模块属性读取。
+可通过环境变量 CSTRAFE_METRICS=1 默认开启，或运行时调用 set_enabled()。
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+enabled: bool = os.environ.get("CSTRAFE_METRICS", "") not in ("", "0")
+
+clock = time.perf_counter_ns
+
+# 桶上界 (ns)：1us ~ 250ms
+BUCKETS_NS = (
+    1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000, 250_000_000,
+)
+
+class Histogram:
+    """固定桶直方图；多个线程同时写入时计数可能偶尔少记，换取无锁的 observe"""
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self.counts: List[int] = [0] * (len(BUCKETS_NS) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe(self, value_ns: int) -> None:
+        self.counts[bisect_left(BUCKETS_NS, value_ns)] += 1
+        self.sum_ns += value_ns
+        self.count += 1
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(BUCKETS_NS) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, c in zip(BUCKETS_NS, self.counts):
+            cumulative += c
+            lines.append(f'{self.name}_bucket{{le="{bound / 1e9:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum_ns / 1e9:.9f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+HISTOGRAMS: Dict[str, Histogram] = {}
+
+def histogram(name: str, help_text: str) -> Histogram:
+    hist = HISTOGRAMS.get(name)
+    if hist is None:
+        hist = HISTOGRAMS[name] = Histogram(name, help_text)
+    return hist
+
+# 点击 -> HUD 路径上的各个阶段
+HOOK_CALLBACK = histogram("cstrafe_hook_callback_seconds", "Time spent inside InputListener._on_click")
+LOCK_WAIT = histogram("cstrafe_lock_wait_seconds", "Wait to acquire InputListener._lock")
+CLASSIFY = histogram("cstrafe_classify_seconds", "MovementClassifier.classify_shot duration")
+LOOP_HANDOFF = histogram("cstrafe_loop_handoff_seconds", "broadcast_shot call until publish runs on the asyncio loop")
+CLIENT_SEND = histogram("cstrafe_client_send_seconds", "Per-client WebSocket send duration")
+CLIENT_DELIVERY = histogram("cstrafe_client_delivery_seconds", "Publish until the HUD page received it (client-reported)")
+CLIENT_RENDER = histogram("cstrafe_client_render_seconds", "HUD page receive until the next animation frame (client-reported)")
+RING_HANDOFF = histogram("cstrafe_ring_handoff_seconds", "Capture process publish until the consumer thread reads it")
+
+def set_enabled(flag: bool) -> None:
+    global enabled
+    enabled = flag
+
+def reset() -> None:
+    for hist in HISTOGRAMS.values():
+        hist.reset()
+
+def render(gauges: Optional[Dict[str, float]] = None) -> str:
+    """Prometheus 文本格式；gauges 为额外的瞬时值 (队列深度等)"""
+    lines = [f"cstrafe_metrics_enabled {int(enabled)}"]
+    for hist in HISTOGRAMS.values():
+        lines.extend(hist.render())
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,126 @@
 # overlay.py
 import tkinter as tk
-from typing import Optional
-from classifier import ShotResult
+from collections import deque
+from typing import Optional, Dict, List
+from classifier import ShotResult, COLOR_GRAY, RECENT_STOP_WINDOW_NS
+from clock import NS_PER_MS
+from stats import SessionStats
+
+class Sparkline:
+    """最近 N 次开枪的条形图：Overlap 向上、Gap 向下，高度为时间差；白色短线标出射击延迟
+
+    所有图元在创建时一次性分配，之后只修改坐标和颜色，不删除也不新建。
+    mode="sweep" (默认) 像示波器一样在固定位置循环写入，竖线光标标出最新一次，
+    每次开枪只改一个槽位的图元，开销与 N 无关；mode="scroll" 把所有条形左移一格、最旧的槽位挪到最右，
+    Tcl 调用数同样固定，但 Tk 内部要移动全部 N 组图元。
+    """
+
+    def __init__(self, parent, n: int = 50, width: int = 300, height: int = 40, bg: str = "#202020",
+                 scale_ns: int = 60 * NS_PER_MS, delay_scale_ns: int = RECENT_STOP_WINDOW_NS,
+                 mode: str = "sweep") -> None:
+        if mode not in ("sweep", "scroll"):
+            raise ValueError(f"unknown sparkline mode: {mode}")
+        self.n = n
+        self.mode = mode
+        self.height = height
+        self.mid = height / 2
+        self.slot_w = width / n
+        self.scale_ns = scale_ns
+        self.delay_scale_ns = delay_scale_ns
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg=bg, highlightthickness=0, bd=0)
+        canvas = self.canvas
+        canvas.create_line(0, self.mid, width, self.mid, fill="#404040")
+        bar_w = max(1.0, self.slot_w - 1)
+        # 每个槽位一个条形和一个延迟标记，初始隐藏
+        self.bars: List[int] = []
+        self.markers: List[int] = []
+        for i in range(n):
+            x = i * self.slot_w
+            self.bars.append(canvas.create_rectangle(x, self.mid, x + bar_w, self.mid, width=0,
+                                                     fill=COLOR_GRAY, state=tk.HIDDEN, tags="spark"))
+            self.markers.append(canvas.create_line(x, 0, x + bar_w, 0, fill="white",
+                                                   state=tk.HIDDEN, tags="spark"))
+        self.cursor = canvas.create_line(0, 0, 0, height, fill="#a0a0a0", state=tk.HIDDEN)
+        # 每个槽位当前的颜色/是否显示标记，值不变时不调用 itemconfig
+        self._colors: List[Optional[str]] = [None] * n
+        self._marker_shown = [False] * n
+        self._bar_w = bar_w
+        self.count = 0 # 已绘制的开枪次数
+
+    def push(self, state_type: str, color: str, time_diff: Optional[int], shot_delay: Optional[int]) -> None:
+        """画一次开枪 (只在 Tk 线程中调用)"""
+        canvas = self.canvas
+        n = self.n
+        if self.mode == "sweep":
+            i = self.count % n
+            x = i * self.slot_w
+        else:
+            # 最旧的槽位挪到最右边，其余整体左移一格
+            i = self.count % n
+            x = (n - 1) * self.slot_w
+            if self.count >= n:
+                canvas.move("spark", -self.slot_w, 0)
+            else:
+                x = self.count * self.slot_w
+        self.count += 1
+
+        # 条形：Overlap 向上，Gap 向下；没有时间差 (Static/纯跑打) 时画一个短小的块
+        if time_diff is not None:
+            h = min(abs(time_diff), self.scale_ns) / self.scale_ns * (self.mid - 1)
+            h = max(h, 1.0)
+        else:
+            h = 2.0
+        if state_type == "EarlyRelease":
+            y0, y1 = self.mid, self.mid + h
+        else:
+            y0, y1 = self.mid - h, self.mid
+        bar = self.bars[i]
+        canvas.coords(bar, x, y0, x + self._bar_w, y1)
+        if self._colors[i] != color:
+            # 首次使用时同时取消隐藏
+            canvas.itemconfigure(bar, fill=color, state=tk.NORMAL)
+            self._colors[i] = color
+
+        marker = self.markers[i]
+        if shot_delay is not None:
+            y = self.height - min(shot_delay, self.delay_scale_ns) / self.delay_scale_ns * (self.height - 1) - 1
+            canvas.coords(marker, x, y, x + self._bar_w, y)
+            if not self._marker_shown[i]:
+                canvas.itemconfigure(marker, state=tk.NORMAL)
+                self._marker_shown[i] = True
+        elif self._marker_shown[i]:
+            canvas.itemconfigure(marker, state=tk.HIDDEN)
+            self._marker_shown[i] = False
+
+        if self.mode == "sweep":
+            # 光标停在最新一次的右侧，即最旧数据开始的位置
+            cx = (self.count % n) * self.slot_w
+            canvas.coords(self.cursor, cx, 0, cx, self.height)
+            if self.count == 1:
+                canvas.itemconfigure(self.cursor, state=tk.NORMAL)
+
+    def push_result(self, result: ShotResult) -> None:
+        self.push(result.state_type, result.color_hex, result.time_diff, result.shot_delay)
 
 class Overlay:
-    def __init__(self) -> None:
+    def __init__(self, stats: Optional[SessionStats] = None, max_fps: int = 60, sparkline: int = 0) -> None:
+        # 可选：在底部显示一行会话统计摘要
+        self.stats = stats
+        # 可选：最近 sparkline 次开枪的条形图；每次开枪都要画，不能像文本一样只保留最新结果
+        self._shots: deque = deque(maxlen=max(1, sparkline))
+
+        # 最新结果槽：任意线程写入，由 Tk 线程按帧率上限统一渲染
+        self.frame_interval_ms = max(1, round(1000 / max_fps))
+        self._pending = None # (text, color)
+        self._pending_seq = 0
+        self._rendered_seq = 0
+        self._shown = None
+        self.updates = 0 # update_result 调用次数
+        self.rendered = 0 # 实际刷新 Label 的次数
+        self.coalesced = 0 # 渲染前就被更新的结果覆盖、从未显示的更新
+        self.unchanged = 0 # 文本和颜色与当前显示相同而跳过的帧
+        self.dropped = 0 # 一帧内开枪超过 N 次、被挤出条形图队列而从未画出的结果
+
         self.root = tk.Tk()
         self.root.title("cStrafe Local")
         self.root.overrideredirect(True)
@@ -31,11 +147,18 @@ class Overlay:
         )
         self.label.pack()
 
+        self.sparkline: Optional[Sparkline] = None
+        if sparkline > 0:
+            self.sparkline = Sparkline(self.frame, sparkline)
+            self.sparkline.canvas.pack(padx=10, pady=(0, 5))
+
         # 拖动逻辑
         self.root.bind("<ButtonPress-1>", self._on_drag_start)
         self.root.bind("<B1-Motion>", self._on_drag_move)
         self._drag_data = {"x": 0, "y": 0}
 
+        self.root.after(self.frame_interval_ms, self._tick)
+
     def _on_drag_start(self, event):
         self._drag_data["x"] = event.x
         self._drag_data["y"] = event.y
@@ -46,25 +169,65 @@ class Overlay:
         self.root.geometry(f"+{x}+{y}")
 
     def update_result(self, result: ShotResult) -> None:
+        data = result.to_display_data()
         lines = []
-        if result.state_type == "Run&Gun":
+        if data["type"] == "Run&Gun":
             lines.append("RUN & GUN")
             # 如果有急停数据，显示时间差和射击延迟
-            if result.time_diff is not None and result.shot_delay is not None:
-                lines.append(f"{'Stop Diff': <10} {int(result.time_diff)} ms")
-                lines.append(f"{'Shot Delay': <10} {int(result.shot_delay)} ms")
-        elif result.state_type == "Static":
+            if data["diff"] is not None and data["delay"] is not None:
+                lines.append(f"{'Stop Diff': <10} {data['diff']} ms")
+                lines.append(f"{'Shot Delay': <10} {data['delay']} ms")
+        elif data["type"] == "Static":
             lines.append("STATIC / IDLE")
         else:
             # Overlap 或 EarlyRelease
-            type_text = "Overlap" if result.state_type == "Overlap" else "Gap"
-            lines.append(f"{type_text: <10} {int(result.time_diff)} ms")
-            lines.append(f"{'Shot Delay': <10} {int(result.shot_delay)} ms")
+            type_text = "Overlap" if data["type"] == "Overlap" else "Gap"
+            lines.append(f"{type_text: <10} {data['diff']} ms")
+            lines.append(f"{'Shot Delay': <10} {data['delay']} ms")
+
+        if self.stats is not None:
+            summary = self.stats.summary_line()
+            if summary:
+                lines.append(summary)
 
         final_text = "\n".join(lines)
-        
-        # 更新颜色和文本
-        self.root.after(0, lambda: self._apply_ui(final_text, result.color_hex))
+
+        # 只写入最新结果槽，不向 Tk 事件队列投递闭包；先写值再递增序号
+        self._pending = (final_text, result.color_hex)
+        self._pending_seq += 1
+        self.updates += 1
+        if self.sparkline is not None:
+            shots = self._shots
+            if len(shots) == shots.maxlen:
+                self.dropped += 1 # 与 Tk 线程的 popleft 并发时可能多计一次
+            shots.append(result) # deque.append 线程安全；一帧内超过 N 次时只保留最近 N 次
+
+    def _tick(self) -> None:
+        if self.sparkline is not None:
+            shots = self._shots
+            while shots:
+                self.sparkline.push_result(shots.popleft())
+        seq = self._pending_seq
+        if seq != self._rendered_seq:
+            self.coalesced += seq - self._rendered_seq - 1
+            self._rendered_seq = seq
+            pending = self._pending
+            if pending == self._shown:
+                self.unchanged += 1
+            else:
+                self._shown = pending
+                self._apply_ui(*pending)
+                self.rendered += 1
+        self.root.after(self.frame_interval_ms, self._tick)
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "updates": self.updates,
+            "rendered": self.rendered,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+            "dropped": self.dropped,
+        }
 
     def _apply_ui(self, text, color):
         self.label.config(text=text, fg=color)
@@ -0,0 +1,65 @@
+# protocol.py
+"""/ws 的紧凑二进制帧 (可选子协议，JSON 为默认/回退格式)
+
+帧布局 (小端, v1 16 字节):
+    u8  type     STATE_TYPES 下标
+    u8  color    PALETTE 下标
+    u16 flags    bit0: diff 有效, bit1: delay 有效
+    i32 diff     ms
+    i32 delay    ms
+    u32 seq      广播序号
+v2 (24 字节) 在末尾追加:
+    u64 sent     服务端发布时刻 (单调时钟 us，0 = 补发的旧结果)，供客户端测量投递延迟
+服务端按客户端提供的子协议选择 v2 或 v1。
+
+多轴分类的逐轴数据 (axes) 只在 JSON 格式中传输，二进制帧只有主结果。
+"""
+import struct
+from typing import Optional, Tuple
+
+from classifier import STATE_TYPES, PALETTE
+
+SUBPROTOCOL_BINARY_V1 = "cstrafe.bin.v1"
+SUBPROTOCOL_BINARY = "cstrafe.bin.v2"
+
+FRAME = struct.Struct("<BBHiiI")
+FRAME_V2 = struct.Struct("<BBHiiIQ")
+FLAG_DIFF = 1
+FLAG_DELAY = 2
+
+_TYPE_INDEX = {t: i for i, t in enumerate(STATE_TYPES)}
+_COLOR_INDEX = {c: i for i, c in enumerate(PALETTE)}
+
+def encode_frame(data: dict, seq: int, sent_us: Optional[int] = None) -> bytes:
+    """to_display_data() 的字典 -> 二进制帧；sent_us 为 None 时编码为 v1，否则为 v2"""
+    diff = data["diff"]
+    delay = data["delay"]
+    flags = (FLAG_DIFF if diff is not None else 0) | (FLAG_DELAY if delay is not None else 0)
+    fields = (
+        _TYPE_INDEX[data["type"]],
+        _COLOR_INDEX[data["color"]],
+        flags,
+        diff or 0,
+        delay or 0,
+        seq & 0xFFFFFFFF,
+    )
+    if sent_us is None:
+        return FRAME.pack(*fields)
+    return FRAME_V2.pack(*fields, sent_us)
+
+def decode_frame(frame: bytes) -> Tuple[dict, int]:
+    """二进制帧 (v1/v2) -> (display 字典, seq)；v2 帧带发布时刻时字典中多一个 ts (ms)"""
+    sent_us = 0
+    if len(frame) == FRAME_V2.size:
+        type_index, color_index, flags, diff, delay, seq, sent_us = FRAME_V2.unpack(frame)
+    else:
+        type_index, color_index, flags, diff, delay, seq = FRAME.unpack(frame)
+    data = {
+        "type": STATE_TYPES[type_index],
+        "color": PALETTE[color_index],
+        "diff": diff if flags & FLAG_DIFF else None,
+        "delay": delay if flags & FLAG_DELAY else None,
+    }
+    if sent_us:
+        data["ts"] = sent_us / 1000
+    return data, seq
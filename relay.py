@@ -0,0 +1,235 @@
+# relay.py
+"""中继/扇出层：一个采集节点服务成千上万个 HUD 观众 (直播观众、教室里的手机)
+
+    python main.py --relay ws://CAPTURE_PC:8000/ws --relay-workers 4
+    python relay.py ws://CAPTURE_PC:8000/ws --port 8000 --workers 4
+
+采集节点照常运行 python main.py --server，每个结果只发给中继一次：中继主进程是上游 /ws 的一个普通 JSON
+客户端 (断线后带 since/epoch 续传，多轴的 axes 也原样传递)，把每条消息写入共享内存消息环
+(shm_ring.MessageRing)，再往每个工作进程的管道写一个字节唤醒它。工作进程共用一个监听套接字，
+各自运行 uvicorn 和 ConnectionManager，把消息扇出给自己的 /ws 客户端。
+所有工作进程使用同一个 epoch，序号就是消息在环中的位置 + 1，观众重连到任一工作进程都能补发。
+/metrics 和 /latency 只反映应答请求的那个工作进程。工作进程用 add_reader 等待管道，需要 selector 事件循环 (Linux/macOS)。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import uuid
+from typing import Callable, List, Optional
+
+from shm_ring import MessageRing, MessageReader
+
+DEFAULT_PORT = 8000
+
+async def subscribe(url: str, on_message: Callable[[dict], None], on_status: Callable[[str], None] = print) -> None:
+    """订阅上游 /ws 并对每个结果调用 on_message (不含 seq)；断线后指数退避重连，只补收错过的结果"""
+    from websockets.asyncio.client import connect
+
+    last_seq = epoch = None
+    retries = 0
+    while True:
+        target = url
+        if last_seq is not None:
+            target += ("&" if "?" in url else "?") + f"since={last_seq}" + (f"&epoch={epoch}" if epoch else "")
+        try:
+            async with connect(target) as ws:
+                on_status(f"relay: subscribed to {url}")
+                retries = 0
+                async for text in ws:
+                    data = json.loads(text)
+                    hello = data.get("hello")
+                    if hello is not None:
+                        # 上游重启过 (epoch 变化) 时序号从头开始，与 HUD 页面的处理相同
+                        if epoch is not None and hello["epoch"] != epoch:
+                            last_seq = 0
+                        epoch = hello["epoch"]
+                        if last_seq is None:
+                            last_seq = hello["seq"]
+                        continue
+                    data.pop("ts", None) # 上游的发布时刻；工作进程发布时换成本机时钟
+                    seq = data.pop("seq", None)
+                    if seq is not None:
+                        if last_seq is not None and seq <= last_seq:
+                            continue
+                        last_seq = seq
+                    on_message(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            on_status(f"relay: upstream {url} unavailable ({e.__class__.__name__}), retrying")
+        await asyncio.sleep(min(30.0, 0.5 * 2 ** retries))
+        retries += 1
+
+class RelayPublisher:
+    """主进程一侧：把上游消息写入消息环并唤醒所有工作进程"""
+
+    def __init__(self, ring: MessageRing, wakeup_fds: List[int]) -> None:
+        self.ring = ring
+        self.wakeup_fds = wakeup_fds
+        self.published = 0
+        self.oversize = 0
+
+    def __call__(self, data: dict) -> None:
+        try:
+            self.ring.publish(json.dumps(data, separators=(",", ":")).encode())
+        except ValueError:
+            self.oversize += 1
+            return
+        self.published += 1
+        for fd in self.wakeup_fds:
+            try:
+                os.write(fd, b"\0")
+            except BlockingIOError:
+                pass # 管道已满：工作进程还有未处理的唤醒，醒来后会读完整个环
+            except OSError:
+                pass # 工作进程已退出
+
+def create_app(manager, reader: MessageReader):
+    """工作进程的应用：HUD 页面、/ws 和本进程的 /metrics"""
+    from fastapi import FastAPI, WebSocket
+    from fastapi.responses import HTMLResponse, PlainTextResponse
+    from server import HTML_PAGE
+    import metrics
+
+    app = FastAPI()
+
+    @app.get("/")
+    async def get():
+        return HTMLResponse(HTML_PAGE)
+
+    @app.get("/metrics")
+    async def get_metrics():
+        gauges = {f"cstrafe_ws_{k}": v for k, v in manager.stats().items()}
+        gauges.update({
+            "cstrafe_relay_worker_pid": os.getpid(),
+            "cstrafe_relay_delivered": reader.delivered,
+            "cstrafe_relay_lost": reader.lost,
+            "cstrafe_relay_depth": reader.depth(),
+        })
+        return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+    @app.get("/latency")
+    async def get_latency():
+        return {"main": manager.latency()}
+
+    @app.websocket("/ws")
+    async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+        await manager.serve(websocket, since, epoch)
+
+    return app
+
+async def _watch_parent(server) -> None:
+    """主进程退出 (包括被强制结束) 时工作进程也退出"""
+    parent = multiprocessing.parent_process()
+    while parent is not None and parent.is_alive():
+        await asyncio.sleep(0.5)
+    server.should_exit = True
+
+def _worker_main(sock: socket.socket, ring_name: str, epoch: str, wakeup, replay_size: int,
+                 max_queue: int, log_level: str) -> None:
+    """工作进程入口：消息环 -> ConnectionManager -> 本进程的 /ws 客户端"""
+    import uvicorn
+    from server import ConnectionManager
+
+    ring = MessageRing(ring_name)
+    # 从最近 replay_size 条开始读，新启动的工作进程也能给重连的观众补发
+    reader = MessageReader(ring, backlog=replay_size)
+    manager = ConnectionManager(max_queue=max_queue, replay_size=replay_size, epoch=epoch)
+    fd = wakeup.fileno()
+    os.set_blocking(fd, False)
+    batch = []
+
+    def on_wakeup() -> None:
+        try:
+            os.read(fd, 4096)
+        except BlockingIOError:
+            pass
+        while True:
+            batch.clear()
+            if not reader.drain(batch):
+                break
+            for n, payload in batch:
+                manager.publish(json.loads(payload), n + 1)
+
+    on_wakeup()
+    server = uvicorn.Server(uvicorn.Config(create_app(manager, reader), loop="asyncio",
+                                           log_level=log_level, lifespan="off"))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.add_reader(fd, on_wakeup)
+    loop.create_task(_watch_parent(server))
+    try:
+        loop.run_until_complete(server.serve(sockets=[sock]))
+    except KeyboardInterrupt:
+        pass # uvicorn 正常关闭后会重新抛出收到的 SIGINT
+    finally:
+        loop.remove_reader(fd)
+        ring.close()
+
+def run_relay(upstream: str, host: str = "0.0.0.0", port: int = DEFAULT_PORT, workers: Optional[int] = None,
+              capacity: int = 4096, replay_size: int = 256, max_queue: int = 8, log_level: str = "warning") -> None:
+    """启动 workers 个 Web 工作进程并订阅上游，直到 Ctrl+C / SIGTERM"""
+    workers = workers or os.cpu_count() or 1
+    ring = MessageRing(capacity=capacity)
+    epoch = uuid.uuid4().hex[:8]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+
+    # spawn：与 CaptureProcess 一致，各平台行为相同
+    ctx = multiprocessing.get_context("spawn")
+    processes, wakeups = [], []
+    for i in range(workers):
+        reader_end, writer_end = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=_worker_main, name=f"cStrafe-relay-{i}", daemon=True,
+                              args=(sock, ring.name, epoch, reader_end, replay_size, max_queue, log_level))
+        process.start()
+        reader_end.close()
+        os.set_blocking(writer_end.fileno(), False)
+        processes.append(process)
+        wakeups.append(writer_end)
+    publisher = RelayPublisher(ring, [w.fileno() for w in wakeups])
+    print(f"Relaying {upstream} to http://{host}:{sock.getsockname()[1]} with {workers} worker(s)", flush=True)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        asyncio.run(subscribe(upstream, publisher, lambda text: print(text, flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT) # uvicorn 收到 SIGINT 后正常关闭连接
+        for process in processes:
+            process.join(timeout=3.0)
+            if process.is_alive():
+                process.terminate()
+        for w in wakeups:
+            w.close()
+        sock.close()
+        ring.close()
+        ring.unlink()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="cStrafe HUD 中继 (一个上游订阅，多进程扇出)")
+    parser.add_argument("upstream", help="采集节点的 /ws 地址，如 ws://192.168.1.10:8000/ws")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Web 工作进程数 (默认 CPU 核数)")
+    parser.add_argument("--capacity", type=int, default=4096, help="消息环容量 (2 的幂)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args(argv)
+    run_relay(args.upstream, args.host, args.port, args.workers, args.capacity, log_level=args.log_level)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# result_feed.py
+"""本机的“最新结果”共享内存文件：外部工具 (OBS 脚本、Stream Deck 插件、日志程序) 不用 WebSocket/JSON 就能读到每次开枪
+
+    python main.py --feed /dev/shm/cstrafe.feed         # Linux 上放在 tmpfs 中，不产生磁盘 IO
+    python main.py --server --feed %TEMP%\\cstrafe.feed
+    python result_feed.py watch /dev/shm/cstrafe.feed   # 打印之后的每次开枪
+
+文件固定 64 字节，只保存最新一次开枪，用 seqlock 保护：写者先把序号改为奇数，写正文，再改为下一个偶数；
+读者在读正文前后各读一次序号，两次相同且为偶数才算读到完整记录。读者只做内存访问 (mmap)，没有系统调用，
+也不需要反序列化；写者从不等待读者。依赖 x86/x64 的存储顺序 (与 shm_ring 相同)。
+写者重启时不截断文件 (其他进程可能还映射着它)，只把序号清零；写者在写入中途退出时，读者重试 MAX_RETRIES 次后放弃。
+
+布局 (小端):
+    0   4s  magic "CSFD"
+    4   u16 版本
+    6   u16 正文长度
+    16  u64 seq        已发布次数 * 2 (写入期间 +1)
+    24  i64 shot_time  开枪时刻 (事件时钟，Linux 上为 CLOCK_MONOTONIC ns)
+    32  i64 published  写入时刻 (同一时钟)
+    40  i64 diff       Overlap/Gap ns
+    48  i64 delay      射击延迟 ns
+    56  u8  type       STATE_TYPES 下标
+    57  u8  color      PALETTE 下标
+    58  u8  flags      bit0: diff 有效, bit1: delay 有效, bit2: shot_time 有效
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Callable, NamedTuple, Optional
+
+from classifier import ShotResult, STATE_TYPES, PALETTE
+from clock import default_clock
+
+MAGIC = b"CSFD"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 16
+BODY = struct.Struct("<qqqqBBB")
+BODY_OFFSET = 24
+FILE_SIZE = 64
+MAX_RETRIES = 100 # 写入一次不到 1 微秒；重试这么多次仍是奇数序号，说明写者停在了写入中途
+
+FLAG_DIFF = 1
+FLAG_DELAY = 2
+FLAG_TIME = 4
+
+_TYPE_INDEX = {t: i for i, t in enumerate(STATE_TYPES)}
+_COLOR_INDEX = {c: i for i, c in enumerate(PALETTE)}
+
+class FeedRecord(NamedTuple):
+    seq: int # 第几次开枪 (从 1 开始)
+    shot_time: Optional[int]
+    published_ns: int
+    state_type: str
+    color_hex: str
+    time_diff: Optional[int]
+    shot_delay: Optional[int]
+
+class ResultFeed:
+    """写者：创建 (或覆盖) 文件并发布每次开枪；只能由一个线程调用 publish"""
+
+    def __init__(self, path: str, clock=default_clock) -> None:
+        self.path = path
+        self.clock = clock
+        # 不用 "w+b"：先截断为 0 字节会让仍映射着旧文件的读者收到 SIGBUS
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        self._file = os.fdopen(fd, "r+b")
+        if os.fstat(fd).st_size < FILE_SIZE:
+            self._file.truncate(FILE_SIZE)
+        self._mm = mmap.mmap(fd, FILE_SIZE)
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, BODY.size)
+        SEQ.pack_into(self._mm, SEQ_OFFSET, 0)
+        self.seq = 0
+
+    def publish(self, result: ShotResult) -> None:
+        mm = self._mm
+        flags = 0
+        diff = result.time_diff
+        if diff is not None:
+            flags |= FLAG_DIFF
+        else:
+            diff = 0
+        delay = result.shot_delay
+        if delay is not None:
+            flags |= FLAG_DELAY
+        else:
+            delay = 0
+        shot_time = result.shot_time
+        if shot_time is not None:
+            flags |= FLAG_TIME
+        else:
+            shot_time = 0
+        seq = self.seq
+        SEQ.pack_into(mm, SEQ_OFFSET, seq + 1)
+        BODY.pack_into(mm, BODY_OFFSET, shot_time, self.clock(), diff, delay,
+                       _TYPE_INDEX[result.state_type], _COLOR_INDEX[result.color_hex], flags)
+        self.seq = seq + 2
+        SEQ.pack_into(mm, SEQ_OFFSET, seq + 2)
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+def with_feed(callback: Callable[[ShotResult], None], feed: ResultFeed) -> Callable[[ShotResult], None]:
+    """把开枪回调包装为先发布到 feed 再调用原回调"""
+    publish = feed.publish
+
+    def on_shot(result: ShotResult) -> None:
+        publish(result)
+        callback(result)
+
+    return on_shot
+
+class FeedReader:
+    """读者：poll() 只在有新结果时返回 FeedRecord，否则返回 None (一次内存读取)"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), FILE_SIZE, access=mmap.ACCESS_READ)
+        magic, version, body_size = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or body_size != BODY.size:
+            self.close()
+            raise ValueError(f"{path}: not a cStrafe result feed (version {VERSION})")
+        self.last_seq = SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] & ~1 # 只读打开之后的结果
+        self.retries = 0 # 读到写入中途的记录而重读的次数
+        self.missed = 0 # 两次 poll 之间被后一次覆盖、没有读到的结果
+
+    def read(self) -> Optional[FeedRecord]:
+        """当前的最新结果 (还没有任何结果、或重试 MAX_RETRIES 次仍读不到完整记录时为 None)"""
+        mm = self._mm
+        for _ in range(MAX_RETRIES):
+            seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if seq & 1:
+                self.retries += 1
+                continue
+            body = BODY.unpack_from(mm, BODY_OFFSET)
+            if SEQ.unpack_from(mm, SEQ_OFFSET)[0] == seq:
+                break
+            self.retries += 1
+        else:
+            return None
+        if not seq:
+            return None
+        shot_time, published, diff, delay, state, color, flags = body
+        return FeedRecord(
+            seq // 2,
+            shot_time if flags & FLAG_TIME else None,
+            published,
+            STATE_TYPES[state],
+            PALETTE[color],
+            diff if flags & FLAG_DIFF else None,
+            delay if flags & FLAG_DELAY else None,
+        )
+
+    def poll(self) -> Optional[FeedRecord]:
+        if SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] == self.last_seq:
+            return None
+        record = self.read()
+        if record is not None:
+            # 写者重启后序号从头开始，不计入 missed
+            self.missed += max(0, record.seq - self.last_seq // 2 - 1)
+            self.last_seq = record.seq * 2
+        return record
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cStrafe 最新结果文件")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_watch = sub.add_parser("watch", help="轮询文件并打印之后的每次开枪")
+    p_watch.add_argument("path")
+    p_watch.add_argument("--interval", type=float, default=0.001, help="轮询间隔 (秒)")
+    args = parser.parse_args()
+
+    reader = FeedReader(args.path)
+    try:
+        while True:
+            record = reader.poll()
+            if record is not None:
+                # 同一台机器上各进程的 perf_counter_ns 是同一个时钟
+                lag_us = (default_clock() - record.published_ns) / 1000
+                print(f"#{record.seq} {record.state_type} diff={record.time_diff} delay={record.shot_delay} "
+                      f"lag={lag_us:.0f}us", flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
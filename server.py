@@ -1,11 +1,21 @@
 # server.py
-import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse
 import json
 import asyncio
-from input_events import InputListener
-from classifier import ShotResult
+import ipaddress
+import itertools
+import math
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+from classifier import ShotResult, STATE_TYPES, PALETTE, DEFAULT_AXES_SPEC, parse_axes
+from clock import default_clock, NS_PER_MS
+from protocol import SUBPROTOCOL_BINARY, SUBPROTOCOL_BINARY_V1, encode_frame
+from ingest import PlayerRegistry, start_ingest
+from stats import SessionStats, QuantileSketch
+import metrics
 
 app = FastAPI()
 
@@ -46,15 +56,98 @@ HTML_TEMPLATE = """
             <div id="line3" class="line" style="color: white;"></div>
         </div>
         <script>
-            var ws = new WebSocket("ws://" + location.host + "/ws");
+            // 页面地址带 ?proto=bin 时使用紧凑二进制帧，否则使用 JSON
+            // 带 ?player=NAME 时显示该远程玩家 (agent 接入) 的 HUD
+            var TYPES = __STATE_TYPES__;
+            var PALETTE = __PALETTE__;
+            var params = new URLSearchParams(location.search);
+            var useBinary = params.get("proto") === "bin";
+            var player = params.get("player");
+            var wsUrl = "ws://" + location.host + (player ? "/ws/" + encodeURIComponent(player) : "/ws");
             var container = document.getElementById("container");
             var l1 = document.getElementById("line1");
             var l2 = document.getElementById("line2");
             var l3 = document.getElementById("line3");
+            // 断线后原地重连 (指数退避)，并带上最后收到的序号，服务端只补发错过的结果
+            var lastSeq = null;
+            var epoch = null;
+            var retries = 0;
+            // 延迟回报：定期 ping/pong 估计与服务端的时钟偏差 (取最近几次中往返最短的一次)，
+            // 每个结果回报 投递 = 收到时刻 (换算到服务端时钟) - 服务端发布时刻，渲染 = 下一帧 - 收到时刻
+            var clockSamples = [];
+            var clockOffset = null; // 服务端时刻 - 本地 performance.now()
+            var bestRtt = null;
+            var reports = [];
+            var timers = [];
+            var timingSocket = null;
 
-            ws.onmessage = function(event) {
-                var data = JSON.parse(event.data);
-                
+            function decodeFrame(buffer) {
+                var view = new DataView(buffer);
+                var flags = view.getUint16(2, true);
+                var sent = buffer.byteLength >= 24 ? Number(view.getBigUint64(16, true)) : 0;
+                return {
+                    type: TYPES[view.getUint8(0)],
+                    color: PALETTE[view.getUint8(1)],
+                    diff: (flags & 1) ? view.getInt32(4, true) : null,
+                    delay: (flags & 2) ? view.getInt32(8, true) : null,
+                    seq: view.getUint32(12, true),
+                    ts: sent ? sent / 1000 : null
+                };
+            }
+
+            function onPong(pong) {
+                var rtt = performance.now() - pong.c;
+                clockSamples.push([rtt, pong.s - (pong.c + rtt / 2)]);
+                if (clockSamples.length > 8) clockSamples.shift();
+                var best = clockSamples[0];
+                for (var i = 1; i < clockSamples.length; i++) {
+                    if (clockSamples[i][0] < best[0]) best = clockSamples[i];
+                }
+                bestRtt = best[0];
+                clockOffset = best[1];
+            }
+
+            function measure(data, received) {
+                var delivery = (data.ts != null && clockOffset !== null) ? received + clockOffset - data.ts : null;
+                requestAnimationFrame(function() {
+                    var painted = performance.now();
+                    reports.push([data.seq, delivery === null ? null : +delivery.toFixed(3), +(painted - received).toFixed(3)]);
+                    // 满 64 条 (服务端每条消息最多处理 64 条) 立即发送；断线期间只保留最近 256 条
+                    if (reports.length >= 64) flushReports();
+                    if (reports.length > 256) reports.splice(0, reports.length - 256);
+                });
+            }
+
+            function flushReports() {
+                var ws = timingSocket;
+                if (reports.length && ws && ws.readyState === 1) {
+                    ws.send(JSON.stringify({lat: reports.splice(0, 64), rtt: bestRtt === null ? null : +bestRtt.toFixed(3)}));
+                }
+            }
+
+            function startTiming(ws) {
+                // 新连接可能连到另一台服务器 (中继)，重新对时
+                timingSocket = ws;
+                clockSamples = [];
+                clockOffset = null;
+                var ping = function() {
+                    if (ws.readyState === 1) ws.send(JSON.stringify({ping: performance.now()}));
+                };
+                ping();
+                timers.push(setTimeout(ping, 200), setTimeout(ping, 400), setInterval(ping, 5000));
+                timers.push(setInterval(flushReports, 2000));
+            }
+
+            function stopTiming() {
+                for (var i = 0; i < timers.length; i++) {
+                    clearTimeout(timers[i]);
+                    clearInterval(timers[i]);
+                }
+                timers = [];
+                timingSocket = null;
+            }
+
+            function render(data) {
                 // 设置所有行的颜色
                 l1.style.color = data.color;
                 l2.style.color = data.color;
@@ -80,70 +173,473 @@ HTML_TEMPLATE = """
                     var label = (data.type === "Overlap") ? "Overlap" : "Gap";
                     l1.innerText = label + "    " + data.diff + " ms";
                     l2.innerText = "Shot Delay   " + data.delay + " ms";
-                    l3.innerText = ""; // 第三行留空
+                    l3.innerText = axesText(data); // 多轴时显示各轴数据，否则留空
                 }
-            };
-            
-            ws.onclose = function() {
-                setTimeout(function() {
-                    location.reload();
-                }, 1000);
-            };
+            }
+
+            function axesText(data) {
+                if (!data.axes) return "";
+                var parts = [];
+                for (var i = 0; i < data.axes.length; i++) {
+                    var a = data.axes[i];
+                    if (a.type === "Overlap" || a.type === "EarlyRelease") {
+                        parts.push(a.axis + " " + (a.type === "Overlap" ? "+" : "-") + a.diff);
+                    }
+                }
+                return parts.length > 1 ? parts.join("  ") + " ms" : "";
+            }
+
+            function connect() {
+                var url = wsUrl;
+                if (lastSeq !== null) {
+                    url += "?since=" + lastSeq + (epoch ? "&epoch=" + epoch : "");
+                }
+                var ws = useBinary ? new WebSocket(url, ["__SUBPROTOCOL__"]) : new WebSocket(url);
+                ws.binaryType = "arraybuffer";
+
+                ws.onopen = function() {
+                    retries = 0;
+                    startTiming(ws);
+                };
+
+                ws.onmessage = function(event) {
+                    var received = performance.now();
+                    var data = (typeof event.data === "string") ? JSON.parse(event.data) : decodeFrame(event.data);
+                    if (data.pong) {
+                        onPong(data.pong);
+                        return;
+                    }
+                    if (data.hello) {
+                        // 服务端重启过 (epoch 变化) 时序号从头开始
+                        if (epoch !== null && data.hello.epoch !== epoch) lastSeq = 0;
+                        epoch = data.hello.epoch;
+                        if (lastSeq === null) lastSeq = data.hello.seq;
+                        return;
+                    }
+                    if (lastSeq !== null && data.seq <= lastSeq) return;
+                    lastSeq = data.seq;
+                    render(data);
+                    measure(data, received);
+                };
+
+                ws.onclose = function() {
+                    stopTiming();
+                    setTimeout(connect, Math.min(30000, 500 * Math.pow(2, retries++)));
+                };
+            }
+
+            connect();
         </script>
     </body>
 </html>
 """
 
+HTML_PAGE = (
+    HTML_TEMPLATE
+    .replace("__STATE_TYPES__", json.dumps(STATE_TYPES))
+    .replace("__PALETTE__", json.dumps(PALETTE))
+    .replace("__SUBPROTOCOL__", SUBPROTOCOL_BINARY)
+)
+
+_client_ids = itertools.count(1)
+PING_INTERVAL_NS = 100 * NS_PER_MS # 每个客户端最多每 100ms 回一次 pong (页面本身每 5s 一次)
+
+class ClientChannel:
+    """单个 HUD 客户端：有界发送队列 + 独立的发送任务
+
+    队列满时丢弃最旧的消息，落后的客户端只会收到最新结果；
+    发送失败或超时的客户端由 ConnectionManager 剔除。
+    HUD 页面回报的投递延迟 (服务端发布 -> 页面收到) 和渲染延迟 (收到 -> 下一帧绘制) 记在 delivery/render 中。
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, send_timeout: float, binary: bool = False,
+                 frame_version: int = 1) -> None:
+        self.websocket = websocket
+        self.binary = binary
+        self.frame_version = frame_version
+        self.id = next(_client_ids)
+        client = websocket.client
+        self.address = f"{client.host}:{client.port}" if client else ""
+        self.user_agent = websocket.headers.get("user-agent", "")
+        self.connected_at = time.time()
+        self.delivery = QuantileSketch(relative_accuracy=0.05)
+        self.render = QuantileSketch(relative_accuracy=0.05)
+        self.rtt_ms: Optional[float] = None
+        self.last_pong = -PING_INTERVAL_NS
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.queue: deque = deque()
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def offer(self, message) -> None:
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(message)
+        self._wakeup.set()
+
+    def preload(self, messages: Iterable) -> None:
+        """连接时的握手和补发消息，不受 max_queue 限制 (总数不超过重放缓冲区大小)"""
+        self.queue.extend(messages)
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queue:
+                message = self.queue.popleft()
+                # 握手消息总是 JSON 文本，二进制客户端也一样
+                send = self.websocket.send_bytes if isinstance(message, bytes) else self.websocket.send_text
+                if metrics.enabled:
+                    start = metrics.clock()
+                    await asyncio.wait_for(send(message), self.send_timeout)
+                    metrics.CLIENT_SEND.observe(metrics.clock() - start)
+                else:
+                    await asyncio.wait_for(send(message), self.send_timeout)
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    """每次广播带递增序号，并保留最近 replay_size 条结果供断线重连的客户端补发"""
+
+    def __init__(self, max_queue: int = 8, send_timeout: float = 2.0, replay_size: int = 256,
+                 epoch: Optional[str] = None):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.clients: Dict[WebSocket, ClientChannel] = {}
+        # epoch 标识本次服务进程；客户端带着旧 epoch 重连说明服务端重启过，序号已从头开始
+        # (relay 的各工作进程共用同一个 epoch 和序号，客户端重连到哪个进程都能续传)
+        self.epoch = epoch or uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.replay: deque = deque(maxlen=replay_size) # (seq, data)
+        # 所有客户端回报的投递/渲染延迟
+        self.delivery = QuantileSketch()
+        self.render = QuantileSketch()
+        self.sent = 0
+        self.evicted = 0
+        self.replayed = 0
+        self.resume_gaps = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+        """since 为客户端最后收到的序号 (首次连接为 None)，补发其后的所有结果"""
+        # 客户端通过子协议选择二进制帧 (优先 v2)，未协商时保持 JSON
+        offered = websocket.scope.get("subprotocols", [])
+        subprotocol = next((p for p in (SUBPROTOCOL_BINARY, SUBPROTOCOL_BINARY_V1) if p in offered), None)
+        await websocket.accept(subprotocol=subprotocol)
+        channel = ClientChannel(websocket, self.max_queue, self.send_timeout, subprotocol is not None,
+                                2 if subprotocol == SUBPROTOCOL_BINARY else 1)
+        # 从取出补发内容到登记客户端之间没有 await，不会与 publish 交错
+        channel.preload([json.dumps({"hello": {"epoch": self.epoch, "seq": self.seq}})])
+        if since is not None:
+            channel.preload(self._missed(since, epoch, channel))
+        self.clients[websocket] = channel
+        channel.task = asyncio.create_task(self._sender(channel))
+        return channel
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    async def serve(self, websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+        """/ws 端点的完整处理：连接、处理客户端发来的对时和延迟回报，直到断开"""
+        channel = await self.connect(websocket, since, epoch)
+        try:
+            while True:
+                self.on_client_message(channel, await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.disconnect(websocket)
+
+    def on_client_message(self, channel: ClientChannel, text: str) -> None:
+        """{"ping": 客户端时刻} -> 立即回 pong (带服务端时刻，客户端据此估计时钟偏差)；
+        {"lat": [[seq, 投递 ms, 渲染 ms], ...], "rtt": ms} -> 记入该客户端和全局的延迟分布"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        ping = message.get("ping")
+        if ping is not None:
+            # 限速并走有界队列 (不经过重放缓冲区)：客户端狂发 ping 也不会让发送队列无限增长
+            now = default_clock()
+            if now - channel.last_pong >= PING_INTERVAL_NS:
+                channel.last_pong = now
+                channel.offer(json.dumps({"pong": {"c": ping, "s": now / NS_PER_MS}}))
+            return
+        reports = message.get("lat")
+        if not isinstance(reports, list):
+            return
+        rtt = message.get("rtt")
+        if isinstance(rtt, (int, float)) and math.isfinite(rtt):
+            channel.rtt_ms = float(rtt)
+        timed = metrics.enabled
+        for report in reports[:64]:
+            try:
+                _, delivery, render = report
+                if delivery is not None:
+                    delivery = int(float(delivery) * NS_PER_MS)
+                    channel.delivery.add(delivery)
+                    self.delivery.add(delivery)
+                    if timed:
+                        metrics.CLIENT_DELIVERY.observe(max(0, delivery))
+                if render is not None:
+                    render = int(float(render) * NS_PER_MS)
+                    channel.render.add(render)
+                    self.render.add(render)
+                    if timed:
+                        metrics.CLIENT_RENDER.observe(max(0, render))
+            except (TypeError, ValueError, OverflowError):
+                continue # json.loads 接受 Infinity/NaN/1e400，换算为整数纳秒时会失败
+
+    def _missed(self, since: int, epoch: Optional[str], channel: ClientChannel) -> List:
+        if epoch is not None and epoch != self.epoch:
+            since = 0
+        missed = [(seq, data) for seq, data in self.replay if seq > since]
+        if missed and missed[0][0] > since + 1:
+            self.resume_gaps += 1 # 断线太久，最早的结果已被挤出重放缓冲区
+        self.replayed += len(missed)
+        # 补发的结果不带发布时刻 (v2 中为 0)，不计入客户端的投递延迟
+        if channel.binary:
+            sent = 0 if channel.frame_version == 2 else None
+            return [encode_frame(data, seq, sent) for seq, data in missed]
+        return [json.dumps({**data, "seq": seq}) for seq, data in missed]
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        channel = self.clients.pop(websocket, None)
+        if channel and channel.task and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    async def _sender(self, channel: ClientChannel):
+        try:
+            await channel.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 发送失败或超时：剔除该客户端，不影响其他观众
+            if channel.websocket in self.clients:
+                self.evicted += 1
+                self.disconnect(channel.websocket)
+                try:
+                    await channel.websocket.close()
+                except Exception:
+                    pass
+
+    def publish(self, data: dict, seq: Optional[int] = None):
+        """每种格式只序列化一次，然后放入每个客户端的发送队列 (必须在事件循环线程中调用)
+
+        seq 为 None 时使用下一个序号；relay 工作进程传入上游消息环中的序号。
+        每条消息带发布时刻 (JSON 的 ts 为 ms，v2 二进制帧为 us)，HUD 页面据此测量投递延迟。
+        """
+        self.seq = self.seq + 1 if seq is None else seq
+        self.replay.append((self.seq, data))
+        sent = default_clock()
+        text = frame = frame_v2 = None
+        for channel in self.clients.values():
+            if channel.binary:
+                if channel.frame_version == 2:
+                    if frame_v2 is None:
+                        frame_v2 = encode_frame(data, self.seq, sent // 1000)
+                    channel.offer(frame_v2)
+                else:
+                    if frame is None:
+                        frame = encode_frame(data, self.seq)
+                    channel.offer(frame)
+            else:
+                if text is None:
+                    text = json.dumps({**data, "seq": self.seq, "ts": sent // 1000 / 1000})
+                channel.offer(text)
+        self.sent += 1
 
     async def broadcast(self, data: dict):
-        for connection in self.active_connections:
-            await connection.send_text(json.dumps(data))
+        self.publish(data)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "sent": self.sent,
+            "evicted": self.evicted,
+            "dropped": sum(c.dropped for c in self.clients.values()),
+            "queued": sum(len(c.queue) for c in self.clients.values()),
+            "seq": self.seq,
+            "replayed": self.replayed,
+            "resume_gaps": self.resume_gaps,
+        }
+
+    def latency(self) -> dict:
+        """客户端回报的延迟：全局分布和每个客户端 (按投递延迟 p90 从高到低，卡顿的观众排在前面)"""
+        now = time.time()
+        clients = []
+        for channel in self.clients.values():
+            clients.append({
+                "id": channel.id,
+                "address": channel.address,
+                "user_agent": channel.user_agent,
+                "proto": f"bin.v{channel.frame_version}" if channel.binary else "json",
+                "connected_s": round(now - channel.connected_at, 1),
+                "rtt_ms": channel.rtt_ms,
+                "queued": len(channel.queue),
+                "dropped": channel.dropped,
+                "delivery": channel.delivery.to_dict(),
+                "render": channel.render.to_dict(),
+            })
+        clients.sort(key=lambda c: c["delivery"]["p90_ms"] or 0.0, reverse=True)
+        return {"delivery": self.delivery.to_dict(), "render": self.render.to_dict(), "clients": clients}
 
 manager = ConnectionManager()
+# 通过 UDP 接入的远程玩家，每个玩家有独立的分类器和 ConnectionManager
+players = PlayerRegistry(ConnectionManager)
+stats = SessionStats()
+# 可选的开枪历史存储 (start_server(history_path=...) 时启用)
+history = None
 
 listener = None
 
 @app.get("/")
 async def get():
-    return HTMLResponse(HTML_TEMPLATE)
+    return HTMLResponse(HTML_PAGE)
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+@app.get("/stats")
+async def get_stats():
+    return stats.snapshot()
+
+@app.get("/metrics")
+async def get_metrics():
+    gauges = {f"cstrafe_ws_{k}": v for k, v in manager.stats().items()}
+    queue_stats = listener.queue_stats() if listener is not None else None
+    if queue_stats:
+        gauges.update({f"cstrafe_event_queue_{k}": v for k, v in queue_stats.items()})
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+def _is_loopback(request: Request) -> bool:
     try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        return request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        return False
+
+@app.post("/metrics/enabled")
+async def set_metrics_enabled(request: Request, value: bool, reset: bool = False):
+    """运行时开关埋点，例如 POST /metrics/enabled?value=true；服务监听 0.0.0.0，只接受本机请求"""
+    if not _is_loopback(request):
+        raise HTTPException(status_code=403, detail="only allowed from this machine")
+    metrics.set_enabled(value)
+    if reset:
+        metrics.reset()
+    return {"enabled": metrics.enabled}
+
+@app.get("/latency")
+async def get_latency():
+    """HUD 客户端回报的投递/渲染延迟，本机 HUD 和每个远程玩家的频道分别统计"""
+    channels = {"main": manager.latency()}
+    for name, player in players.players.items():
+        channels[f"player:{name}"] = player.manager.latency()
+    return channels
+
+@app.get("/players")
+async def get_players():
+    return {"bad_packets": players.bad_packets, "rejected": players.rejected,
+            "players": {name: p.stats() for name, p in players.players.items()}}
+
+def _require_history():
+    if history is None:
+        raise HTTPException(status_code=404, detail="history is disabled (start with --history PATH)")
+    return history
+
+@app.get("/history/sessions")
+async def get_history_sessions():
+    store = _require_history()
+    return await asyncio.to_thread(store.sessions)
+
+@app.get("/history/shots")
+async def get_history_shots(session: Optional[str] = None, type: Optional[str] = None,
+                            limit: int = 1000, before_id: Optional[int] = None):
+    store = _require_history()
+    if type is not None and type not in STATE_TYPES:
+        raise HTTPException(status_code=400, detail=f"unknown type: {type}")
+    return await asyncio.to_thread(store.shots, session, type, max(1, min(limit, 10_000)), before_id)
+
+@app.get("/history/daily")
+async def get_history_daily(since: Optional[str] = None, until: Optional[str] = None):
+    store = _require_history()
+    return await asyncio.to_thread(store.daily, since, until)
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+    await manager.serve(websocket, since, epoch)
+
+@app.websocket("/ws/{player}")
+async def player_websocket_endpoint(websocket: WebSocket, player: str, since: Optional[int] = None,
+                                    epoch: Optional[str] = None):
+    channel = players.get(player)
+    if channel is None:
+        await websocket.close(code=1008) # 玩家数已满
+        return
+    await channel.manager.serve(websocket, since, epoch)
 
 def broadcast_shot(result: ShotResult):
     # 添加调试输出，便于检查数据
     # print(f"Debug: Broadcasting shot result - {result.to_display_data()}")
+    stats.add(result)
+    if history is not None:
+        history.add(result)
     if manager:
-        asyncio.run_coroutine_threadsafe(
-            manager.broadcast(result.to_display_data()), 
-            loop
-        )
+        # publish 只做入队，直接调度到事件循环，无需为每次开枪创建协程
+        if metrics.enabled:
+            loop.call_soon_threadsafe(_publish_timed, result.to_display_data(), metrics.clock())
+        else:
+            loop.call_soon_threadsafe(manager.publish, result.to_display_data())
+
+def _publish_timed(data: dict, handed_off: int):
+    metrics.LOOP_HANDOFF.observe(metrics.clock() - handed_off)
+    manager.publish(data)
 
 loop = None
 
-def start_server():
-    global loop, listener
+def start_server(decoupled: bool = False, recorder=None, history_path: Optional[str] = None,
+                 on_started: Optional[Callable] = None, ingest_port: Optional[int] = None,
+                 capture: bool = True, bindings: str = "wasd", axes: str = DEFAULT_AXES_SPEC,
+                 backend: str = "pynput", devices: Optional[List[str]] = None,
+                 capture_process: bool = False, record_path: Optional[str] = None, feed_path: Optional[str] = None):
+    """ingest_port: 接收远程 agent 事件的 UDP 端口；capture=False 时不监听本机输入 (纯中心服务器)；
+    axes: 本机和远程玩家共用的急停轴；backend/devices: 输入后端 (见 evdev_input.create_listener)；
+    capture_process: 钩子和分类在独立进程中运行 (见 shm_ring)，此时录制文件由 record_path 指定；
+    feed_path: 本机输入的结果同时写入最新结果文件 (见 result_feed)"""
+    global loop, listener, history
+    # 输入钩子和 uvicorn 只在真正启动服务时才需要，便于在无输入设备的环境中导入 app
+    import uvicorn
+
+    if history_path:
+        from history import HistoryStore
+        history = HistoryStore(history_path)
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     
-    listener = InputListener(on_shot_callback=broadcast_shot)
-    listener.start()
+    feed = None
+    if capture:
+        on_shot = broadcast_shot
+        if feed_path:
+            from result_feed import ResultFeed, with_feed
+            feed = ResultFeed(feed_path)
+            on_shot = with_feed(broadcast_shot, feed)
+        if capture_process:
+            from shm_ring import CaptureProcess
+            listener = CaptureProcess(on_shot, backend, devices, record_path=record_path,
+                                      decoupled=decoupled, bindings=bindings, axes=axes)
+        else:
+            from evdev_input import create_listener
+            listener = create_listener(backend, devices, on_shot_callback=on_shot, decoupled=decoupled,
+                                       recorder=recorder, bindings=bindings, axes=axes)
+        listener.start()
+        if on_started:
+            on_started(listener)
+    transport = None
+    if ingest_port:
+        # 远程玩家的事件直接在事件循环中解析和分类，不经过其他线程
+        players.axes = parse_axes(axes)
+        transport = loop.run_until_complete(start_ingest(players, port=ingest_port))
     
     config = uvicorn.Config(app=app, host="0.0.0.0", port=8000, loop="asyncio")
     server = uvicorn.Server(config)
@@ -152,7 +648,14 @@ def start_server():
     except KeyboardInterrupt:
         pass
     finally:
-        listener.stop()
+        if transport is not None:
+            transport.close()
+        if listener is not None:
+            listener.stop()
+        if feed is not None:
+            feed.close()
+        if history is not None:
+            history.close()
 
 if __name__ == "__main__":
     start_server()
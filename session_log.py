@@ -0,0 +1,197 @@
+# session_log.py
+import argparse
+import json
+import mmap
+import struct
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from classifier import MovementClassifier, ShotResult, SLOT_NAMES, NO_SLOT
+from clock import Clock, default_clock
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+
+# 文件头: magic, 版本, 单条记录长度, 保留, 录制开始的墙上时间 (ns)
+MAGIC = b"CSTRLOG\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIq")
+# 定长记录: 时间戳 (ns), 事件类型, 按键编码
+RECORD = struct.Struct("<qBB")
+
+# 按键编码即分类器的槽位下标，开枪事件没有按键
+KEYS = SLOT_NAMES
+KEY_CODES = {k: i for i, k in enumerate(KEYS)}
+NO_KEY = NO_SLOT
+
+Record = Tuple[int, int, int] # (timestamp_ns, kind, key_code)
+
+class SessionRecorder:
+    """把输入事件写入紧凑的定长二进制日志
+
+    记录先打包进预分配的 bytearray，写满后一次性落盘，单个事件只有一次 pack_into。
+    """
+
+    def __init__(self, path: str, buffer_records: int = 4096) -> None:
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, time.time_ns()))
+        self._buf = bytearray(RECORD.size * buffer_records)
+        self._offset = 0
+        self._lock = threading.Lock() # 直连模式下键盘和鼠标钩子线程都会写
+        self.count = 0
+
+    def record(self, kind: int, slot: int, timestamp: int) -> None:
+        """slot 为按键槽位，开枪事件为 NO_KEY"""
+        with self._lock:
+            RECORD.pack_into(self._buf, self._offset, timestamp, kind, slot)
+            self._offset += RECORD.size
+            self.count += 1
+            if self._offset == len(self._buf):
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._offset:
+            self._file.write(memoryview(self._buf)[:self._offset])
+            self._offset = 0
+        self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush_locked()
+            self._file.close()
+
+class SessionReader:
+    """通过 mmap 读取会话日志，不把整个文件读入内存"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close() # 空文件无法映射
+            raise
+        try:
+            if len(self._mm) < HEADER.size:
+                raise ValueError(f"{path}: too short for a cStrafe session log")
+            magic, version, record_size, _, self.start_wall_ns = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a cStrafe session log")
+            if version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"{path}: unsupported log version {version}")
+        except BaseException:
+            # 被拒绝的文件不能泄漏映射和文件描述符 (analyze 会在一个进程中打开大量文件)
+            self.close()
+            raise
+        # 录制中途断电时最后一条可能不完整，直接忽略
+        self.count = (len(self._mm) - HEADER.size) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Record]:
+        end = HEADER.size + self.count * RECORD.size
+        view = memoryview(self._mm)[HEADER.size:end]
+        try:
+            yield from RECORD.iter_unpack(view)
+        finally:
+            view.release()
+
+    def iter_chunks(self, chunk_records: int = 65536) -> Iterator[memoryview]:
+        """按块产出记录区的视图；读过的页随即交还内核，常驻内存与日志大小无关"""
+        advise = getattr(self._mm, "madvise", None)
+        dontneed = getattr(mmap, "MADV_DONTNEED", None)
+        end = HEADER.size + self.count * RECORD.size
+        step = chunk_records * RECORD.size
+        view = memoryview(self._mm)
+        try:
+            for start in range(HEADER.size, end, step):
+                chunk = view[start:min(start + step, end)]
+                try:
+                    yield chunk
+                finally:
+                    chunk.release()
+                if advise is not None and dontneed is not None:
+                    # madvise 要求起点按页对齐
+                    page_start = start - start % mmap.PAGESIZE
+                    advise(dontneed, page_start, min(start + step, end) - page_start)
+        finally:
+            view.release()
+
+    def record_at(self, index: int) -> Record:
+        return RECORD.unpack_from(self._mm, HEADER.size + index * RECORD.size)
+
+    @property
+    def buffer(self) -> memoryview:
+        """记录区的只读视图 (供批量/向量化处理)"""
+        return memoryview(self._mm)[HEADER.size:HEADER.size + self.count * RECORD.size]
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "SessionReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def replay(
+    path: str,
+    classifier: Optional[MovementClassifier] = None,
+    speed: float = 0.0,
+    clock: Clock = default_clock,
+    sleep=time.sleep,
+) -> Iterator[ShotResult]:
+    """把日志重新喂给分类器，产出与录制时相同的 ShotResult 序列
+
+    speed=0 为最快速度，1 为实时，N 为 N 倍速。
+    """
+    classifier = classifier or MovementClassifier()
+    with SessionReader(path) as reader:
+        base_ts = None
+        base_clock = 0
+        for timestamp, kind, code in reader:
+            if speed > 0:
+                if base_ts is None:
+                    base_ts, base_clock = timestamp, clock()
+                wait_ns = base_clock + (timestamp - base_ts) / speed - clock()
+                if wait_ns > 0:
+                    sleep(wait_ns / 1e9)
+
+            if kind == EV_PRESS:
+                classifier.on_press(code, timestamp)
+            elif kind == EV_RELEASE:
+                classifier.on_release(code, timestamp)
+            elif kind == EV_SHOT:
+                yield classifier.classify_shot(timestamp)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cStrafe 会话日志工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_info = sub.add_parser("info", help="显示日志信息")
+    p_info.add_argument("path")
+    p_replay = sub.add_parser("replay", help="回放日志并输出每次开枪的结果 (JSON Lines)")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=0.0, help="0=最快, 1=实时, N=N倍速")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        with SessionReader(args.path) as reader:
+            shots = sum(1 for _, kind, _ in reader if kind == EV_SHOT)
+            duration = (reader.record_at(len(reader) - 1)[0] - reader.record_at(0)[0]) / 1e9 if len(reader) else 0.0
+            print(json.dumps({"events": len(reader), "shots": shots, "duration_s": round(duration, 3),
+                              "start_wall_ns": reader.start_wall_ns}))
+    else:
+        start = time.perf_counter()
+        n = 0
+        for result in replay(args.path, speed=args.speed):
+            print(json.dumps(result.to_display_data()))
+            n += 1
+        print(f"# {n} shots in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,408 @@
+# shm_ring.py
+"""独立的输入采集进程，通过共享内存结果环把 ShotResult 交给 UI/服务器进程
+
+    python main.py --capture-process            # Local 模式：Tk 重绘卡顿不再推迟输入时间戳
+    python main.py --server --capture-process   # Server 模式：Web 流量和 JSON 序列化不再与钩子线程争用 GIL
+
+采集进程只运行输入监听器和分类器，把每个 ShotResult 写进 multiprocessing.shared_memory 中的定长记录环；
+UI/服务器进程的消费线程读出后调用原来的回调。单生产者/单消费者，生产者从不等待：
+每条记录带一个 seqlock 序号 (写入期间为奇数，写完为 2*(n+1))，消费者在读记录前后各检查一次序号，
+被覆盖或正在写入的记录会被识别出来并计入 lost。依赖 x86/x64 的存储顺序。
+多轴时的逐轴数据 (ShotResult.axes) 写在同一条记录的轴区中 (最多 MAX_AXES 条轴)。
+
+MessageRing 是同样协议的变长消息版本 (每槽一条不超过 slot_size 字节的消息)，供 relay.py 把上游消息
+交给多个 Web 工作进程；每个读者各有自己的游标，读取不修改共享内存，所以可以有任意多个读者。
+"""
+import multiprocessing
+import struct
+import threading
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from classifier import AxisResult, ShotResult, STATE_TYPES, PALETTE, SLOT_NAMES
+from clock import default_clock
+from event_ring import EV_SHOT
+import metrics
+
+MAGIC = b"CSRG"
+VERSION = 2
+# 头部: magic, 版本, 单条记录长度, 容量；已发布记录数在偏移 16 处单独更新
+HEADER = struct.Struct("<4sHHI")
+INDEX = struct.Struct("<Q")
+INDEX_OFFSET = 16
+DATA_OFFSET = 64
+# 记录: seqlock 序号 + 正文 (类型, 状态, 颜色, 标志, 轴数, 开枪时刻, 时间差, 延迟, 发布时刻) + 轴区
+SEQ = struct.Struct("<Q")
+BODY = struct.Struct("<BBBBiqqqq")
+# 轴区每条: 轴编码 (AXIS_NAMES 下标), 状态, 标志, 时间差, 延迟；轴数为 0 表示单轴 (ShotResult.axes 为 None)
+AXIS = struct.Struct("<BBB5xqq")
+MAX_AXES = len(SLOT_NAMES) // 2 # 每个槽位最多属于一条轴
+RECORD_SIZE = SEQ.size + BODY.size + MAX_AXES * AXIS.size
+
+FLAG_DIFF = 1
+FLAG_DELAY = 2
+FLAG_TIME = 4
+
+_TYPE_INDEX = {t: i for i, t in enumerate(STATE_TYPES)}
+_COLOR_INDEX = {c: i for i, c in enumerate(PALETTE)}
+# 所有可能的轴名 ("WA", "WS", ... )
+AXIS_NAMES = tuple(a + b for a in SLOT_NAMES for b in SLOT_NAMES if a != b)
+_AXIS_INDEX = {name: i for i, name in enumerate(AXIS_NAMES)}
+
+class ShmRing:
+    """共享内存中的定长记录环；name 为 None 时创建，否则按名称连接到已有的环"""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 1024) -> None:
+        if name is None:
+            if capacity <= 0 or capacity & (capacity - 1):
+                raise ValueError("capacity must be a power of two")
+            self.shm = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + capacity * RECORD_SIZE)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, RECORD_SIZE, capacity)
+            INDEX.pack_into(self.shm.buf, INDEX_OFFSET, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, version, record_size, capacity = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+                self.shm.close()
+                raise ValueError(f"not a result ring (version {VERSION}): {name}")
+        self.name = self.shm.name
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._buf = self.shm.buf
+        self._next = INDEX.unpack_from(self._buf, INDEX_OFFSET)[0] # 生产者下一条记录的序号
+
+    def written(self) -> int:
+        return INDEX.unpack_from(self._buf, INDEX_OFFSET)[0]
+
+    def publish(self, result: ShotResult, published_ns: int) -> None:
+        """只能由一个线程调用 (采集进程中的分类回调)"""
+        n = self._next
+        offset = DATA_OFFSET + (n & self._mask) * RECORD_SIZE
+        buf = self._buf
+        flags = 0
+        diff = result.time_diff
+        if diff is not None:
+            flags |= FLAG_DIFF
+        else:
+            diff = 0
+        delay = result.shot_delay
+        if delay is not None:
+            flags |= FLAG_DELAY
+        else:
+            delay = 0
+        shot_time = result.shot_time
+        if shot_time is not None:
+            flags |= FLAG_TIME
+        else:
+            shot_time = 0
+        axes = result.axes
+        # 序号为奇数期间消费者会放弃这条记录；写完正文再写偶数序号，最后才移动发布计数
+        SEQ.pack_into(buf, offset, 2 * n + 1)
+        BODY.pack_into(buf, offset + SEQ.size, EV_SHOT, _TYPE_INDEX[result.state_type],
+                       _COLOR_INDEX[result.color_hex], flags, len(axes) if axes else 0,
+                       shot_time, diff, delay, published_ns)
+        if axes:
+            axis_offset = offset + SEQ.size + BODY.size
+            for axis in axes[:MAX_AXES]:
+                axis_flags = 0
+                axis_diff = axis.time_diff
+                if axis_diff is not None:
+                    axis_flags |= FLAG_DIFF
+                else:
+                    axis_diff = 0
+                axis_delay = axis.shot_delay
+                if axis_delay is not None:
+                    axis_flags |= FLAG_DELAY
+                else:
+                    axis_delay = 0
+                AXIS.pack_into(buf, axis_offset, _AXIS_INDEX[axis.axis], _TYPE_INDEX[axis.state_type],
+                               axis_flags, axis_diff, axis_delay)
+                axis_offset += AXIS.size
+        SEQ.pack_into(buf, offset, 2 * n + 2)
+        self._next = n + 1
+        INDEX.pack_into(buf, INDEX_OFFSET, n + 1)
+
+    def close(self) -> None:
+        self._buf = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+class RingReader:
+    """结果环的消费端；落后超过一圈的记录直接跳过并计入 lost"""
+
+    def __init__(self, ring: ShmRing) -> None:
+        self.ring = ring
+        self.cursor = ring.written() # 只读之后发布的记录
+        self.lost = 0
+        self.delivered = 0
+
+    def depth(self) -> int:
+        return self.ring.written() - self.cursor
+
+    def drain(self, out: List[Tuple[ShotResult, int]], max_batch: int = 256) -> int:
+        """把可读的记录以 (ShotResult, 发布时刻) 追加到 out，返回条数"""
+        ring = self.ring
+        buf, mask, capacity = ring._buf, ring._mask, ring.capacity
+        written = INDEX.unpack_from(buf, INDEX_OFFSET)[0]
+        n = self.cursor
+        if written - n > capacity:
+            self.lost += written - n - capacity
+            n = written - capacity
+        end = min(written, n + max_batch)
+        count = 0
+        while n < end:
+            offset = DATA_OFFSET + (n & mask) * RECORD_SIZE
+            expected = 2 * n + 2
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if seq < expected:
+                break # 还没写完
+            _, state, color, flags, axis_count, shot_time, diff, delay, published = BODY.unpack_from(
+                buf, offset + SEQ.size)
+            axes = None
+            if axis_count:
+                axis_offset = offset + SEQ.size + BODY.size
+                axes = [AXIS.unpack_from(buf, axis_offset + i * AXIS.size) for i in range(min(axis_count, MAX_AXES))]
+            if seq != expected or SEQ.unpack_from(buf, offset)[0] != seq:
+                # 读之前或读的过程中被下一圈覆盖
+                self.lost += 1
+                n += 1
+                continue
+            result = ShotResult(
+                STATE_TYPES[state], PALETTE[color],
+                diff if flags & FLAG_DIFF else None,
+                delay if flags & FLAG_DELAY else None,
+                shot_time if flags & FLAG_TIME else None,
+            )
+            if axes is not None:
+                result.axes = tuple(
+                    AxisResult(AXIS_NAMES[code], STATE_TYPES[axis_state],
+                               axis_diff if axis_flags & FLAG_DIFF else None,
+                               axis_delay if axis_flags & FLAG_DELAY else None)
+                    for code, axis_state, axis_flags, axis_diff, axis_delay in axes
+                )
+            out.append((result, published))
+            n += 1
+            count += 1
+        self.cursor = n
+        self.delivered += count
+        return count
+
+MESSAGE_MAGIC = b"CSRM"
+# 消息记录: seqlock 序号 + 长度 + 正文
+LENGTH = struct.Struct("<I")
+
+class MessageRing:
+    """共享内存中的变长消息环 (单生产者，多读者)；name 为 None 时创建，否则按名称连接"""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 1024, slot_size: int = 512) -> None:
+        if name is None:
+            if capacity <= 0 or capacity & (capacity - 1):
+                raise ValueError("capacity must be a power of two")
+            record_size = SEQ.size + LENGTH.size + slot_size
+            self.shm = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + capacity * record_size)
+            HEADER.pack_into(self.shm.buf, 0, MESSAGE_MAGIC, VERSION, record_size, capacity)
+            INDEX.pack_into(self.shm.buf, INDEX_OFFSET, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, version, record_size, capacity = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MESSAGE_MAGIC or version != VERSION:
+                self.shm.close()
+                raise ValueError(f"not a message ring (version {VERSION}): {name}")
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.record_size = record_size
+        self.slot_size = record_size - SEQ.size - LENGTH.size
+        self._mask = capacity - 1
+        self._buf = self.shm.buf
+        self._next = INDEX.unpack_from(self._buf, INDEX_OFFSET)[0]
+
+    def written(self) -> int:
+        return INDEX.unpack_from(self._buf, INDEX_OFFSET)[0]
+
+    def publish(self, payload: bytes) -> int:
+        """写入一条消息并返回它的序号 (从 0 开始)；超过 slot_size 时抛出 ValueError"""
+        if len(payload) > self.slot_size:
+            raise ValueError(f"message of {len(payload)} bytes exceeds slot size {self.slot_size}")
+        n = self._next
+        offset = DATA_OFFSET + (n & self._mask) * self.record_size
+        buf = self._buf
+        SEQ.pack_into(buf, offset, 2 * n + 1)
+        LENGTH.pack_into(buf, offset + SEQ.size, len(payload))
+        start = offset + SEQ.size + LENGTH.size
+        buf[start:start + len(payload)] = payload
+        SEQ.pack_into(buf, offset, 2 * n + 2)
+        self._next = n + 1
+        INDEX.pack_into(buf, INDEX_OFFSET, n + 1)
+        return n
+
+    def close(self) -> None:
+        self._buf = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+class MessageReader:
+    """消息环的一个读者；backlog > 0 时从最近 backlog 条消息开始读 (用于预填重放缓冲区)"""
+
+    def __init__(self, ring: MessageRing, backlog: int = 0) -> None:
+        self.ring = ring
+        written = ring.written()
+        self.cursor = max(0, written - min(backlog, ring.capacity))
+        self.lost = 0
+        self.delivered = 0
+
+    def depth(self) -> int:
+        return self.ring.written() - self.cursor
+
+    def drain(self, out: List[Tuple[int, bytes]], max_batch: int = 256) -> int:
+        """把可读的消息以 (序号, 正文) 追加到 out，返回条数"""
+        ring = self.ring
+        buf, mask, capacity, record_size = ring._buf, ring._mask, ring.capacity, ring.record_size
+        written = INDEX.unpack_from(buf, INDEX_OFFSET)[0]
+        n = self.cursor
+        if written - n > capacity:
+            self.lost += written - n - capacity
+            n = written - capacity
+        end = min(written, n + max_batch)
+        count = 0
+        while n < end:
+            offset = DATA_OFFSET + (n & mask) * record_size
+            expected = 2 * n + 2
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if seq < expected:
+                break
+            length = LENGTH.unpack_from(buf, offset + SEQ.size)[0]
+            start = offset + SEQ.size + LENGTH.size
+            payload = bytes(buf[start:start + min(length, ring.slot_size)])
+            if seq != expected or SEQ.unpack_from(buf, offset)[0] != seq:
+                self.lost += 1
+                n += 1
+                continue
+            out.append((n, payload))
+            n += 1
+            count += 1
+        self.cursor = n
+        self.delivered += count
+        return count
+
+def _capture_main(ring_name: str, wakeup, stop, ready, backend: str, devices: Optional[Sequence[str]],
+                  record_path: Optional[str], listener_kwargs: dict) -> None:
+    """采集进程入口：运行监听器，每个结果写入结果环后唤醒消费线程"""
+    from evdev_input import create_listener
+
+    ring = ShmRing(ring_name)
+    clock = default_clock
+
+    def on_shot(result: ShotResult) -> None:
+        ring.publish(result, clock())
+        wakeup.set()
+
+    recorder = None
+    if record_path:
+        from session_log import SessionRecorder
+        recorder = SessionRecorder(record_path)
+    listener = create_listener(backend, devices, on_shot_callback=on_shot, recorder=recorder, **listener_kwargs)
+    listener.start()
+    try:
+        listener.wait_ready()
+        ready.set()
+        parent = getattr(multiprocessing, "parent_process", lambda: None)()
+        # 父进程异常退出时也要结束，否则系统钩子会一直留着
+        while not stop.wait(0.5):
+            if parent is not None and not parent.is_alive():
+                break
+    finally:
+        listener.stop()
+        ring.close()
+
+class CaptureProcess:
+    """在独立进程中运行输入监听器，接口与 InputListener 相同 (start/stop/wait_ready/queue_stats)
+
+    on_shot_callback 在本进程的消费线程中调用；录制 (record_path) 在采集进程中进行。
+    其余参数 (decoupled/bindings/axes 等) 原样交给采集进程中的监听器。
+    """
+
+    def __init__(
+        self,
+        on_shot_callback: Callable[[ShotResult], None],
+        backend: str = "pynput",
+        devices: Optional[Sequence[str]] = None,
+        record_path: Optional[str] = None,
+        capacity: int = 1024,
+        **listener_kwargs,
+    ) -> None:
+        self.on_shot_callback = on_shot_callback
+        self.backend = backend
+        self.devices = list(devices) if devices else None
+        self.record_path = record_path
+        self.capacity = capacity
+        self.listener_kwargs = listener_kwargs
+        self.last_published_ns = 0 # 最近一条结果在采集进程中的发布时刻
+        self.running = False
+        self.ring: Optional[ShmRing] = None
+        self._reader: Optional[RingReader] = None
+        self._process = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # spawn：父进程里已经有 Tk/uvicorn 线程，fork 不安全；Windows 上也只有 spawn
+        ctx = multiprocessing.get_context("spawn")
+        self.ring = ShmRing(capacity=self.capacity)
+        self._reader = RingReader(self.ring)
+        self._wakeup, self._stop, self._ready = ctx.Event(), ctx.Event(), ctx.Event()
+        self._process = ctx.Process(
+            target=_capture_main, name="cStrafe-capture", daemon=True,
+            args=(self.ring.name, self._wakeup, self._stop, self._ready, self.backend, self.devices,
+                  self.record_path, self.listener_kwargs),
+        )
+        self._process.start()
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="cStrafe-ring-consumer", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self) -> None:
+        """阻塞直到采集进程中的钩子就绪；采集进程启动失败时抛出 RuntimeError"""
+        while not self._ready.wait(0.1):
+            if not self._process.is_alive():
+                raise RuntimeError(f"capture process exited with code {self._process.exitcode}")
+
+    def stop(self) -> None:
+        self.running = False
+        if self._process is not None:
+            self._stop.set()
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._thread:
+            self._wakeup.set()
+            self._thread.join(timeout=1.0)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+    def queue_stats(self) -> Optional[Dict[str, int]]:
+        reader = self._reader
+        if reader is None or self.ring is None:
+            return None
+        return {"depth": reader.depth(), "dropped": reader.lost, "processed": reader.delivered}
+
+    def _run(self) -> None:
+        batch: List[Tuple[ShotResult, int]] = []
+        wakeup, drain = self._wakeup, self._reader.drain
+        while self.running:
+            wakeup.wait(timeout=0.1)
+            # 先清除再读：清除之后发布的结果一定会再次唤醒
+            wakeup.clear()
+            while True:
+                batch.clear()
+                if not drain(batch):
+                    break
+                for result, published in batch:
+                    self.last_published_ns = published
+                    if metrics.enabled:
+                        metrics.RING_HANDOFF.observe(metrics.clock() - published)
+                    self.on_shot_callback(result)
@@ -0,0 +1,226 @@
+# stats.py
+"""流式会话统计：每次开枪 O(1) 更新，内存固定 (可连续运行数小时)"""
+import math
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from classifier import ShotResult, STATE_TYPES, COLOR_GREEN
+from clock import Clock, NS_PER_MS, default_clock
+
+class RunningStats:
+    """Welford 在线均值/方差"""
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningStats") -> None:
+        """合并另一组的统计 (Chan 并行公式)，结果与把两组数据依次 add 相同"""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean_ms": self.mean / NS_PER_MS,
+                "std_ms": math.sqrt(self.variance) / NS_PER_MS}
+
+class QuantileSketch:
+    """固定桶数的对数直方图，分位数相对误差约为 relative_accuracy
+
+    桶 i 覆盖 (min * gamma^(i-1), min * gamma^i]，低于 min 的值落入第 0 个桶，
+    高于 max 的值落入最后一个桶。
+    """
+
+    def __init__(
+        self,
+        min_value: int = NS_PER_MS // 10,
+        max_value: int = 10_000 * NS_PER_MS,
+        relative_accuracy: float = 0.01,
+    ) -> None:
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: List[int] = [0] * (int(math.ceil(math.log(max_value / min_value) / self._log_gamma)) + 2)
+        self.count = 0
+
+    def add(self, value: int) -> None:
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(len(self.counts) - 1, int(math.ceil(math.log(value / self.min_value) / self._log_gamma)))
+        self.counts[index] += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """合并参数相同的另一个直方图"""
+        if other.min_value != self.min_value or len(other.counts) != len(self.counts):
+            raise ValueError("cannot merge sketches with different parameters")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index, c in enumerate(self.counts):
+            seen += c
+            if seen > rank:
+                break
+        if index == 0:
+            return float(self.min_value)
+        # 返回桶的几何中点
+        return self.min_value * self.gamma ** index * 2 / (1 + self.gamma)
+
+    def to_dict(self) -> dict:
+        result = {"count": self.count}
+        for name, q in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99)):
+            value = self.quantile(q)
+            result[name] = value / NS_PER_MS if value is not None else None
+        return result
+
+class RollingWindow:
+    """最近 N 次开枪或最近一段时间内的计数和均值；进出窗口都是 O(1)"""
+
+    def __init__(self, max_shots: Optional[int] = None, max_age_ns: Optional[int] = None) -> None:
+        self.max_shots = max_shots
+        self.max_age_ns = max_age_ns
+        self._entries: Deque[Tuple[int, int, bool, Optional[int], Optional[int]]] = deque()
+        self.state_counts = [0] * len(STATE_TYPES)
+        self.green = 0
+        self._diff_sum = 0
+        self._diff_n = 0
+        self._delay_sum = 0
+        self._delay_n = 0
+
+    def _apply(self, entry, sign: int) -> None:
+        _, state, green, diff, delay = entry
+        self.state_counts[state] += sign
+        self.green += sign * green
+        if diff is not None:
+            self._diff_sum += sign * abs(diff)
+            self._diff_n += sign
+        if delay is not None:
+            self._delay_sum += sign * delay
+            self._delay_n += sign
+
+    def add(self, timestamp: int, state: int, green: bool, diff: Optional[int], delay: Optional[int]) -> None:
+        entry = (timestamp, state, green, diff, delay)
+        self._entries.append(entry)
+        self._apply(entry, 1)
+        if self.max_shots is not None and len(self._entries) > self.max_shots:
+            self._apply(self._entries.popleft(), -1)
+        self.expire(timestamp)
+
+    def expire(self, now: int) -> None:
+        if self.max_age_ns is None:
+            return
+        entries = self._entries
+        while entries and now - entries[0][0] > self.max_age_ns:
+            self._apply(entries.popleft(), -1)
+
+    def to_dict(self) -> dict:
+        n = len(self._entries)
+        return {
+            "shots": n,
+            "states": {t: c for t, c in zip(STATE_TYPES, self.state_counts) if c},
+            "green_ratio": self.green / n if n else None,
+            "mean_abs_diff_ms": self._diff_sum / self._diff_n / NS_PER_MS if self._diff_n else None,
+            "mean_delay_ms": self._delay_sum / self._delay_n / NS_PER_MS if self._delay_n else None,
+        }
+
+class SessionStats:
+    """由每个 ShotResult 驱动的会话统计 (线程安全，更新 O(1))"""
+
+    def __init__(
+        self,
+        clock: Clock = default_clock,
+        window_shots: int = 50,
+        window_ns: int = 5 * 60 * 1000 * NS_PER_MS,
+    ) -> None:
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.total = 0
+        self.state_counts = [0] * len(STATE_TYPES)
+        self._state_index = {t: i for i, t in enumerate(STATE_TYPES)}
+        # 每种状态的时间差/射击延迟均值和方差
+        self.diff_stats = [RunningStats() for _ in STATE_TYPES]
+        self.delay_stats = [RunningStats() for _ in STATE_TYPES]
+        self.overlap = QuantileSketch()
+        self.gap = QuantileSketch()
+        self.delay = QuantileSketch()
+        self.last_shots = RollingWindow(max_shots=window_shots)
+        self.last_minutes = RollingWindow(max_age_ns=window_ns)
+
+    def add(self, result: ShotResult) -> None:
+        timestamp = result.shot_time if result.shot_time is not None else self.clock()
+        state = self._state_index[result.state_type]
+        green = result.color_hex == COLOR_GREEN
+        diff = result.time_diff
+        delay = result.shot_delay
+        with self._lock:
+            self.total += 1
+            self.state_counts[state] += 1
+            if diff is not None:
+                self.diff_stats[state].add(diff)
+                if result.state_type == "Overlap":
+                    self.overlap.add(diff)
+                elif result.state_type == "EarlyRelease":
+                    self.gap.add(diff)
+            if delay is not None:
+                self.delay_stats[state].add(delay)
+                self.delay.add(delay)
+            self.last_shots.add(timestamp, state, green, diff, delay)
+            self.last_minutes.add(timestamp, state, green, diff, delay)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            # 长时间没有开枪时，5 分钟窗口也要随时间过期
+            self.last_minutes.expire(self.clock())
+            return {
+                "total": self.total,
+                "states": {
+                    t: {
+                        "count": self.state_counts[i],
+                        "diff": self.diff_stats[i].to_dict(),
+                        "delay": self.delay_stats[i].to_dict(),
+                    }
+                    for i, t in enumerate(STATE_TYPES) if self.state_counts[i]
+                },
+                "overlap": self.overlap.to_dict(),
+                "gap": self.gap.to_dict(),
+                "shot_delay": self.delay.to_dict(),
+                "last_shots": self.last_shots.to_dict(),
+                "last_minutes": self.last_minutes.to_dict(),
+            }
+
+    def summary_line(self) -> str:
+        """Overlay 使用的一行摘要：最近 N 次的绿色比例和平均值"""
+        with self._lock:
+            window = self.last_shots.to_dict()
+        if not window["shots"]:
+            return ""
+        parts = [f"Last {window['shots']}"]
+        if window["green_ratio"] is not None:
+            parts.append(f"G {window['green_ratio'] * 100:.0f}%")
+        if window["mean_abs_diff_ms"] is not None:
+            parts.append(f"D {window['mean_abs_diff_ms']:.0f}ms")
+        return " ".join(parts)
@@ -0,0 +1,206 @@
+# sweep.py
+"""阈值参数扫描：对一组录制会话按参数网格分类，输出每组参数下的状态/颜色分布
+
+    python sweep.py logs/*.cslog --early 100:500:20 --recent 200:1000:50 --green 5:50:5
+    python sweep.py --synthetic-hours 4 --output sweep.csv
+
+所有会话的事件先复制到一块 multiprocessing.shared_memory 中，工作进程通过只读视图访问，
+任务只传阈值。每个工作进程对每个会话只做一次 prepare；同一个 early_release 值的
+transitions 只算一次，之后每组 (recent_stop, green) 只处理开枪数组。
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_classifier import (
+    RECORD_DTYPE, STATE_RUN_GUN, STATE_STATIC, prepare, transitions, Prepared,
+)
+from classifier import (
+    STATE_TYPES, EARLY_RELEASE_WINDOW_NS, RECENT_STOP_WINDOW_NS, GREEN_THRESHOLD_NS,
+    Axis, DEFAULT_AXES, DEFAULT_AXES_SPEC, parse_axes,
+)
+from clock import NS_PER_MS
+from session_log import SessionReader
+import synthetic
+
+# 结果列：各状态计数 + 绿色/橙色计数 (只有非跑打且有近期急停的开枪才有颜色等级)
+COLUMNS = STATE_TYPES + ("green", "orange")
+
+# 工作进程内的全局状态 (initializer 中设置)
+_shm: Optional[shared_memory.SharedMemory] = None
+_prepared: List[Prepared] = []
+
+def _init_worker(shm_name: str, total: int, offsets: Sequence[int], axes: Sequence[Axis]) -> None:
+    global _shm, _prepared
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    records = np.ndarray((total,), dtype=RECORD_DTYPE, buffer=_shm.buf)
+    records.flags.writeable = False
+    _prepared = [
+        prepare(records["t"][start:end], records["kind"][start:end], records["key"][start:end], axes)
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+def sweep_counts(
+    prepared: Sequence[Prepared],
+    early_ns: int,
+    recent_values: Sequence[int],
+    green_values: Sequence[int],
+) -> np.ndarray:
+    """固定 early_release 时所有 (recent_stop, green) 组合的分布，形状 (len(recent), len(green), len(COLUMNS))"""
+    parts = [transitions(prep, early_ns) for prep in prepared]
+    run_gun = np.concatenate([t.run_gun for t in parts])
+    still = ~run_gun
+    state = np.concatenate([t.state for t in parts])[still]
+    delay = np.concatenate([t.shot_delay for t in parts])[still]
+    diff_abs = np.abs(np.concatenate([t.time_diff for t in parts]))[still]
+    greens = np.asarray(green_values, dtype=np.int64)
+
+    out = np.zeros((len(recent_values), len(green_values), len(COLUMNS)), dtype=np.int64)
+    out[:, :, STATE_RUN_GUN] = np.count_nonzero(run_gun)
+    for i, recent_ns in enumerate(recent_values):
+        recent = delay < recent_ns
+        counts = np.bincount(state[recent], minlength=len(STATE_TYPES))
+        counts[STATE_STATIC] += len(recent) - np.count_nonzero(recent)
+        counts[STATE_RUN_GUN] = 0
+        out[i, :, :len(STATE_TYPES)] += counts
+        # 排序一次后所有 green 阈值都用二分查找
+        ordered = np.sort(diff_abs[recent])
+        green = np.searchsorted(ordered, greens, side="right")
+        out[i, :, len(STATE_TYPES)] = green
+        out[i, :, len(STATE_TYPES) + 1] = len(ordered) - green
+    return out
+
+def _task(args: Tuple[int, Sequence[int], Sequence[int]]) -> Tuple[int, Sequence[int], np.ndarray]:
+    early_ns, recent_values, green_values = args
+    return early_ns, recent_values, sweep_counts(_prepared, early_ns, recent_values, green_values)
+
+def load_sessions(paths: Sequence[str], synthetic_hours: float = 0.0, seed: int = 0) -> List[np.ndarray]:
+    """会话日志和/或合成会话 (每段 1 小时) -> RECORD_DTYPE 数组列表"""
+    sessions = []
+    for path in paths:
+        with SessionReader(path) as reader:
+            view = reader.buffer
+            try:
+                sessions.append(np.frombuffer(view, dtype=RECORD_DTYPE).copy())
+            finally:
+                view.release()
+    remaining = synthetic_hours
+    index = 0
+    while remaining > 0:
+        span = int(min(1.0, remaining) * 3600 * 1e9)
+        # 合成输入约每秒 10 个事件，多生成一些再按时长截断
+        events = synthetic.generate(int(span / 1e9 * 15), seed=seed + index)
+        records = np.array(events, dtype=RECORD_DTYPE)
+        sessions.append(records[records["t"] - records["t"][0] < span])
+        remaining -= 1.0
+        index += 1
+    return sessions
+
+def run_sweep(
+    sessions: Sequence[np.ndarray],
+    early_values: Sequence[int],
+    recent_values: Sequence[int],
+    green_values: Sequence[int],
+    workers: Optional[int] = None,
+    axes: Sequence[Axis] = DEFAULT_AXES,
+) -> List[tuple]:
+    """返回 [(early_ns, recent_ns, green_ns, *COLUMNS 计数), ...]，按参数顺序排列"""
+    workers = workers or os.cpu_count() or 1
+    offsets = np.cumsum([0] + [len(s) for s in sessions]).tolist()
+    total = offsets[-1]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total * RECORD_DTYPE.itemsize))
+    try:
+        records = np.ndarray((total,), dtype=RECORD_DTYPE, buffer=shm.buf)
+        for start, session in zip(offsets, sessions):
+            records[start:start + len(session)] = session
+        del records
+
+        # 任务数至少为工作进程数的几倍，early 取值较少时按 recent 切分
+        chunks = max(1, -(-workers * 4 // len(early_values)))
+        size = -(-len(recent_values) // chunks)
+        tasks = [
+            (e, list(recent_values[i:i + size]), list(green_values))
+            for e in early_values for i in range(0, len(recent_values), size)
+        ]
+        grid = {}
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shm.name, total, offsets, tuple(axes))) as pool:
+            for early_ns, recents, counts in pool.map(_task, tasks):
+                for i, recent_ns in enumerate(recents):
+                    for j, green_ns in enumerate(green_values):
+                        grid[(early_ns, recent_ns, green_ns)] = counts[i, j].tolist()
+    finally:
+        shm.close()
+        shm.unlink()
+    return [
+        (e, r, g, *grid[(e, r, g)])
+        for e in early_values for r in recent_values for g in green_values
+    ]
+
+def parse_grid(spec: str) -> List[int]:
+    """"100:500:20" (含终点) 或 "100,200,300"，单位 ms -> ns 列表"""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = [float(x) for x in spec.split(",")]
+    return [int(round(v * NS_PER_MS)) for v in values]
+
+def write_table(rows: Sequence[tuple], out) -> None:
+    defaults = (EARLY_RELEASE_WINDOW_NS, RECENT_STOP_WINDOW_NS, GREEN_THRESHOLD_NS)
+    header = ["early", "recent", "green", "shots", *COLUMNS, "green%"]
+    out.write(" ".join(f"{h:>12}" for h in header) + "\n")
+    for row in rows:
+        counts = row[3:]
+        shots = sum(counts[:len(STATE_TYPES)])
+        graded = counts[-2] + counts[-1]
+        ratio = f"{counts[-2] / graded * 100:.1f}" if graded else "-"
+        mark = " *" if row[:3] == defaults else ""
+        cells = [f"{v / NS_PER_MS:g}" for v in row[:3]] + [str(shots), *map(str, counts), ratio]
+        out.write(" ".join(f"{c:>12}" for c in cells) + mark + "\n")
+
+def write_csv(rows: Sequence[tuple], path: str) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["early_ms", "recent_ms", "green_ms", *COLUMNS])
+        for row in rows:
+            writer.writerow([v / NS_PER_MS for v in row[:3]] + list(row[3:]))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="分类阈值参数扫描")
+    parser.add_argument("logs", nargs="*", help="会话日志 (session_log 格式)")
+    parser.add_argument("--synthetic-hours", type=float, default=0.0, help="追加的合成输入时长 (小时)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--early", default="100:500:20", help="early_release 取值 (ms)，start:stop:step 或逗号分隔")
+    parser.add_argument("--recent", default="200:1000:50", help="recent_stop 取值 (ms)")
+    parser.add_argument("--green", default="5:50:5", help="green 阈值取值 (ms)")
+    parser.add_argument("--axes", default=DEFAULT_AXES_SPEC, help="急停轴，如 AD 或 AD,WS")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", "-o", help="结果写入 CSV (默认在标准输出打印表格)")
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.logs, args.synthetic_hours, args.seed)
+    if not sessions:
+        parser.error("no input: give session logs or --synthetic-hours")
+    early, recent, green = parse_grid(args.early), parse_grid(args.recent), parse_grid(args.green)
+
+    start = time.perf_counter()
+    rows = run_sweep(sessions, early, recent, green, args.workers, parse_axes(args.axes))
+    elapsed = time.perf_counter() - start
+    events = sum(len(s) for s in sessions)
+    print(f"{len(rows)} parameter sets x {events} events ({len(sessions)} sessions) in {elapsed:.2f}s",
+          file=sys.stderr)
+    if args.output:
+        write_csv(rows, args.output)
+    else:
+        write_table(rows, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# synthetic.py
+"""可复现的合成输入事件生成器 (急停、扫射、空闲)，供基准测试和回放使用"""
+import random
+from typing import List, Tuple
+
+from clock import NS_PER_MS
+from event_ring import EV_PRESS, EV_RELEASE, EV_SHOT
+from session_log import KEY_CODES, NO_KEY
+
+Record = Tuple[int, int, int] # (timestamp_ns, kind, key_code), 与 session_log 记录一致
+
+W, A, S, D = (KEY_CODES[k] for k in ("W", "A", "S", "D"))
+
+def _ms(rnd: random.Random, lo: float, hi: float) -> int:
+    return int(rnd.uniform(lo, hi) * NS_PER_MS)
+
+def _hold(events: List[Record], key: int, start: int, duration: int, repeat: bool) -> None:
+    """按住一个键；repeat 时模拟系统自动重复 (500ms 后每 33ms 一次按下)"""
+    events.append((start, EV_PRESS, key))
+    if repeat:
+        t = start + 500 * NS_PER_MS
+        while t < start + duration:
+            events.append((t, EV_PRESS, key))
+            t += 33 * NS_PER_MS
+    events.append((start + duration, EV_RELEASE, key))
+
+def _strafe(rnd: random.Random, events: List[Record], t: int) -> int:
+    """左右移动后急停开枪：反向键和原方向键有重叠或间隙"""
+    first, second = (A, D) if rnd.random() < 0.5 else (D, A)
+    run = _ms(rnd, 150, 700)
+    _hold(events, first, t, run, repeat=True)
+    # 负数为间隙 (EarlyRelease)，正数为重叠 (Overlap)
+    overlap = _ms(rnd, -60, 50)
+    counter_start = t + run - overlap
+    counter = _ms(rnd, 40, 140)
+    _hold(events, second, counter_start, counter, repeat=False)
+    stop = max(t + run, counter_start + counter)
+    # 偶尔在反向键还没松开时就开枪 (跑打)
+    shot = stop + _ms(rnd, 20, 300) if rnd.random() < 0.85 else counter_start + counter // 2
+    events.append((shot, EV_SHOT, NO_KEY))
+    return max(stop, shot)
+
+def _spray(rnd: random.Random, events: List[Record], t: int) -> int:
+    """原地或边走边扫射：约 100ms 一发"""
+    bullets = rnd.randint(3, 25)
+    moving = rnd.random() < 0.3
+    if moving:
+        _hold(events, rnd.choice((W, A, S, D)), t, bullets * 100 * NS_PER_MS, repeat=True)
+    for i in range(bullets):
+        events.append((t + i * 100 * NS_PER_MS + _ms(rnd, 0, 3), EV_SHOT, NO_KEY))
+    return t + bullets * 100 * NS_PER_MS
+
+def _idle(rnd: random.Random, events: List[Record], t: int) -> int:
+    """空闲或前后走动，偶尔点一枪"""
+    duration = _ms(rnd, 300, 3000)
+    if rnd.random() < 0.5:
+        _hold(events, rnd.choice((W, S)), t, duration // 2, repeat=True)
+    if rnd.random() < 0.3:
+        events.append((t + duration - _ms(rnd, 0, 200), EV_SHOT, NO_KEY))
+    return t + duration
+
+PATTERNS = ((_strafe, 0.55), (_spray, 0.2), (_idle, 0.25))
+
+def generate(n_events: int, seed: int = 0, start_ns: int = 10**12) -> List[Record]:
+    """生成至少 n_events 个按时间排序的事件 (同一种子结果完全相同)"""
+    rnd = random.Random(seed)
+    funcs = [p[0] for p in PATTERNS]
+    weights = [p[1] for p in PATTERNS]
+    events: List[Record] = []
+    t = start_ns
+    while len(events) < n_events:
+        segment: List[Record] = []
+        t = rnd.choices(funcs, weights)[0](rnd, segment, t) + _ms(rnd, 50, 400)
+        # 片段内部按键和开枪交错，排序后追加；稳定排序保证同一时刻的顺序可复现
+        segment.sort(key=lambda r: r[0])
+        events.extend(segment)
+    return events